@@ -9,7 +9,21 @@ HardwareSerial Serial1(PA10, PA9); // RX, TX
 #define Serial Serial1
 #define LED_BUILTIN PC13
 #define BUFFER_SIZE 2048
-#define BAUD_RATE 115200
+#define BAUD_RATE 115200 // Power-on link speed; the host may negotiate up
+
+// Link speeds the host may switch to with K<baud>. A switch reverts to the
+// previous speed unless confirmed by an echo (Y) within BAUD_CONFIRM_MS.
+const uint32_t LINK_BAUDS[] = {115200, 230400,  460800,  921600,
+                               1000000, 2000000, 3000000, 4500000};
+#define NUM_LINK_BAUDS (sizeof(LINK_BAUDS) / sizeof(LINK_BAUDS[0]))
+#define BAUD_CONFIRM_MS 250
+uint32_t linkBaud = BAUD_RATE;
+uint32_t previousBaud = 0; // Nonzero while a switch awaits confirmation
+uint32_t baudSwitchTime = 0;
+
+// CRC32 (zlib polynomial) appended to frames and chunks once enabled
+bool crcMode = false;
+uint32_t txCrc = 0;
 
 // Sample buffer
 uint16_t samples[BUFFER_SIZE];
@@ -20,6 +34,21 @@ volatile bool captureComplete = false;
 uint32_t sampleCount = BUFFER_SIZE;
 uint32_t sampleRateHz = 100000; // Default: 100kHz (20ms window)
 
+// Transfer encoding: raw bytes or run-length encoded (level, run-1) pairs
+bool rleMode = false;
+
+// Continuous streaming: circular DMA over `samples`, each half sent as a
+// sequence-numbered chunk while the other half fills
+#define STREAM_HALF (BUFFER_SIZE / 2)
+// Highest rate the DMA half-buffer handling keeps up with. Raw chunks also
+// need one byte per sample on the link (about 11.5 kHz at 115200 baud); the
+// host caps streaming to what the negotiated link speed carries.
+#define STREAM_MAX_RATE 100000
+volatile bool streaming = false;
+volatile uint32_t halvesFilled = 0; // Halves completed since stream start
+uint32_t halvesSent = 0;
+uint8_t chunk[STREAM_HALF];
+
 // HAL handles
 TIM_HandleTypeDef htim2;
 DMA_HandleTypeDef hdma_tim2_up;
@@ -51,6 +80,13 @@ void setup() {
 }
 
 void loop() {
+  // An unconfirmed speed switch means the host cannot hear us; go back
+  if (previousBaud && millis() - baudSwitchTime > BAUD_CONFIRM_MS) {
+    Serial.begin(previousBaud);
+    linkBaud = previousBaud;
+    previousBaud = 0;
+  }
+
   // Check for capture timeout (important for slow rates)
   if (capturing && (millis() - captureStartTime > CAPTURE_TIMEOUT_MS)) {
     Serial.println("ERROR:TIMEOUT");
@@ -61,6 +97,9 @@ void loop() {
     char cmd = Serial.read();
     if (cmd == '\r' || cmd == '\n')
       return;
+    // Until a new speed is confirmed, line noise must not start anything
+    if (previousBaud && cmd != 'Y')
+      return;
     handleCommand(cmd);
   }
 
@@ -70,9 +109,13 @@ void loop() {
     digitalWrite(LED_BUILTIN, LOW);
   }
 
+  if (streaming && halvesFilled > halvesSent) {
+    sendChunk();
+  }
+
   // Blink when idle
   static uint32_t lastBlink = 0;
-  if (!capturing && millis() - lastBlink > 500) {
+  if (!capturing && !streaming && millis() - lastBlink > 500) {
     digitalWrite(LED_BUILTIN, !digitalRead(LED_BUILTIN));
     lastBlink = millis();
   }
@@ -92,10 +135,51 @@ void handleCommand(char cmd) {
 
   case 'R':
   case 'r':
+    stopStream();
     stopCapture();
     Serial.println("OK:RESET");
     break;
 
+  // === CONTINUOUS STREAMING ===
+  case 'S':
+    startStream();
+    break;
+
+  case 'X':
+    stopStream();
+    Serial.println("OK:STOPPED");
+    break;
+
+  // === TRANSFER ENCODING ===
+  case 'L':
+    rleMode = true; // Run-length encoded captures
+    Serial.println("OK:RLE");
+    break;
+
+  case 'U':
+    rleMode = false; // One raw byte per sample
+    Serial.println("OK:RAW");
+    break;
+
+  // === LINK ===
+  case 'K':
+    switchBaud(Serial.readStringUntil('\n').toInt());
+    break;
+
+  case 'Y':
+    echoLine(Serial.readStringUntil('\n'));
+    break;
+
+  case 'Q':
+    crcMode = true; // CRC32 trailer on every frame and chunk
+    Serial.println("OK:CRC");
+    break;
+
+  case 'N':
+    crcMode = false;
+    Serial.println("OK:NOCRC");
+    break;
+
   // === SLOW RATES (for slow signals) ===
   case 'E':
     sampleRateHz = 100; // 100Hz = 20.48 second window
@@ -143,6 +227,76 @@ void handleCommand(char cmd) {
   }
 }
 
+// Nibble table for the reflected CRC32 polynomial 0xEDB88320
+const uint32_t CRC_NIBBLE[16] = {
+    0x00000000, 0x1DB71064, 0x3B6E20C8, 0x26D930AC, 0x76DC4190, 0x6B6B51F4,
+    0x4DB26158, 0x5005713C, 0xEDB88320, 0xF00F9344, 0xD6D6A3E8, 0xCB61B38C,
+    0x9B64C2B0, 0x86D3D2D4, 0xA00AE278, 0xBDBDF21C};
+
+uint32_t crc32Update(uint32_t crc, uint8_t b) {
+  crc ^= b;
+  crc = (crc >> 4) ^ CRC_NIBBLE[crc & 0x0F];
+  return (crc >> 4) ^ CRC_NIBBLE[crc & 0x0F];
+}
+
+// Frame bytes covered by the CRC go through putByte/putU32
+void putByte(uint8_t b) {
+  txCrc = crc32Update(txCrc, b);
+  Serial.write(b);
+}
+
+void putU32(uint32_t v) {
+  for (int b = 0; b < 32; b += 8)
+    putByte((uint8_t)((v >> b) & 0xFF));
+}
+
+// Append the CRC of everything put since the last call, if enabled
+void sendCrc() {
+  uint32_t crc = ~txCrc;
+  txCrc = 0xFFFFFFFF;
+  if (!crcMode)
+    return;
+  for (int b = 0; b < 32; b += 8)
+    Serial.write((uint8_t)((crc >> b) & 0xFF));
+}
+
+// Acknowledge at the old speed, then listen at the new one
+void switchBaud(uint32_t baud) {
+  bool supported = false;
+  for (uint32_t i = 0; i < NUM_LINK_BAUDS; i++)
+    supported |= LINK_BAUDS[i] == baud;
+  if (!supported || capturing || streaming) {
+    Serial.println("ERROR:BAUD");
+    return;
+  }
+  Serial.print("OK:BAUD:");
+  Serial.println(baud);
+  Serial.flush(); // Let the reply leave before the UART is reprogrammed
+  Serial.begin(baud);
+  previousBaud = linkBaud;
+  linkBaud = baud;
+  baudSwitchTime = millis();
+}
+
+// "<token>:<crc32 hex>" is echoed back if the CRC matches; an intact echo
+// at a new speed confirms the switch
+void echoLine(String line) {
+  line.trim();
+  int sep = line.indexOf(':');
+  uint32_t crc = 0xFFFFFFFF;
+  for (int i = 0; i < sep; i++)
+    crc = crc32Update(crc, line[i]);
+  char expected[9];
+  snprintf(expected, sizeof(expected), "%08lx", (unsigned long)~crc);
+  if (sep < 0 || line.substring(sep + 1) != expected) {
+    Serial.println("ERROR:ECHO");
+    return;
+  }
+  previousBaud = 0;
+  Serial.print("ECHO:");
+  Serial.println(line);
+}
+
 void initTimerDMA() {
   __HAL_RCC_TIM2_CLK_ENABLE();
   __HAL_RCC_DMA1_CLK_ENABLE();
@@ -177,6 +331,8 @@ void initTimerDMA() {
   // Register callbacks
   HAL_DMA_RegisterCallback(&hdma_tim2_up, HAL_DMA_XFER_CPLT_CB_ID,
                            DMA_XferCpltCallback);
+  HAL_DMA_RegisterCallback(&hdma_tim2_up, HAL_DMA_XFER_HALFCPLT_CB_ID,
+                           DMA_XferHalfCpltCallback);
   HAL_DMA_RegisterCallback(&hdma_tim2_up, HAL_DMA_XFER_ERROR_CB_ID,
                            DMA_XferErrorCallback);
 
@@ -186,22 +342,16 @@ void initTimerDMA() {
   HAL_NVIC_EnableIRQ(DMA1_Channel2_IRQn);
 }
 
-void startDMACapture() {
-  if (capturing) {
-    Serial.println("ERROR:BUSY");
+// Reconfigure the DMA channel for one-shot or circular transfers
+void setDMAMode(uint32_t mode) {
+  if (hdma_tim2_up.Init.Mode == mode)
     return;
-  }
-
-  capturing = true;
-  captureComplete = false;
-  captureStartTime = millis();
-  digitalWrite(LED_BUILTIN, HIGH);
-
-  // Stop and reset timer/DMA
-  HAL_TIM_Base_Stop(&htim2);
-  __HAL_TIM_DISABLE_DMA(&htim2, TIM_DMA_UPDATE);
-  HAL_DMA_Abort(&hdma_tim2_up);
+  hdma_tim2_up.Init.Mode = mode;
+  HAL_DMA_Init(&hdma_tim2_up);
+}
 
+// Program TIM2 for sampleRateHz
+void setupTimer() {
   // Calculate timer period for desired sample rate
   // Timer freq = 72MHz / (prescaler+1) / (period+1)
   uint32_t period = (72000000 / sampleRateHz) - 1;
@@ -223,6 +373,26 @@ void startDMACapture() {
   __HAL_TIM_SET_PRESCALER(&htim2, prescaler);
   __HAL_TIM_SET_AUTORELOAD(&htim2, period);
   __HAL_TIM_SET_COUNTER(&htim2, 0);
+}
+
+void startDMACapture() {
+  if (capturing || streaming) {
+    Serial.println("ERROR:BUSY");
+    return;
+  }
+
+  capturing = true;
+  captureComplete = false;
+  captureStartTime = millis();
+  digitalWrite(LED_BUILTIN, HIGH);
+
+  // Stop and reset timer/DMA
+  HAL_TIM_Base_Stop(&htim2);
+  __HAL_TIM_DISABLE_DMA(&htim2, TIM_DMA_UPDATE);
+  HAL_DMA_Abort(&hdma_tim2_up);
+  setDMAMode(DMA_NORMAL);
+
+  setupTimer();
 
   uint32_t gpio_idr = (uint32_t)&(GPIOA->IDR);
 
@@ -250,7 +420,66 @@ void stopCapture() {
   digitalWrite(LED_BUILTIN, LOW);
 }
 
+void startStream() {
+  if (capturing || streaming) {
+    Serial.println("ERROR:BUSY");
+    return;
+  }
+  if (sampleRateHz > STREAM_MAX_RATE) {
+    Serial.println("ERROR:RATE_TOO_HIGH");
+    return;
+  }
+
+  HAL_TIM_Base_Stop(&htim2);
+  __HAL_TIM_DISABLE_DMA(&htim2, TIM_DMA_UPDATE);
+  HAL_DMA_Abort(&hdma_tim2_up);
+  setDMAMode(DMA_CIRCULAR);
+
+  setupTimer();
+
+  halvesFilled = 0;
+  halvesSent = 0;
+  streaming = true;
+  digitalWrite(LED_BUILTIN, HIGH);
+
+  // Announce the rate before the first chunk so the host can time it
+  Serial.print("OK:STREAM:");
+  Serial.println(sampleRateHz);
+
+  uint32_t gpio_idr = (uint32_t)&(GPIOA->IDR);
+  if (HAL_DMA_Start_IT(&hdma_tim2_up, gpio_idr, (uint32_t)samples,
+                       BUFFER_SIZE) != HAL_OK) {
+    Serial.println("ERROR:DMA_START");
+    streaming = false;
+    digitalWrite(LED_BUILTIN, LOW);
+    return;
+  }
+
+  __HAL_TIM_ENABLE_DMA(&htim2, TIM_DMA_UPDATE);
+  HAL_TIM_Base_Start(&htim2);
+}
+
+void stopStream() {
+  if (!streaming)
+    return;
+  HAL_TIM_Base_Stop(&htim2);
+  __HAL_TIM_DISABLE_DMA(&htim2, TIM_DMA_UPDATE);
+  HAL_DMA_Abort(&hdma_tim2_up);
+  streaming = false;
+  digitalWrite(LED_BUILTIN, LOW);
+}
+
+void DMA_XferHalfCpltCallback(DMA_HandleTypeDef *hdma) {
+  if (streaming)
+    halvesFilled++; // First half ready
+}
+
 void DMA_XferCpltCallback(DMA_HandleTypeDef *hdma) {
+  if (streaming) {
+    halvesFilled++; // Second half ready; circular DMA keeps running
+    return;
+  }
+
   HAL_TIM_Base_Stop(&htim2);
   __HAL_TIM_DISABLE_DMA(&htim2, TIM_DMA_UPDATE);
 
@@ -267,31 +496,124 @@ extern "C" void DMA1_Channel2_IRQHandler(void) {
   HAL_DMA_IRQHandler(&hdma_tim2_up);
 }
 
-void sendCapture() {
-  Serial.print("DATA:");
+// Number of (level, run-1) pairs needed to encode the buffer
+uint32_t countRuns() {
+  uint32_t runs = 0;
+  uint32_t i = 0;
+  while (i < sampleCount) {
+    uint8_t level = samples[i] & 0xFF;
+    uint32_t run = 1;
+    while (i + run < sampleCount && run < 256 &&
+           (uint8_t)(samples[i + run] & 0xFF) == level)
+      run++;
+    runs++;
+    i += run;
+  }
+  return runs;
+}
+
+void sendCaptureRLE(uint32_t runs) {
+  Serial.print("RLE:");
+  txCrc = 0xFFFFFFFF;
+  putU32(sampleCount);
+  putU32(sampleRateHz);
+  putU32(runs);
+  Serial.write('\n');
 
-  Serial.write((uint8_t)(sampleCount & 0xFF));
-  Serial.write((uint8_t)((sampleCount >> 8) & 0xFF));
-  Serial.write((uint8_t)((sampleCount >> 16) & 0xFF));
-  Serial.write((uint8_t)((sampleCount >> 24) & 0xFF));
+  uint32_t i = 0;
+  while (i < sampleCount) {
+    uint8_t level = samples[i] & 0xFF;
+    uint32_t run = 1;
+    while (i + run < sampleCount && run < 256 &&
+           (uint8_t)(samples[i + run] & 0xFF) == level)
+      run++;
+    putByte(level);
+    putByte((uint8_t)(run - 1));
+    i += run;
+  }
+
+  sendCrc();
+  Serial.println("\nEND");
+}
 
-  Serial.write((uint8_t)(sampleRateHz & 0xFF));
-  Serial.write((uint8_t)((sampleRateHz >> 8) & 0xFF));
-  Serial.write((uint8_t)((sampleRateHz >> 16) & 0xFF));
-  Serial.write((uint8_t)((sampleRateHz >> 24) & 0xFF));
+void sendCapture() {
+  if (rleMode) {
+    // Busy signals encode worse than raw; send those as DATA frames
+    uint32_t runs = countRuns();
+    if (runs * 2 < sampleCount) {
+      sendCaptureRLE(runs);
+      return;
+    }
+  }
 
+  Serial.print("DATA:");
+  txCrc = 0xFFFFFFFF;
+  putU32(sampleCount);
+  putU32(sampleRateHz);
   Serial.write('\n');
 
   for (uint32_t i = 0; i < sampleCount; i++) {
-    Serial.write((uint8_t)(samples[i] & 0xFF));
+    putByte((uint8_t)(samples[i] & 0xFF));
   }
 
+  sendCrc();
   Serial.println("\nEND");
 }
 
+// Send the newest filled half as chunk number `seq`. Halves the link was
+// too slow for are skipped, which shows up on the host as a sequence gap.
+void sendChunk() {
+  uint32_t seq = halvesFilled - 1;
+  const uint16_t *half = &samples[(seq % 2) * STREAM_HALF];
+  // Copy first: DMA overwrites this half again one half-period from now
+  for (uint32_t i = 0; i < STREAM_HALF; i++)
+    chunk[i] = half[i] & 0xFF;
+  halvesSent = seq + 1;
+
+  uint32_t runs = 0;
+  if (rleMode) {
+    uint32_t i = 0;
+    while (i < STREAM_HALF) {
+      uint32_t run = 1;
+      while (i + run < STREAM_HALF && run < 256 && chunk[i + run] == chunk[i])
+        run++;
+      runs++;
+      i += run;
+    }
+  }
+  bool useRle = rleMode && runs * 2 < STREAM_HALF;
+
+  Serial.print(useRle ? "CHR:" : "CHK:");
+  txCrc = 0xFFFFFFFF;
+  putU32(seq);
+  putU32(STREAM_HALF);
+
+  if (!useRle) {
+    if (crcMode) {
+      for (uint32_t i = 0; i < STREAM_HALF; i++)
+        txCrc = crc32Update(txCrc, chunk[i]);
+    }
+    Serial.write(chunk, STREAM_HALF);
+    sendCrc();
+    return;
+  }
+
+  putU32(runs);
+  uint32_t i = 0;
+  while (i < STREAM_HALF) {
+    uint32_t run = 1;
+    while (i + run < STREAM_HALF && run < 256 && chunk[i + run] == chunk[i])
+      run++;
+    putByte(chunk[i]);
+    putByte((uint8_t)(run - 1));
+    i += run;
+  }
+  sendCrc();
+}
+
 void sendInfo() {
   Serial.println("INFO:STM32-UART-LA8");
-  Serial.println("VERSION:4.0-MULTIRATE");
+  Serial.println("VERSION:4.3-LINK");
   Serial.println("CHANNELS:8");
   Serial.print("BUFFER:");
   Serial.println(BUFFER_SIZE);
@@ -299,6 +621,15 @@ void sendInfo() {
   Serial.print(sampleRateHz);
   Serial.println("Hz");
   Serial.println("RATES:100Hz,1kHz,10kHz,100kHz,1MHz,2MHz,5MHz,6MHz");
+  Serial.println("ENCODINGS:RAW,RLE");
+  Serial.println("CHECKSUMS:CRC32");
+  Serial.print("BAUDS:");
+  for (uint32_t i = 0; i < NUM_LINK_BAUDS; i++) {
+    Serial.print(LINK_BAUDS[i]);
+    Serial.print(i + 1 < NUM_LINK_BAUDS ? "," : "\n");
+  }
+  Serial.print("STREAM_LIMIT:");
+  Serial.println(STREAM_MAX_RATE);
   Serial.print("STATUS:");
-  Serial.println(capturing ? "BUSY" : "READY");
+  Serial.println(capturing || streaming ? "BUSY" : "READY");
 }
@@ -0,0 +1,372 @@
+"""
+Device access from a worker process, with samples passed through shared memory
+"""
+
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from perf import counters
+from device import LogicAnalyzerDevice
+from edges import frame_edges
+
+# Run the device in a worker process (LA_ACQ_PROCESS=1)
+ACQUISITION_PROCESS = os.environ.get('LA_ACQ_PROCESS', '') == '1'
+
+# Shared ring the worker writes samples and edges into (LA_RING_BYTES)
+RING_BYTES = int(os.environ.get('LA_RING_BYTES', 64 * 1024 * 1024))
+
+# Device attributes copied back to the proxy after every reply
+STATE = ('device_info', 'baudrate', 'streaming', 'last_error', 'sample_rate_hz',
+         'link_rate', 'last_burst', 'capture_requested_at', 'stream_rate_hz',
+         'encoding', 'crc', 'poll_interval')
+
+class SharedRing:
+    """Byte ring in shared memory with one writer and positions as handles
+
+    Records are written contiguously (skipping the tail end when one would
+    wrap), so a reader gets each one as a view without copying. Positions
+    grow forever; the writer refuses records that would overwrite data
+    the reader has not released yet (see free()).
+    """
+
+    def __init__(self, size=RING_BYTES, name=None):
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.size = size
+        self.data = np.ndarray(size, dtype=np.uint8, buffer=self.shm.buf)
+        self.head = 0       # position after the last record (writer side)
+
+    def free(self, released):
+        """Bytes that can be written without touching data after released"""
+        return self.size - (self.head - released)
+
+    def write(self, array, released):
+        """Copy array in; returns its position, or None if it does not fit"""
+        raw = np.ascontiguousarray(array).view(np.uint8).reshape(-1)
+        position = self.head
+        offset = position % self.size
+        if offset + len(raw) > self.size:
+            position += self.size - offset     # Wrap to the start
+            offset = 0
+        if position + len(raw) - released > self.size:
+            return None
+        self.data[offset:offset + len(raw)] = raw
+        self.head = position + len(raw)
+        return position
+
+    def view(self, position, length, dtype=np.uint8):
+        """length items of dtype at position; valid until released"""
+        offset = position % self.size
+        return self.data[offset:offset + length * np.dtype(dtype).itemsize].view(dtype)
+
+    def close(self):
+        self.data = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+def _export(ring, released, frame):
+    """Frame dict with samples and edges replaced by ring positions"""
+    samples = np.frombuffer(frame['samples'], dtype=np.uint8)
+    # Index building runs here, so the GUI process only adds an offset
+    edges = frame_edges(samples)
+    counts = [len(e) for e in edges]
+    flat = np.concatenate(edges).astype(np.int32)
+    if ring.free(released) < samples.nbytes + flat.nbytes:
+        return None
+    # Both records or neither: samples without their edges are never read
+    head = ring.head
+    position = ring.write(samples, released)
+    edge_position = ring.write(flat, released) if position is not None else None
+    if edge_position is None:
+        ring.head = head
+        return None
+    meta = {k: v for k, v in frame.items() if k != 'samples'}
+    meta['ring'] = (position, len(samples), edge_position, counts)
+    return meta
+
+def _worker(conn, ring_name, ring_size, released, port, options):
+    """Process main: run device calls sent over conn and read ahead"""
+    ring = SharedRing(ring_size, ring_name)
+    device = LogicAnalyzerDevice(port, **options)
+    requests = 0        # Successful request_capture() calls; tags their frames
+    pending = None      # (request number, deadline) of the burst to read
+    lost = 0            # Chunks lost to ring overruns since the last one sent
+
+    def reply(kind, value):
+        state = {name: getattr(device, name, None) for name in STATE}
+        state['serial'] = device.serial is not None
+        # Metrics are counted here but reported by the GUI process
+        conn.send((kind, value, state, counters.drain()))
+
+    def export(frame):
+        """Ring metadata of a frame; None if it is empty or did not fit"""
+        if len(frame['samples']) == 0:
+            # A payload that timed out before its first byte
+            counters.count('frames_dropped')
+            return None
+        meta = _export(ring, released.value, frame)
+        if meta is None:
+            # The GUI has not released enough of the ring; drop the frame
+            counters.count('ring_overruns')
+            counters.count('frames_dropped')
+        return meta
+
+    while True:
+        poll_interval = device.poll_interval or 0.01
+        if pending is not None and not conn.poll(0):
+            # The burst requested last: read it once it starts arriving,
+            # without waiting for the GUI to ask. Commands keep being served
+            # while the device samples.
+            number, deadline = pending
+            arriving = device.serial is None or device.serial.in_waiting > 0
+            if not arriving and time.time() < deadline:
+                conn.poll(poll_interval)
+                continue
+            pending = None
+            try:
+                frame = device.read_capture(None if arriving else 0)
+                meta = export(frame) if frame else None
+            except Exception as e:
+                # Reported to the GUI; the worker keeps serving calls
+                reply('error', e)
+                continue
+            if frame and len(frame['samples']) and meta is None:
+                device.last_error = 'overrun'
+            reply('frame', (number, meta))
+            continue
+        if device.streaming and not conn.poll(poll_interval):
+            chunks = []
+            try:
+                for chunk in device.read_stream():
+                    chunk['dropped'] += lost
+                    meta = export(chunk)
+                    if meta is None:
+                        # The next chunk sent opens a new segment after the gap
+                        lost = chunk['dropped'] + 1
+                    else:
+                        lost = 0
+                        chunks.append(meta)
+            except Exception as e:
+                reply('error', e)
+                continue
+            if chunks:
+                reply('chunks', chunks)
+            continue
+
+        name, args = conn.recv()
+        if name is None:
+            break
+        try:
+            result = getattr(device, name)(*args)
+        except Exception as e:
+            reply('error', e)
+            continue
+        if name == 'request_capture' and result:
+            requests += 1
+            pending = (requests, time.time() + device.capture_timeout())
+        elif name == 'start_stream':
+            lost = 0
+        reply('result', result)
+
+    if device.serial:
+        device.disconnect()
+    ring.close()
+
+class RemoteDevice:
+    """LogicAnalyzerDevice run in a worker process
+
+    Takes the same arguments and offers the calls MainWindow makes. Serial
+    reads, frame parsing, RLE decoding, CRC checks and edge indexing
+    happen in the worker; samples and edges come back through a
+    SharedRing and only small metadata goes over the pipe, together with
+    the worker's metrics, which are merged into this process's counters.
+    After request_capture() the worker reads the burst on its own once it
+    starts arriving, and while streaming it keeps reading chunks, so
+    read_capture() and read_stream() mostly just pick up finished frames.
+    Other calls are served while the device samples, so they do not wait
+    for the burst.
+
+    A frame the ring has no room for is dropped, with last_error set to
+    'overrun'.
+
+    Returned samples are views into the ring, valid until the next read,
+    as with the device's own reused frame buffer.
+    """
+
+    def __init__(self, port=None, ring_bytes=RING_BYTES, **options):
+        self.port = port
+        self.options = options
+        self.ring_bytes = ring_bytes
+        self.ring = None
+        self.process = None
+        self.conn = None
+        self.serial = False
+        self.device_info = None
+        self.streaming = False
+        self.last_error = None
+        self.last_burst = None
+        self.capture_requested_at = None
+        self.sample_rate_hz = 0
+        self.link_rate = options.get('baudrate', 115200) / 10.0
+        self.baudrate = options.get('baudrate', 115200)
+        self.poll_interval = 0.01
+        # Receives every frame and chunk read, as on LogicAnalyzerDevice
+        self.publisher = None
+        self.inbox = []
+        self.read_pending = False
+        self.requests = 0       # Mirrors the worker's count; tags frames
+        self.held = None
+
+    # Timing follows from the state copied back from the worker
+    expected_burst_time = LogicAnalyzerDevice.expected_burst_time
+    capture_timeout = LogicAnalyzerDevice.capture_timeout
+    stream_limit_hz = LogicAnalyzerDevice.stream_limit_hz
+
+    def _start(self):
+        self.ring = SharedRing(self.ring_bytes)
+        self.released = multiprocessing.get_context('spawn').RawValue('q', 0)
+        ctx = multiprocessing.get_context('spawn')
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker, name='la_acquisition', daemon=True,
+            args=(child, self.ring.name, self.ring_bytes, self.released, self.port, self.options))
+        self.process.start()
+        child.close()
+
+    def _stop(self):
+        if self.process is not None:
+            self.conn.send((None, ()))
+            self.process.join(5)
+            self.conn.close()
+            self.process = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+        self.serial = False
+
+    def _receive(self, timeout=None):
+        """Next message from the worker, or None after timeout"""
+        if timeout is not None and not self.conn.poll(timeout):
+            return None
+        kind, value, state, metrics = self.conn.recv()
+        self.__dict__.update(state)
+        counters.merge(metrics)
+        if kind == 'error':
+            raise value
+        return kind, value
+
+    def _call(self, name, *args):
+        """Run a device method in the worker; frames read meanwhile are kept"""
+        self.conn.send((name, args))
+        while True:
+            kind, value = self._receive()
+            if kind == 'result':
+                return value
+            self.inbox.append((kind, value))
+
+    def _release(self):
+        """Frames handed out before are done with; their ring space is free"""
+        if self.held is not None:
+            self.released.value = self.held
+            self.held = None
+
+    def _import(self, meta):
+        """Frame dict with samples and edges as views into the ring"""
+        position, length, edge_position, counts = meta.pop('ring')
+        meta['samples'] = self.ring.view(position, length)
+        flat = self.ring.view(edge_position, sum(counts), np.int32)
+        meta['edges'] = np.split(flat, np.cumsum(counts)[:-1])
+        self.held = edge_position + 4 * sum(counts)
+        if self.publisher is not None:
+            self.publisher.publish(meta)
+        return meta
+
+    def connect(self):
+        self._start()
+        try:
+            connected = self._call('connect')
+        except Exception:
+            self._stop()
+            raise
+        if not connected:
+            self._stop()
+        return connected
+
+    def disconnect(self):
+        if self.process is None:
+            return
+        self._call('disconnect')
+        self._stop()
+
+    def _drop_stale_frames(self):
+        """Forget frames of requests before the last one, never read"""
+        self.inbox = [m for m in self.inbox
+                      if m[0] != 'frame' or m[1][0] == self.requests]
+
+    def request_capture(self):
+        self._release()
+        self.read_pending = self._call('request_capture')
+        if self.read_pending:
+            self.requests += 1
+        self._drop_stale_frames()
+        return self.read_pending
+
+    def read_capture(self, timeout=None):
+        """The frame of the burst requested last, or None"""
+        if not self.read_pending:
+            return None
+        self.read_pending = False
+        if timeout is None:
+            timeout = self.capture_timeout()
+        deadline = time.time() + timeout
+        while True:
+            self._drop_stale_frames()
+            frames = [value for kind, value in self.inbox if kind == 'frame']
+            if frames:
+                self.inbox = [m for m in self.inbox if m[0] != 'frame']
+                meta = frames[0][1]
+                return self._import(meta) if meta else None
+            message = self._receive(max(0.0, deadline - time.time()))
+            if message is None:
+                return None
+            self.inbox.append(message)
+
+    def capture(self, timeout=None):
+        if not self.request_capture():
+            return None
+        return self.read_capture(timeout)
+
+    def read_stream(self):
+        """Chunks the worker has read since the last call"""
+        self._release()
+        while self.conn.poll():
+            self.inbox.append(self._receive())
+        chunks = [c for kind, value in self.inbox if kind == 'chunks' for c in value]
+        self.inbox = [m for m in self.inbox if m[0] != 'chunks']
+        return [self._import(c) for c in chunks]
+
+    def start_stream(self):
+        return self._call('start_stream')
+
+    def stop_stream(self):
+        self._call('stop_stream')
+        self.inbox = [m for m in self.inbox if m[0] != 'chunks']
+
+    def set_sample_rate(self, rate_code):
+        return self._call('set_sample_rate', rate_code)
+
+    def set_encoding(self, encoding):
+        return self._call('set_encoding', encoding)
+
+    def reset_device(self):
+        return self._call('reset_device')
@@ -0,0 +1,178 @@
+import os
+from collections import deque
+
+import numpy as np
+
+from perf import counters
+
+# Pulses shorter than this many samples are glitches (LA_GLITCH_SAMPLES)
+GLITCH_SAMPLES = int(os.environ.get('LA_GLITCH_SAMPLES', 3))
+
+# A channel that toggled before and then holds its level this many
+# seconds of capture time is stuck (LA_STUCK_S)
+STUCK_S = float(os.environ.get('LA_STUCK_S', 2.0))
+
+# Edge rate this many standard deviations off the baseline is an anomaly
+# (LA_ACTIVITY_Z)
+ACTIVITY_Z = float(os.environ.get('LA_ACTIVITY_Z', 6.0))
+
+# Bursts learned before the activity baseline is trusted
+BASELINE_WARMUP = 8
+
+# Events kept for the event list (LA_MAX_EVENTS); older ones fall off
+MAX_EVENTS = int(os.environ.get('LA_MAX_EVENTS', 1000))
+
+# Glitch events recorded per channel and burst; the rest are only counted
+GLITCH_EVENTS_PER_BURST = 16
+
+class AnomalyDetector:
+    """Flags glitches, stuck channels and unusual activity as bursts arrive
+
+    process() looks at the samples appended since its last call only,
+    using the capture's EdgeIndex, so each burst costs a few array
+    operations per channel however long the capture has been running.
+    The little state that spans bursts (last edge per channel, the
+    activity baseline) is carried here, and events go to a bounded deque.
+    Each call reads one capture.snapshot(), so it may run on another
+    thread than the one appending.
+
+    Events are dicts with 'kind' ('glitch', 'stuck' or 'activity'),
+    'channel', 'index' (absolute sample index), 'time' (seconds since the
+    capture started) and a human readable 'detail'.
+    """
+
+    def __init__(self, num_channels=8, glitch_samples=GLITCH_SAMPLES, stuck_s=STUCK_S,
+                 activity_z=ACTIVITY_Z, max_events=MAX_EVENTS):
+        self.num_channels = num_channels
+        self.glitch_samples = glitch_samples
+        self.stuck_s = stuck_s
+        self.activity_z = activity_z
+        self.events = deque(maxlen=max_events)
+        self.reset()
+
+    def reset(self):
+        """Forget all state, for a new capture"""
+        self.events.clear()
+        self.total = 0                  # events found, including fallen off ones
+        self.next_index = 0             # absolute index of the first unseen sample
+        self.last_edge = [None] * self.num_channels
+        self.last_edge_time = [None] * self.num_channels
+        self.stuck = [False] * self.num_channels
+        # Activity baseline: smoothed mean and variance of edges per second
+        self.bursts = 0
+        self.rate_mean = np.zeros(self.num_channels)
+        self.rate_var = np.zeros(self.num_channels)
+        self.unusual = np.zeros(self.num_channels, dtype=bool)
+
+    def process(self, capture):
+        """Scan the samples appended since the last call; returns the new events"""
+        capture = capture.snapshot()
+        start = max(self.next_index, capture.sample_offset)
+        stop = capture.sample_offset + capture.sample_count
+        if stop <= start:
+            return []
+        with counters.timed('anomaly_detect'):
+            found = []
+            counts = np.zeros(self.num_channels)
+            for ch in range(self.num_channels):
+                if not capture.channel_mask >> ch & 1:
+                    continue
+                counts[ch] = self._scan_channel(capture, ch, start, stop, found)
+            self._check_stuck(capture, stop, found)
+            self._check_activity(capture, start, stop, counts, found)
+            self.next_index = stop
+
+        self.events.extend(found)
+        self.total += len(found)
+        for event in found:
+            counters.count(f"anomaly_{event['kind']}")
+        return found
+
+    def _event(self, capture, kind, ch, index, detail):
+        return {
+            'kind': kind,
+            'channel': ch,
+            'index': int(index),
+            'time': float(capture.times(index - capture.sample_offset)),
+            'detail': detail,
+        }
+
+    def _scan_channel(self, capture, ch, start, stop, found):
+        """Glitches among a channel's new edges; returns how many edges were new"""
+        new = capture.edges.between(ch, start, stop)
+        if len(new) == 0:
+            return 0
+
+        # The pulse ending at the first new edge began in an earlier burst
+        last = self.last_edge[ch]
+        points = new if last is None or last < capture.sample_offset else np.concatenate(([last], new))
+        self.last_edge[ch] = int(new[-1])
+        self.last_edge_time[ch] = float(capture.times(new[-1] - capture.sample_offset))
+        self.stuck[ch] = False
+
+        # Pulses only count inside one burst; the index has no edges on a
+        # burst's first sample, as nothing is known of the gap before it
+        seg = capture.segment_ids(points - capture.sample_offset)
+        widths = np.diff(points)
+        valid = seg[1:] == seg[:-1]
+        hits = np.flatnonzero(valid & (widths < self.glitch_samples))
+        if len(hits):
+            counters.count('anomaly_glitch_pulses', len(hits))
+        periods = capture.segment_arrays()[2]
+        for k in hits[:GLITCH_EVENTS_PER_BURST]:
+            width_s = widths[k] * periods[seg[k]]
+            found.append(self._event(
+                capture, 'glitch', ch, points[k],
+                f"{widths[k]} sample pulse ({width_s * 1e9:.0f} ns)"
+            ))
+        if len(hits) > GLITCH_EVENTS_PER_BURST:
+            found[-1]['detail'] += f", {len(hits) - GLITCH_EVENTS_PER_BURST} more in this burst"
+        return len(new)
+
+    def _check_stuck(self, capture, stop, found):
+        """Channels that toggled before but not for stuck_s seconds"""
+        now = capture.end_time()
+        for ch in range(self.num_channels):
+            since = self.last_edge_time[ch]
+            if since is None or self.stuck[ch] or not capture.channel_mask >> ch & 1:
+                continue
+            if now - since >= self.stuck_s:
+                # Reported once; the next edge re-arms the channel
+                self.stuck[ch] = True
+                level = capture.get_samples(stop - 1 - capture.sample_offset, stop - capture.sample_offset)
+                level = int(level[0] >> ch & 1)
+                found.append(self._event(
+                    capture, 'stuck', ch, stop - 1,
+                    f"stuck {'high' if level else 'low'} for {now - since:.1f} s"
+                ))
+
+    def _check_activity(self, capture, start, stop, counts, found):
+        """Compare the burst's edge rate per channel with the learned baseline"""
+        first = start - capture.sample_offset
+        duration = float(capture.times(stop - 1 - capture.sample_offset) - capture.times(first))
+        duration += capture.segment_arrays()[2][-1]
+        rates = counts / duration
+
+        if self.bursts >= BASELINE_WARMUP:
+            # One edge per burst and a small relative spread are always normal
+            spread = np.sqrt(self.rate_var) + 0.05 * self.rate_mean + 1.0 / duration
+            z = np.abs(rates - self.rate_mean) / spread
+            odd = (z > self.activity_z) & np.array(
+                [bool(capture.channel_mask >> ch & 1) for ch in range(self.num_channels)])
+            # Reported when a channel turns unusual, not on every burst after
+            for ch in np.flatnonzero(odd & ~self.unusual):
+                found.append(self._event(
+                    capture, 'activity', int(ch), start,
+                    f"{rates[ch]:.4g} edges/s, baseline {self.rate_mean[ch]:.4g}"
+                ))
+        else:
+            odd = np.zeros(self.num_channels, dtype=bool)
+        self.unusual = odd
+
+        # Anomalous bursts do not teach the baseline
+        alpha = 1.0 / (self.bursts + 1) if self.bursts < BASELINE_WARMUP else 0.1
+        learn = ~odd
+        delta = rates - self.rate_mean
+        self.rate_mean[learn] += alpha * delta[learn]
+        self.rate_var[learn] = (1 - alpha) * (self.rate_var[learn] + alpha * delta[learn] ** 2)
+        self.bursts += 1
@@ -1,87 +1,501 @@
+import itertools
+import time
+
 import numpy as np
 
-class Capture:
-    def __init__(self, samples, sample_period_ns, num_channels=8):
+from perf import counters
+from storage import SampleStore, DEFAULT_RAM_BUDGET
+from edges import EdgeIndex
+
+# Width of a gap between bursts on the compact timeline, as a fraction of the
+# following burst's duration
+COMPACT_GAP = 0.1
+
+# Channel mask with every channel enabled (bit n = channel n)
+ALL_CHANNELS = 0xFF
+
+# Share of the RAM budget the edge index may fill. Samples spill to make
+# room for it; history whose edges still do not fit is trimmed, like
+# spilled history beyond the disk budget.
+INDEX_BUDGET_SHARE = 0.5
+
+# Source of Capture.capture_id
+_capture_ids = itertools.count()
+
+class SegmentTable:
+    """Burst rows in growable arrays: absolute start index, start time,
+    sample period and compact timeline position
+
+    Rows are only appended or dropped from the front and never changed;
+    a burst's length follows from the next row (or the capture's end).
+    Growing copies into new arrays, so views handed out stay consistent
+    while the table grows.
+    """
+
+    def __init__(self, capacity=64):
+        self.columns = [np.empty(capacity, dtype=np.int64)] + \
+                       [np.empty(capacity, dtype=np.float64) for _ in range(3)]
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def append(self, start, start_time, period, x):
+        if self.tail == len(self.columns[0]):
+            size = self.tail - self.head
+            capacity = max(64, 2 * size)
+            columns = [np.empty(capacity, dtype=column.dtype) for column in self.columns]
+            for new, old in zip(columns, self.columns):
+                new[:size] = old[self.head:self.tail]
+            self.columns = columns
+            self.head = 0
+            self.tail = size
+        for column, value in zip(self.columns, (start, start_time, period, x)):
+            column[self.tail] = value
+        self.tail += 1
+
+    def drop_before(self, index):
+        """Drop rows of bursts that end at or before absolute index"""
+        starts = self.columns[0][self.head + 1:self.tail]
+        self.head += int(np.searchsorted(starts, index, side='right'))
+
+    def view(self):
+        """(start, time, period, x) arrays of the current rows, no copy"""
+        return tuple(column[self.head:self.tail] for column in self.columns)
+
+class CaptureView:
+    """Read access shared by Capture and CaptureSnapshot
+
+    Works from sample_offset, sample_count, the segment rows in _segments,
+    store (anything with read()) and edges (an EdgeIndex or EdgeSnapshot).
+    capture_id is the same for a Capture and every snapshot taken of it.
+    """
+
+    def _unpack_channels(self, samples):
+        """Convert byte stream to per-channel bit arrays"""
+        with counters.timed('unpack'):
+            sample_array = np.frombuffer(samples, dtype=np.uint8)
+            # Only enabled channels are extracted; disabled ones cost nothing
+            return [(sample_array >> ch) & 1 if self.channel_mask >> ch & 1 else None
+                    for ch in range(self.num_channels)]
+
+    def enabled_channels(self):
+        return [ch for ch in range(self.num_channels) if self.channel_mask >> ch & 1]
+
+    def get_samples(self, start=0, stop=None, step=1):
+        """Packed samples [start:stop:step]; spilled blocks are paged in"""
+        if stop is None:
+            stop = self.sample_count
+        offset = self.sample_offset
+        return self.store.read(offset + start, offset + stop, step)
+
+    def get_channel(self, ch_num, start=0, stop=None):
+        """Get data for specific channel, optionally for a sample range"""
+        with counters.timed('unpack'):
+            return (self.get_samples(start, stop) >> ch_num) & 0x01
+
+    def get_channels(self, start=0, stop=None):
+        """Get every channel for a sample range (None for disabled ones)"""
+        return self._unpack_channels(self.get_samples(start, stop))
+
+    def nearest_edge(self, ch_num, index):
+        """Index of the channel's level change closest to index, or None"""
+        edge = self.edges.nearest(ch_num, self.sample_offset + index)
+        return None if edge is None else edge - self.sample_offset
+
+    def edge_count(self, ch_num, start, stop):
+        """Number of level changes of a channel in samples [start, stop)"""
+        offset = self.sample_offset
+        return self.edges.count_between(ch_num, offset + start, offset + stop)
+
+    def state_at(self, index):
+        """Packed level of every channel at a sample index"""
+        index = min(max(index, 0), self.sample_count - 1)
+        return int(self.get_samples(index, index + 1)[0])
+
+    def memory_bytes(self):
+        """Bytes held in RAM: samples plus their edge index"""
+        return self.store.ram_bytes + self.edges.nbytes
+
+    def resident_start(self):
+        """Index of the oldest uncompressed sample (older ones are
+        compressed or on disk and slower to read)"""
+        return max(0, self.store.hot_start() - self.sample_offset)
+
+    def get_sample_rate_mhz(self):
+        """Return sample rate in MHz"""
+        return 1000.0 / self.sample_period_ns
+
+    @property
+    def num_segments(self):
+        return len(self._segments[0])
+
+    @property
+    def time(self):
+        """Time of every sample in seconds (materialized, O(n))"""
+        return self.times(np.arange(self.sample_count))
+
+    def segment_arrays(self):
+        """Return the segment table as numpy arrays (start, time, period, length, x)
+
+        Starts are relative to sample 0; a burst partly trimmed away starts
+        at its first retained sample.
+        """
+        if self._seg_arrays is None:
+            starts, seg_times, periods, seg_x = self._segments
+            starts = starts - self.sample_offset
+            if len(starts) and starts[0] < 0:
+                # The rows are shared with snapshots; adjust copies
+                cut = -starts[0] * periods[0]
+                seg_times = np.concatenate(([seg_times[0] + cut], seg_times[1:]))
+                seg_x = np.concatenate(([seg_x[0] + cut], seg_x[1:]))
+                starts[0] = 0
+            lengths = np.diff(starts, append=self.sample_count)
+            self._seg_arrays = (starts, seg_times, periods, lengths, seg_x)
+        return self._seg_arrays
+
+    # Columns of segment_arrays(), by name
+    seg_start = property(lambda self: self.segment_arrays()[0])
+    seg_time = property(lambda self: self.segment_arrays()[1])
+    seg_period = property(lambda self: self.segment_arrays()[2])
+    seg_length = property(lambda self: self.segment_arrays()[3])
+    seg_x = property(lambda self: self.segment_arrays()[4])
+
+    def iter_segments(self):
+        """Yield (start, stop, start_time, period_s) for each contiguous burst.
+
+        Analysis that looks at neighbouring samples (edges, pulse widths) must
+        work per segment; samples on either side of a boundary are not adjacent
+        in time.
+        """
+        starts, seg_times, periods, lengths, _ = self.segment_arrays()
+        for i in range(len(starts)):
+            start = int(starts[i])
+            yield start, start + int(lengths[i]), float(seg_times[i]), float(periods[i])
+
+    def segment_of(self, index):
+        """Return the segment number containing sample index (O(log n))"""
+        starts = self.segment_arrays()[0]
+        return max(0, int(np.searchsorted(starts, index, side='right')) - 1)
+
+    def time_at(self, index):
+        """Return the time in seconds of sample index (O(log n))"""
+        starts, seg_times, periods, _, _ = self.segment_arrays()
+        seg = self.segment_of(index)
+        return float(seg_times[seg] + (index - starts[seg]) * periods[seg])
+
+    def index_at(self, t):
+        """Return the sample index at time t in seconds (O(log n)).
+
+        Times inside a gap between bursts map to the last sample before it.
+        """
+        if self.sample_count == 0:
+            return 0
+        starts, seg_times, periods, lengths, _ = self.segment_arrays()
+        seg = max(0, int(np.searchsorted(seg_times, t, side='right')) - 1)
+        offset = int((t - seg_times[seg]) / periods[seg])
+        offset = max(0, min(int(lengths[seg]) - 1, offset))
+        return int(starts[seg]) + offset
+
+    def times(self, indices):
+        """Vectorized time_at for an array of sample indices"""
+        indices = np.asarray(indices)
+        starts, seg_times, periods, _, _ = self.segment_arrays()
+        seg = self.segment_ids(indices)
+        return seg_times[seg] + (indices - starts[seg]) * periods[seg]
+
+    def segment_ids(self, indices):
+        """Vectorized segment_of for an array of sample indices"""
+        starts = self.segment_arrays()[0]
+        return np.maximum(np.searchsorted(starts, indices, side='right') - 1, 0)
+
+    def end_time(self):
+        """Time just after the last sample in seconds"""
+        if self.num_segments == 0:
+            return 0.0
+        _, seg_times, periods, lengths, _ = self.segment_arrays()
+        return float(seg_times[-1] + lengths[-1] * periods[-1])
+
+    def compact_x(self, indices):
+        """Position of sample indices on the compact timeline.
+
+        The compact timeline is the real one with each gap between bursts
+        shrunk to at most COMPACT_GAP of a burst, so bursts stay readable
+        side by side. Positions are stable while the capture grows or trims.
+        """
+        indices = np.asarray(indices)
+        starts, _, periods, _, seg_x = self.segment_arrays()
+        seg = self.segment_ids(indices)
+        return seg_x[seg] + (indices - starts[seg]) * periods[seg]
+
+    def compact_range(self):
+        """Return (start, end) of the retained data on the compact timeline"""
+        if self.num_segments == 0:
+            return 0.0, 0.0
+        _, _, periods, lengths, seg_x = self.segment_arrays()
+        return float(seg_x[0]), float(seg_x[-1] + lengths[-1] * periods[-1])
+
+    def compact_to_time(self, x):
+        """Map compact timeline positions back to real time in seconds.
+
+        Positions inside a shrunk gap map to the end of the burst before it.
+        """
+        _, seg_times, periods, lengths, seg_x = self.segment_arrays()
+        x = np.asarray(x, dtype=np.float64)
+        seg = np.maximum(np.searchsorted(seg_x, x, side='right') - 1, 0)
+        offset = np.minimum(x - seg_x[seg], lengths[seg] * periods[seg])
+        return seg_times[seg] + offset
+
+    def compact_index(self, x):
+        """Sample index at a compact timeline position, clamped to the data.
+
+        Positions inside a shrunk gap map to the end of the burst before it.
+        """
+        if self.num_segments == 0:
+            return 0
+        starts, _, periods, lengths, seg_x = self.segment_arrays()
+        seg = max(int(np.searchsorted(seg_x, x, side='right')) - 1, 0)
+        offset = int(np.clip((x - seg_x[seg]) / periods[seg], 0, lengths[seg]))
+        return int(starts[seg]) + offset
+
+    def compact_indices(self, xs):
+        """Vectorized compact_index for an array of positions"""
+        xs = np.asarray(xs, dtype=np.float64)
+        if self.num_segments == 0:
+            return np.zeros(len(xs), dtype=np.int64)
+        starts, _, periods, lengths, seg_x = self.segment_arrays()
+        seg = np.maximum(np.searchsorted(seg_x, xs, side='right') - 1, 0)
+        offset = np.clip((xs - seg_x[seg]) / periods[seg], 0, lengths[seg]).astype(np.int64)
+        return starts[seg] + offset
+
+    def gap_positions(self):
+        """Compact timeline positions of real gaps between bursts"""
+        starts, seg_times, periods, lengths, seg_x = self.segment_arrays()
+        if len(starts) < 2:
+            return np.empty(0)
+        prev_end = seg_times[:-1] + lengths[:-1] * periods[:-1]
+        return seg_x[1:][seg_times[1:] > prev_end]
+
+class CaptureSnapshot(CaptureView):
+    """A Capture's state at one version, unaffected by later appends and trims
+
+    Holds views of the capture's segment rows, sample blocks and edge
+    arrays plus the sample bounds, all taken in O(1) without copying any
+    data. Any thread may read it while the owner keeps appending.
+    """
+
+    def __init__(self, capture):
+        self.capture_id = capture.capture_id
+        self.version = capture.version
+        self.num_channels = capture.num_channels
+        self.channel_mask = capture.channel_mask
+        self.sample_period_ns = capture.sample_period_ns
+        self.start_timestamp = capture.start_timestamp
+        self.sample_offset = capture.sample_offset
+        self.sample_count = capture.sample_count
+        self._segments = capture.segments.view()
+        self._seg_arrays = None
+        self.store = capture.store.snapshot()
+        self.edges = capture.edges.snapshot()
+
+    def snapshot(self):
+        """Already immutable: the snapshot itself"""
+        return self
+
+class Capture(CaptureView):
+    def __init__(self, samples, sample_period_ns, num_channels=8, timestamp=None,
+                 ram_budget=DEFAULT_RAM_BUDGET, channel_mask=ALL_CHANNELS, edges=None):
         """
         samples: bytes or bytearray, each byte = 8 channels
         sample_period_ns: time between samples in nanoseconds
+        timestamp: host time (time.time()) of the first sample, defaults to now
+        ram_budget: bytes of samples kept in RAM before older blocks spill to disk
+        channel_mask: enabled channels (bit n = channel n); disabled ones read as 0
+        edges: the samples' edges.frame_edges(), if already computed
         """
+        # Unique for the process lifetime, unlike id() of a freed capture
+        self.capture_id = next(_capture_ids)
         self.num_channels = num_channels
+        self.channel_mask = channel_mask
         self.sample_period_ns = sample_period_ns
+        self.sample_count = 0
+        # Absolute index of sample 0; grows as the rolling buffer trims
+        self.sample_offset = 0
+        self.start_timestamp = timestamp if timestamp is not None else time.time()
+
+        # Level changes per channel, for edge snapping and measurements
+        self.edges = EdgeIndex(num_channels)
+        self.edges.append(samples, 0, channel_mask, edges)
+
+        # Samples stay packed (one byte = 8 channels); channels are unpacked
+        # on demand for the requested range only. The edge index shares
+        # their RAM budget.
+        self.store = SampleStore(ram_budget)
+        self.store.index_bytes = self.edges.nbytes
+        # Disabled channels are stored as constant 0: they add no edges and
+        # compress to almost nothing in older blocks
+        self.store.append(samples, channel_mask)
+
+        # Segment table, one row per burst. Bursts are not contiguous in time:
+        # the device is idle while a burst is transferred, so each burst keeps
+        # its own start time (seconds since start_timestamp) and sample period.
+        self.segments = SegmentTable()
+        self._segments = self.segments.view()
+        self._seg_arrays = None
+        self._break_segment = False
+        if len(samples) > 0:
+            self._add_segment(0.0, sample_period_ns, len(samples))
         self.sample_count = len(samples)
-        
-        # Unpack into per-channel arrays
-        self.channels = self._unpack_channels(samples)
-        
-        # Time axis in seconds
-        self.time = np.arange(self.sample_count) * (sample_period_ns / 1e9)
-    
-    def _unpack_channels(self, samples):
-        """Convert byte stream to per-channel bit arrays"""
-        channels = []
-        sample_array = np.frombuffer(samples, dtype=np.uint8)
-        
-        for ch in range(self.num_channels):
-            # Extract bit ch from each sample
-            channel_data = (sample_array >> ch) & 0x01
-            channels.append(channel_data)
-        
-        return channels
-    
-    def get_channel(self, ch_num):
-        """Get data for specific channel"""
-        return self.channels[ch_num]
-    
-    def get_sample_rate_mhz(self):
-        """Return sample rate in MHz"""
-        return 1000.0 / self.sample_period_ns
 
-    def append_samples(self, new_samples):
-        """Append new binary samples to the capture"""
-        if not new_samples:
+        # Bumped by every change; see snapshot()
+        self.version = 0
+        self._publish()
+
+    def _publish(self):
+        """Make the current state the one snapshot() returns"""
+        self._segments = self.segments.view()
+        self._seg_arrays = None
+        self.version += 1
+        # One reference assignment, so readers see the old or the new state
+        self._snapshot = CaptureSnapshot(self)
+
+    def snapshot(self):
+        """Immutable CaptureSnapshot of the latest complete state, in O(1)
+
+        For readers on other threads (renderers, exporters, analysis):
+        the snapshot stays consistent while this capture keeps appending
+        and trimming, and shares all sample and edge data with it. The
+        capture itself must only be used from the thread that appends.
+        """
+        return self._snapshot
+
+    def _add_segment(self, start_time, sample_period_ns, length):
+        """Open a burst of length samples right after the current last one"""
+        period = sample_period_ns / 1e9
+        if self.num_segments:
+            prev_end = self.compact_range()[1]
+            gap = start_time - self.end_time()
+            x = prev_end + min(gap, COMPACT_GAP * length * period)
+        else:
+            x = start_time
+        self.segments.append(self.sample_offset + self.sample_count, start_time, period, x)
+        self._segments = self.segments.view()
+        self._seg_arrays = None
+
+    def set_channel_mask(self, channel_mask):
+        """Enable channels for samples appended from now on"""
+        self.channel_mask = channel_mask
+        self._publish()
+
+    def set_ram_budget(self, ram_budget):
+        """Change the RAM budget; older blocks spill to disk beyond it"""
+        self.store.set_ram_budget(ram_budget)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        counters.gauge('buffer_bytes', self.memory_bytes())
+        counters.gauge('spill_bytes', self.store.disk_bytes)
+        counters.gauge('compression_ratio', round(self.store.compression_ratio(), 1))
+
+    def append_samples(self, new_samples, sample_period_ns=None, timestamp=None, edges=None):
+        """Append a burst of binary samples to the capture
+
+        sample_period_ns: period of the new burst, defaults to the current one
+        timestamp: host time of the burst's first sample. Without it the burst
+        is treated as a direct continuation of the previous one.
+        edges: the burst's edges.frame_edges(), if already computed
+        """
+        if len(new_samples) == 0:
             return
-            
-        new_channels = self._unpack_channels(new_samples)
-        
-        # Append to existing channels
-        for ch in range(self.num_channels):
-            self.channels[ch] = np.concatenate((self.channels[ch], new_channels[ch]))
-        
-        # Update sample count and time
+        with counters.timed('append_samples'):
+            self._append_samples(new_samples, sample_period_ns, timestamp, edges)
+            # Spilled history beyond the disk budget is discarded, and so
+            # is history with more edges than the RAM budget allows
+            excess = self.store.disk_excess_start()
+            index_excess = self.edges.excess_start(self.store.ram_budget * INDEX_BUDGET_SHARE)
+            if index_excess is not None:
+                excess = max(excess, index_excess)
+            self._trim_start(excess - self.sample_offset)
+            self._publish()
+        self._update_gauges()
+
+    def _append_samples(self, new_samples, sample_period_ns, timestamp, edges):
+        if sample_period_ns is None:
+            sample_period_ns = self.sample_period_ns
+
         new_count = len(new_samples)
-        start_time = self.time[-1] + (self.sample_period_ns / 1e9) if len(self.time) > 0 else 0
-        new_time = start_time + np.arange(new_count) * (self.sample_period_ns / 1e9)
-        
-        self.time = np.concatenate((self.time, new_time))
+        start_time = self.end_time()
+        if timestamp is None:
+            # A contiguous continuation just makes the last burst longer
+            contiguous = not self._break_segment and sample_period_ns == self.sample_period_ns
+            new_segment = not (self.num_segments and contiguous)
+        else:
+            # Never let a late or skewed host clock overlap the previous burst
+            start_time = max(timestamp - self.start_timestamp, start_time)
+            new_segment = True
+
+        # Edges never span a gap between bursts
+        self.edges.append(new_samples, self.sample_offset + self.sample_count,
+                          self.channel_mask, edges, new_segment)
+        self.store.index_bytes = self.edges.nbytes
+        self.store.append(new_samples, self.channel_mask)
+        if new_segment:
+            self._add_segment(start_time, sample_period_ns, new_count)
+
         self.sample_count += new_count
+        self._seg_arrays = None
+        self._break_segment = False
+        self.sample_period_ns = sample_period_ns
+
+    def start_new_segment(self):
+        """Force the next append to open a new segment (e.g. after a rate change)"""
+        self._break_segment = True
 
     def trim_start(self, count):
         """Remove samples from the beginning (for rolling buffer)"""
+        if count > 0:
+            self._trim_start(count)
+            self._publish()
+
+    def _trim_start(self, count):
         if count <= 0:
             return
         if count >= self.sample_count:
             # Clear everything?
             # Ideally reset, but simplified:
             count = self.sample_count - 1 # Keep at least one?
-            
-        for ch in range(self.num_channels):
-            self.channels[ch] = self.channels[ch][count:]
-            
-        self.time = self.time[count:]
+
         self.sample_count -= count
+        self.sample_offset += count
+        self.store.drop_before(self.sample_offset)
+        self.edges.drop_before(self.sample_offset)
+        # Whole bursts go; the first remaining one now starts at sample 0
+        self.segments.drop_before(self.sample_offset)
+        self._segments = self.segments.view()
+        self._seg_arrays = None
 
     def keep_duration(self, duration_seconds):
         """Retain only the last 'duration_seconds' of data"""
         if self.sample_count == 0:
             return
-            
-        # Calculate max samples based on rate
-        # sample_period_ns is per sample
-        # rate = 1e9 / sample_period_ns
-        # max_samples = duration * rate
-        
-        max_samples = int(duration_seconds * (1e9 / self.sample_period_ns))
-        
-        if self.sample_count > max_samples:
-            trim_count = self.sample_count - max_samples
-            self.trim_start(trim_count)
+        with counters.timed('keep_duration'):
+            self._keep_duration(duration_seconds)
+        self._update_gauges()
+
+    def _keep_duration(self, duration_seconds):
+        # Retention is measured on the real timeline, so gaps between
+        # bursts count towards the duration
+        cutoff = self.end_time() - duration_seconds
+        if cutoff <= self.seg_time[0]:
+            return
+        count = self.index_at(cutoff)
+        seg = self.segment_of(count)
+        if cutoff >= self.seg_time[seg] + self.seg_length[seg] * self.seg_period[seg]:
+            # Cutoff falls in the gap after this burst, drop all of it
+            count = int(self.seg_start[seg] + self.seg_length[seg])
+        self.trim_start(count)
+
+    def close(self):
+        """Release spill files; the capture is unusable afterwards"""
+        self.store.close()
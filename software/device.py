@@ -1,83 +1,441 @@
 import serial
 import serial.tools.list_ports
+import json
+import os
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from perf import counters
+from simulator import SIM_PORT, SimulatedSerial
+from recording import REPLAY_PREFIX, RecordingSerial, open_replay
+
+# Seconds to wait for the info response; STATUS: ends it early
+INFO_TIMEOUT = 1.0
+
+# Sample rate (Hz) set by each rate command
+RATE_CODES_HZ = {
+    'E': 100, 'D': 1000, 'B': 10000, 'A': 100000,
+    '1': 1000000, '2': 2000000, '5': 5000000, '6': 6000000,
+}
+
+# Frame bytes besides the payload: header, count, rate, runs, END line
+FRAME_OVERHEAD = 20
+
+# Streaming chunk bytes besides the samples: marker, sequence, count
+CHUNK_OVERHEAD = 12
+
+# Share of the link's throughput streaming may plan on; the rest absorbs
+# jitter so chunks are not dropped continuously at the limit
+STREAM_LINK_SHARE = 0.9
+
+# Slack added to the expected duration of a capture before giving up
+CAPTURE_TIMEOUT_MARGIN = 1.0
+
+# Default upper bound for link speed negotiation (LA_MAX_BAUD overrides;
+# 0 keeps the firmware's power-on speed)
+DEFAULT_MAX_BAUD = int(os.environ.get('LA_MAX_BAUD', 2000000))
+
+# Echo round trips that must pass at a new speed before it is kept. The
+# pattern alternates bits ('U' is 0x55, '*' 0x2A) so a wrong speed
+# garbles it; it is fixed so recorded sessions replay byte for byte.
+ECHO_ROUNDS = 3
+ECHO_PATTERN = "UUUU****~~~~0123456789"
+# Seconds to wait for a link command's reply
+LINK_TIMEOUT = 0.1
+# The firmware returns to the old speed when a switch is not confirmed
+# within 250 ms; wait slightly longer before talking to it again
+BAUD_REVERT_S = 0.3
+
+# Last known device info per serial port, so reconnects skip the query
+PORT_CACHE_PATH = os.environ.get('LA_PORT_CACHE',
+                                 os.path.join(os.path.expanduser('~'), '.la8_ports.json'))
+
+# Seconds a cached port gets to answer the info query; a live analyzer
+# answers well within it, a stale entry fails fast and is dropped
+CACHE_CHECK_TIMEOUT = 0.3
+
+def load_port_cache():
+    try:
+        with open(PORT_CACHE_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_port_cache(cache):
+    try:
+        with open(PORT_CACHE_PATH, 'w') as f:
+            json.dump(cache, f, indent=2)
+    except OSError as e:
+        print(f"Could not save port cache: {e}")
+
+def forget_port(cache, port):
+    """Drop a port whose analyzer no longer answers from the cache"""
+    if cache.pop(port, None) is not None:
+        counters.count('port_cache_stale')
+        save_port_cache(cache)
+
+def read_info(port, timeout=INFO_TIMEOUT, poll_interval=0.01):
+    """Send 'I' and return the response lines, up to and including STATUS:"""
+    port.write(b'I')
+    lines = []
+    start_time = time.time()
+    while time.time() - start_time < timeout:
+        if port.in_waiting > 0:
+            line = port.readline().decode('utf-8', errors='ignore').strip()
+            if line:
+                lines.append(line)
+            if line.startswith('STATUS:'):  # Last line of info
+                break
+        else:
+            time.sleep(poll_interval)
+    return lines
+
+def parse_info(lines):
+    """Device info dict from info response lines (None if there are none)"""
+    if not lines:
+        return None
+    info = {
+        'type': 'info',
+        'device_name': 'STM32-UART-LA8',
+        'version': '3.1-UART',
+        'channels': 8,
+        'buffer_size': 2048,
+        'max_rate': 6000000,
+        'encodings': ['RAW'],
+        'stream_max_rate': 0
+    }
+    
+    # Parse specific info
+    for line in lines:
+        if line.startswith('INFO:'):
+            info['device_name'] = line.split(':')[1]
+        elif 'VERSION:' in line:
+            info['version'] = line.split(':')[1]
+        elif 'CHANNELS:' in line:
+            info['channels'] = int(line.split(':')[1])
+        elif 'BUFFER:' in line:
+            info['buffer_size'] = int(line.split(':')[1])
+        elif 'MAX:' in line:
+            max_str = line.split(':')[1].replace('MHz', '').replace('Hz', '')
+            info['max_rate'] = int(float(max_str) * 1000000)
+        elif line.startswith('RATE:'):
+            info['rate_hz'] = int(line.split(':')[1].replace('Hz', ''))
+        elif 'ENCODINGS:' in line:
+            info['encodings'] = line.split(':')[1].split(',')
+        elif 'CHECKSUMS:' in line:
+            info['checksums'] = line.split(':')[1].split(',')
+        elif 'BAUDS:' in line:
+            info['bauds'] = [int(b) for b in line.split(':')[1].split(',')]
+        elif 'STREAM_LIMIT:' in line:
+            info['stream_max_rate'] = int(line.split(':')[1])
+    return info
+
+def decode_rle(payload):
+    """Expand (level, run - 1) byte pairs into packed samples"""
+    with counters.timed('decode_rle'):
+        pairs = np.frombuffer(payload, dtype=np.uint8)[:len(payload) // 2 * 2].reshape(-1, 2)
+        return np.repeat(pairs[:, 0], pairs[:, 1].astype(np.intp) + 1)
 
 class LogicAnalyzerDevice:
     """Device driver for STM32-UART-LA8 Logic Analyzer (DMA Version)"""
     
-    def __init__(self, port=None, baudrate=115200):
+    def __init__(self, port=None, baudrate=115200, compression=True,
+                 record_path=None, replay_realtime=False, max_baudrate=None,
+                 checksums=True):
         self.port = port
         self.baudrate = baudrate
+        # Link speed to negotiate up to after connecting, if the firmware can
+        self.initial_baudrate = baudrate
+        self.max_baudrate = max_baudrate
+        # Frames carry a CRC32 once enabled (if checksums and the firmware
+        # offers it); last_error tells a corrupt frame ('crc') from a missing one
+        self.checksums = checksums
+        self.crc = False
+        self.last_error = None
         self.serial = None
         self.device_info = None
+        # Log all serial traffic to this file (see recording.py)
+        self.record_path = record_path
+        self.replay_realtime = replay_realtime
+        # Waits for the device; a max-speed replay needs none
+        self.response_delay = 0.1
+        self.poll_interval = 0.01
+        # Use run-length encoded transfers when the firmware offers them
+        self.compression = compression
+        self.encoding = 'RAW'
+        self.streaming = False
+        # Reused for every frame payload; see capture()
+        self.frame_buffer = bytearray()
+        # Reuse the cached info of a real port instead of querying it
+        self.use_cache = True
+        # Burst timing: current rate, measured link throughput (bytes/s)
+        # and the measurements of the last capture
+        self.sample_rate_hz = 0
+        self.link_rate = baudrate / 10.0
+        self.last_burst = None
+        self.capture_requested_at = None
+        # Receives every frame and chunk read, e.g. a server.CaptureServer
+        self.publisher = None
     
     @staticmethod
     def list_ports():
         """List available serial ports"""
         ports = serial.tools.list_ports.comports()
-        return [port.device for port in ports]
+        devices = [port.device for port in ports]
+        # LA_SIMULATOR=1 offers an in-process simulated device
+        if os.environ.get('LA_SIMULATOR'):
+            devices.append(SIM_PORT)
+        # LA_REPLAY=<recording> offers a replay of a recorded session
+        if os.environ.get('LA_REPLAY'):
+            devices.append(REPLAY_PREFIX + os.environ['LA_REPLAY'])
+        return devices
+    
+    @staticmethod
+    def probe(port, baudrate=115200, timeout=INFO_TIMEOUT):
+        """Return the device info of an analyzer on port, or None"""
+        try:
+            if port == SIM_PORT:
+                link = SimulatedSerial(baudrate, timeout=timeout)
+            else:
+                link = serial.Serial(port, baudrate, timeout=timeout)
+        except (serial.SerialException, OSError):
+            return None
+        try:
+            link.reset_input_buffer()
+            lines = read_info(link, timeout)
+        except (serial.SerialException, OSError):
+            return None
+        finally:
+            link.close()
+        # Anything can sit on a serial port; require our info header
+        if not any(line.startswith('INFO:') for line in lines):
+            return None
+        return parse_info(lines)
+    
+    @classmethod
+    def discover(cls, baudrate=115200, timeout=INFO_TIMEOUT):
+        """Find an analyzer among the serial ports; returns the port or None
+        
+        A port cached from an earlier connection is tried first, with a
+        short probe; one that no longer answers is dropped from the cache.
+        Otherwise every candidate is probed at once on a thread pool and
+        the first to answer wins.
+        """
+        ports = [p for p in cls.list_ports() if not p.startswith(REPLAY_PREFIX)]
+        cache = load_port_cache()
+        for port in ports:
+            if port in cache:
+                info = cls.probe(port, baudrate, min(timeout, CACHE_CHECK_TIMEOUT))
+                if info is not None:
+                    cache[port] = info
+                    save_port_cache(cache)
+                    return port
+                forget_port(cache, port)
+        if not ports:
+            return None
+        
+        executor = ThreadPoolExecutor(max_workers=len(ports), thread_name_prefix='la_probe')
+        try:
+            futures = {executor.submit(cls.probe, port, baudrate, timeout): port for port in ports}
+            for future in as_completed(futures):
+                info = future.result()
+                if info is not None:
+                    port = futures[future]
+                    if port != SIM_PORT:
+                        cache[port] = info
+                        save_port_cache(cache)
+                    return port
+        finally:
+            # Slower probes finish on their own within the timeout
+            executor.shutdown(wait=False, cancel_futures=True)
+        return None
     
     def connect(self):
         """Connect to device"""
         try:
-            self.serial = serial.Serial(self.port, self.baudrate, timeout=2)
-            time.sleep(0.2)  # Wait for device to be ready
+            if self.port == SIM_PORT:
+                self.serial = SimulatedSerial(self.baudrate, timeout=2)
+            elif self.port.startswith(REPLAY_PREFIX):
+                self.serial = open_replay(self.port, self.replay_realtime)
+                if not self.replay_realtime:
+                    self.response_delay = 0.0
+                    self.poll_interval = 0.0
+            else:
+                self.serial = serial.Serial(self.port, self.baudrate, timeout=2)
+            if self.record_path:
+                self.serial = RecordingSerial(self.serial, self.record_path, self.port)
             
             # Clear any pending data
             self.serial.reset_input_buffer()
             
-            # Query device info with 'I' command
-            self.serial.write(b'I')
-            time.sleep(0.2)
+            # Real ports remember their device; recordings and the simulator
+            # always go through the query
+            cacheable = (self.use_cache and not self.record_path and
+                         self.port != SIM_PORT and not self.port.startswith(REPLAY_PREFIX))
+            cache = load_port_cache() if cacheable else {}
             
-            # Read response lines
-            response_lines = []
-            start_time = time.time()
-            while time.time() - start_time < 1.0:
-                if self.serial.in_waiting > 0:
-                    line = self.serial.readline().decode('utf-8', errors='ignore').strip()
-                    if line:
-                        response_lines.append(line)
-                    if 'MAX:' in line:  # Last line of info
-                        break
-            
-            # Parse device info
-            if response_lines:
-                self.device_info = {
-                    'type': 'info',
-                    'device_name': 'STM32-UART-LA8',
-                    'version': '3.1-UART',
-                    'channels': 8,
-                    'buffer_size': 2048,
-                    'max_rate': 6000000
-                }
-                
-                # Parse specific info
-                for line in response_lines:
-                    if 'VERSION:' in line:
-                        self.device_info['version'] = line.split(':')[1]
-                    elif 'CHANNELS:' in line:
-                        self.device_info['channels'] = int(line.split(':')[1])
-                    elif 'BUFFER:' in line:
-                        self.device_info['buffer_size'] = int(line.split(':')[1])
-                    elif 'MAX:' in line:
-                        max_str = line.split(':')[1].replace('MHz', '').replace('Hz', '')
-                        self.device_info['max_rate'] = int(float(max_str) * 1000000)
-                
-                return True
+            # Query device info with 'I' command. A cached port should
+            # answer at once, so it gets a short timeout and is dropped
+            # from the cache if it does not; the full query follows.
+            self.device_info = None
+            if self.port in cache:
+                self.device_info = self._query_info(CACHE_CHECK_TIMEOUT)
+                if self.device_info is None:
+                    forget_port(cache, self.port)
+                    self.serial.reset_input_buffer()
+            if self.device_info is None:
+                self.device_info = self._query_info(INFO_TIMEOUT)
+            if self.device_info is None:
+                return False
+            # The rate comes from the device, never from the cache
+            self.sample_rate_hz = self.device_info.get('rate_hz', 0)
             
-            return False
+            # A device that answers I but not the link setup is not usable;
+            # it is neither connected nor cached
+            if not self._setup_link():
+                print(f"Link setup failed on {self.port}")
+                if self.port in cache:
+                    forget_port(cache, self.port)
+                self.serial.close()
+                self.serial = None
+                return False
+            if cacheable and cache.get(self.port) != self.device_info:
+                cache[self.port] = self.device_info
+                save_port_cache(cache)
+            return True
             
         except Exception as e:
             print(f"Connection error: {e}")
             raise
     
+    def _query_info(self, timeout):
+        """Device info from an 'I' round trip, or None if no analyzer answered"""
+        lines = read_info(self.serial, timeout, self.poll_interval)
+        if not any(line.startswith('INFO:') for line in lines):
+            return None
+        return parse_info(lines)
+    
+    def _setup_link(self):
+        """Negotiate encoding, checksums and link speed; False if it did not answer"""
+        info = self.device_info
+        self.encoding = 'RAW'
+        self.crc = False
+        if self.compression and 'RLE' in info['encodings'] and not self.set_encoding('RLE'):
+            return False
+        if (self.checksums and 'CRC32' in info.get('checksums', []) and
+                not self.set_crc(True)):
+            return False
+        if self.max_baudrate and info.get('bauds'):
+            return self.negotiate_baud(self.max_baudrate) is not None
+        return True
+    
     def disconnect(self):
         """Disconnect from device"""
+        if self.streaming:
+            self.stop_stream()
+        if self.serial and self.baudrate != self.initial_baudrate:
+            # Leave the device at its power-on speed for the next session
+            self._switch_baud(self.initial_baudrate)
         if self.serial:
             self.serial.close()
             self.serial = None
     
+    def set_encoding(self, encoding):
+        """Select the capture transfer encoding: 'RAW' or 'RLE'"""
+        if not self.serial:
+            return False
+        
+        self.serial.reset_input_buffer()
+        self.serial.write(b'L' if encoding == 'RLE' else b'U')
+        response = self.serial.readline().decode('utf-8', errors='ignore').strip()
+        if f'OK:{encoding}' in response:
+            self.encoding = encoding
+            return True
+        return False
+    
+    def set_crc(self, enabled):
+        """Have the device append a CRC32 to every frame and chunk"""
+        if not self.serial:
+            return False
+        
+        self.serial.reset_input_buffer()
+        self.serial.write(b'Q' if enabled else b'N')
+        response = self.serial.readline().decode('utf-8', errors='ignore').strip()
+        if response == ('OK:CRC' if enabled else 'OK:NOCRC'):
+            self.crc = enabled
+            return True
+        return False
+    
+    def _read_line(self, timeout=LINK_TIMEOUT):
+        """One response line, or '' if none completes within timeout"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.serial.in_waiting > 0:
+                line = self.serial.readline().decode('utf-8', errors='ignore').strip()
+                if line:
+                    return line
+            else:
+                time.sleep(self.poll_interval)
+        return ''
+    
+    def _echo(self, n=0):
+        """Checksum-protected echo round trip; True if it came back intact"""
+        token = f"{ECHO_PATTERN}{n}"
+        check = f"{token}:{zlib.crc32(token.encode()):08x}"
+        self.serial.reset_input_buffer()
+        self.serial.write(f"Y{check}\n".encode())
+        return self._read_line() == f"ECHO:{check}"
+    
+    def negotiate_baud(self, max_baudrate):
+        """Move the link to the fastest advertised speed up to max_baudrate
+        
+        Each candidate is tried from the fastest down and kept only if
+        ECHO_ROUNDS echoes pass; otherwise both sides fall back. Returns
+        the speed in use afterwards, or None if the device stopped
+        answering after a failed switch.
+        """
+        candidates = sorted((b for b in self.device_info.get('bauds', [])
+                             if self.baudrate < b <= max_baudrate), reverse=True)
+        for baud in candidates:
+            switched = self._switch_baud(baud)
+            if switched:
+                print(f"Link running at {baud} baud")
+                break
+            if switched is None:
+                return None
+            counters.count('baud_fallbacks')
+        return self.baudrate
+    
+    def _switch_baud(self, baud):
+        """Switch both ends to baud and verify it; reverts on failure
+
+        Returns None if the device does not answer at the old speed
+        after a failed switch either.
+        """
+        old = self.baudrate
+        self.serial.reset_input_buffer()
+        self.serial.write(f"K{baud}\n".encode())
+        if self._read_line() != f"OK:BAUD:{baud}":
+            return False
+        
+        self.serial.baudrate = baud
+        if all(self._echo(n) for n in range(ECHO_ROUNDS)):
+            self.baudrate = baud
+            self.link_rate = baud / 10.0
+            counters.gauge('link_baud', baud)
+            return True
+        
+        # Unconfirmed, the device drops back to the old speed by itself
+        self.serial.baudrate = old
+        time.sleep(BAUD_REVERT_S)
+        self.serial.reset_input_buffer()
+        # Checked with an I round trip, which every firmware answers
+        if self._query_info(CACHE_CHECK_TIMEOUT) is None:
+            print(f"No response at {old} baud after a failed switch to {baud}")
+            return None
+        return False
+    
     def reset_device(self):
         """Reset device using firmware 'R' command"""
         if not self.serial:
@@ -99,24 +457,141 @@ class LogicAnalyzerDevice:
             print(f"Reset error: {e}")
             return False
     
-    def capture(self, timeout=5):
-        """Request capture and read data"""
+    def _read_available(self):
+        """Read whatever is waiting on the port, counting link bytes"""
+        data = self.serial.read(self.serial.in_waiting)
+        counters.rate('link_bytes', len(data))
+        return data
+    
+    def _read_into(self, view, filled, start_time, timeout):
+        """Fill a memoryview from the port in place, starting at filled
+        
+        Returns the number of bytes filled when the view is full or time
+        runs out. Nothing is allocated per read on ports with readinto().
+        """
+        size = len(view)
+        while filled < size and time.time() - start_time < timeout:
+            waiting = self.serial.in_waiting
+            if waiting > 0:
+                n = self.serial.readinto(view[filled:min(size, filled + waiting)])
+                filled += n
+                counters.rate('link_bytes', n)
+            else:
+                time.sleep(self.poll_interval)
+        return filled
+    
+    def _max_samples(self):
+        """Most samples a frame or chunk can hold; larger counts are corrupt"""
+        return self.device_info['buffer_size'] if self.device_info else 2048
+    
+    def _frame_view(self, size, head):
+        """memoryview of size bytes of the reused frame buffer, head copied in"""
+        if len(self.frame_buffer) < size:
+            # A new object: numpy views of the old one may still be alive
+            self.frame_buffer = bytearray(size)
+        view = memoryview(self.frame_buffer)[:size]
+        head = head[:size]
+        view[:len(head)] = head
+        return view, len(head)
+    
+    def _read_until_size(self, buffer, size, start_time, timeout):
+        """Extend buffer from the port until it holds size bytes or time runs out"""
+        while len(buffer) < size and time.time() - start_time < timeout:
+            if self.serial.in_waiting > 0:
+                buffer += self._read_available()
+            time.sleep(self.poll_interval)
+        return buffer
+    
+    def capture(self, timeout=None):
+        """Request capture and read data
+        
+        The frame's samples are a view of a buffer reused by the next
+        capture() call; copy them (Capture does) before capturing again.
+        """
+        if not self.request_capture():
+            return None
+        
+        # Wait a bit for response to start
+        time.sleep(self.response_delay)
+        return self.read_capture(timeout)
+    
+    def request_capture(self):
+        """Start a capture without waiting for it; collect it with read_capture()"""
+        if not self.serial:
+            return False
+        
+        # Clear buffers
+        self.serial.reset_input_buffer()
+        
+        # Send capture command
+        self.serial.write(b'C')
+        self.capture_requested_at = time.time()
+        return True
+    
+    def read_capture(self, timeout=None):
+        """Read the frame of the capture started by request_capture()
+        
+        timeout defaults to capture_timeout(), so slow sample rates do not
+        give up before the device has finished sampling. Returns None if
+        no valid frame arrived; last_error is 'crc' if one arrived corrupt.
+        """
+        self.last_error = None
         if not self.serial:
             return None
+        if timeout is None:
+            timeout = self.capture_timeout()
         
+        start = time.perf_counter()
+        frame = self._capture_frame(timeout)
+        counters.record('serial_read', time.perf_counter() - start)
+        if frame is None:
+            counters.count('frames_dropped')
+        else:
+            counters.count('frames_received')
+            if self.publisher is not None:
+                self.publisher.publish(frame)
+        return frame
+    
+    def expected_burst_time(self):
+        """Expected (sampling, transfer) seconds of one capture
+        
+        Sampling follows from the buffer size and sample rate; transfer
+        from the last frame's size (RLE frames vary) and the measured
+        link throughput, which starts out at the baud rate's.
+        """
+        samples = self.device_info['buffer_size'] if self.device_info else 2048
+        sampling = samples / self.sample_rate_hz if self.sample_rate_hz else 0.0
+        frame_bytes = self.last_burst['bytes'] if self.last_burst else samples + FRAME_OVERHEAD
+        return sampling, frame_bytes / self.link_rate
+    
+    def capture_timeout(self):
+        """Seconds read_capture() waits for a frame from now on"""
+        sampling, transfer = self.expected_burst_time()
+        if self.capture_requested_at is not None:
+            # Part of the sampling time may already have passed
+            sampling = max(0.0, self.capture_requested_at + sampling - time.time())
+        return sampling + 2 * transfer + CAPTURE_TIMEOUT_MARGIN
+    
+    def _record_burst(self, header_time, end_time, frame_bytes):
+        """Keep the timing of a received frame and update the link rate"""
+        transfer = end_time - header_time
+        self.last_burst = {
+            'sampling': header_time - (self.capture_requested_at or header_time),
+            'transfer': transfer,
+            'bytes': frame_bytes,
+        }
+        # Short frames arrive within one poll; they say little about the link
+        if transfer > 4 * self.poll_interval:
+            measured = frame_bytes / transfer
+            self.link_rate += 0.3 * (measured - self.link_rate)
+        counters.gauge('link_rate', round(self.link_rate))
+    
+    def _capture_frame(self, timeout):
         try:
-            # Clear buffers
-            self.serial.reset_input_buffer()
-            
-            # Send capture command
-            self.serial.write(b'C')
-            
-            # Wait a bit for response to start
-            time.sleep(0.1)
-            
             # Check for immediate error response
+            peek = b''
             if self.serial.in_waiting > 0:
-                peek = self.serial.read(self.serial.in_waiting)
+                peek = self._read_available()
                 if b'ERROR:BUSY' in peek:
                     print("Device is BUSY - resetting...")
                     self.reset_device()
@@ -128,45 +603,51 @@ class LogicAnalyzerDevice:
                 elif b'ERROR' in peek:
                     print(f"Device error: {peek}")
                     return None
-                else:
-                    # Put data back for processing
-                    # Can't actually put it back, so we need to handle this differently
-                    pass
+                # Otherwise the frame has started; keep it for the header search
             
             # Read header line "DATA:"
             start_time = time.time()
             header_found = False
-            buffer = b''
+            buffer = peek
             
             while time.time() - start_time < timeout:
-                if self.serial.in_waiting > 0:
-                    buffer += self.serial.read(self.serial.in_waiting)
+                if buffer or self.serial.in_waiting > 0:
+                    buffer += self._read_available()
                     
-                    if b'DATA:' in buffer:
-                        # Find position of DATA:
-                        data_pos = buffer.find(b'DATA:')
+                    # Raw frames start with DATA:, run-length encoded ones with RLE:
+                    data_pos = buffer.find(b'DATA:')
+                    rle_pos = buffer.find(b'RLE:')
+                    if rle_pos >= 0 and (data_pos < 0 or rle_pos < data_pos):
+                        data_pos = rle_pos
+                    if data_pos >= 0:
+                        if data_pos > 0:
+                            # Stray bytes before the header, e.g. a late END
+                            counters.count('frames_resynced')
                         buffer = buffer[data_pos:]  # Remove anything before DATA:
                         header_found = True
+                        # The burst ended just before the firmware started sending
+                        header_time = time.time()
                         break
                     
                     if b'ERROR' in buffer:
                         print(f"Error in response: {buffer}")
                         return None
                 
-                time.sleep(0.01)
+                time.sleep(self.poll_interval)
             
             if not header_found:
                 print(f"Error: DATA header not found. Received: {buffer[:100]}")
                 return None
             
-            # Remove "DATA:" from buffer
-            buffer = buffer[5:]
+            # Remove "DATA:" or "RLE:" from buffer
+            is_rle = buffer.startswith(b'RLE:')
+            buffer = buffer[4:] if is_rle else buffer[5:]
             
             # Read count (4 bytes)
             while len(buffer) < 4 and time.time() - start_time < timeout:
                 if self.serial.in_waiting > 0:
-                    buffer += self.serial.read(self.serial.in_waiting)
-                time.sleep(0.01)
+                    buffer += self._read_available()
+                time.sleep(self.poll_interval)
             
             if len(buffer) < 4:
                 return None
@@ -182,8 +663,8 @@ class LogicAnalyzerDevice:
             # Read sample_rate_hz (4 bytes)
             while len(buffer) < 4 and time.time() - start_time < timeout:
                 if self.serial.in_waiting > 0:
-                    buffer += self.serial.read(self.serial.in_waiting)
-                time.sleep(0.01)
+                    buffer += self._read_available()
+                time.sleep(self.poll_interval)
             
             if len(buffer) < 4:
                 return None
@@ -196,26 +677,55 @@ class LogicAnalyzerDevice:
                             (rate_bytes[2] << 16) | 
                             (rate_bytes[3] << 24))
             
+            # RLE frames add the number of (level, run) pairs
+            run_count = 0
+            if is_rle:
+                buffer = self._read_until_size(buffer, 4, start_time, timeout)
+                if len(buffer) < 4:
+                    return None
+                run_count = int.from_bytes(buffer[:4], 'little')
+                buffer = buffer[4:]
+            
+            # Counts come off the wire: a corrupt header must not size the
+            # frame buffer. Every run holds at least one sample.
+            if sample_count > self._max_samples() or run_count > sample_count:
+                counters.count('frames_corrupt')
+                self.last_error = 'crc'
+                return None
+            
             # Read newline
             while len(buffer) < 1 and time.time() - start_time < timeout:
                 if self.serial.in_waiting > 0:
-                    buffer += self.serial.read(self.serial.in_waiting)
-                time.sleep(0.01)
+                    buffer += self._read_available()
+                time.sleep(self.poll_interval)
             
             if buffer[0:1] == b'\n':
                 buffer = buffer[1:]
             
-            # Read sample data
-            while len(buffer) < sample_count and time.time() - start_time < timeout:
-                if self.serial.in_waiting > 0:
-                    buffer += self.serial.read(self.serial.in_waiting)
-                time.sleep(0.01)
-            
-            samples = buffer[:sample_count]
-            buffer = buffer[sample_count:]
+            # The payload (and CRC) is read in place into the reused frame buffer
+            payload_size = 2 * run_count if is_rle else sample_count
+            trailer = 4 if self.crc else 0
+            view, filled = self._frame_view(payload_size + trailer, buffer)
+            filled = self._read_into(view, filled, start_time, timeout)
+            payload = np.frombuffer(self.frame_buffer, dtype=np.uint8,
+                                    count=min(filled, payload_size))
+            if trailer and filled == payload_size + trailer:
+                header = count_bytes + rate_bytes + (run_count.to_bytes(4, 'little') if is_rle else b'')
+                expected = int.from_bytes(view[payload_size:], 'little')
+                if zlib.crc32(payload, zlib.crc32(header)) != expected:
+                    counters.count('frames_corrupt')
+                    self.last_error = 'crc'
+                    return None
+            if is_rle:
+                samples = decode_rle(payload)[:sample_count]
+                counters.count('frames_rle')
+            else:
+                samples = payload
             
             if len(samples) < sample_count:
                 print(f"Warning: Expected {sample_count} samples, got {len(samples)}")
+            else:
+                self._record_burst(header_time, time.time(), payload_size + trailer + FRAME_OVERHEAD)
             
             # Calculate sample period in nanoseconds from sample rate
             if sample_rate_hz > 0:
@@ -223,13 +733,17 @@ class LogicAnalyzerDevice:
             else:
                 sample_period_ns = 1000  # Default 1us if rate is 0
             
+            # Host time of the first sample, back-dated by the burst duration
+            timestamp = header_time - sample_count * sample_period_ns / 1e9
+            
             # Return in expected format
             return {
                 'type': 'capture',
                 'samples': samples,
                 'sample_period_ns': sample_period_ns,
                 'sample_count': len(samples),
-                'sample_rate_hz': sample_rate_hz
+                'sample_rate_hz': sample_rate_hz,
+                'timestamp': timestamp
             }
             
         except Exception as e:
@@ -238,6 +752,145 @@ class LogicAnalyzerDevice:
             traceback.print_exc()
             return None
     
+    def start_stream(self):
+        """Start continuous streaming; chunks are collected with read_stream()"""
+        if not self.serial or self.streaming:
+            return False
+        if self.sample_rate_hz > self.stream_limit_hz():
+            # The link would drop most chunks; bursts do better
+            print(f"Streaming is limited to {self.stream_limit_hz()} Hz at {self.baudrate} baud")
+            return False
+        
+        self.serial.reset_input_buffer()
+        self.serial.write(b'S')
+        response = self.serial.readline().decode('utf-8', errors='ignore').strip()
+        if not response.startswith('OK:STREAM:'):
+            print(f"Stream start failed: {response}")
+            return False
+        
+        self.stream_rate_hz = int(response.split(':')[2])
+        self.stream_period_ns = int(1_000_000_000 / self.stream_rate_hz)
+        # Chunk n starts n * chunk length samples after this
+        self.stream_start_time = time.time()
+        self.stream_buffer = b''
+        self.next_sequence = 0
+        self.streaming = True
+        return True
+    
+    def stream_limit_hz(self):
+        """Highest sample rate start_stream() accepts on the current link
+        
+        The firmware's STREAM_LIMIT bounds what its DMA handling keeps up
+        with; raw chunks also need one byte per sample on the link, so at
+        the power-on 115200 baud only about 10 kHz streams without gaps.
+        """
+        info = self.device_info
+        if not info or not info.get('stream_max_rate'):
+            return 0
+        half = info['buffer_size'] // 2
+        chunk_bytes = half + CHUNK_OVERHEAD + (4 if self.crc else 0)
+        link_hz = self.link_rate * STREAM_LINK_SHARE * half / chunk_bytes
+        return min(info['stream_max_rate'], int(link_hz))
+    
+    def stop_stream(self):
+        """Stop streaming and discard chunks still in flight"""
+        if not self.serial or not self.streaming:
+            return
+        
+        self.streaming = False
+        self.serial.write(b'X')
+        time.sleep(self.response_delay)
+        self.serial.reset_input_buffer()
+    
+    def read_stream(self):
+        """Return the streaming chunks received since the last call
+        
+        Each chunk is a frame dict like capture() returns, plus its
+        'sequence' number and how many chunks were 'dropped' before it
+        (the device skips halves the link could not keep up with).
+        """
+        if not self.streaming:
+            return []
+        
+        # Unparsed bytes from the last poll, then what is waiting, read in
+        # place. A new buffer per poll: the chunks' samples are views into
+        # it, so it is never resized, and only the unparsed tail is carried
+        # over to the next one.
+        leftover = len(self.stream_buffer)
+        data = bytearray(leftover + self.serial.in_waiting)
+        data[:leftover] = self.stream_buffer
+        view = memoryview(data)
+        size = leftover
+        if len(data) > leftover:
+            size += self.serial.readinto(view[leftover:])
+            counters.rate('link_bytes', size - leftover)
+        
+        chunks = []
+        pos = 0
+        while True:
+            # Raw chunks start with CHK:, run-length encoded ones with CHR:
+            positions = [p for p in (data.find(b'CHK:', pos, size), data.find(b'CHR:', pos, size))
+                         if p >= 0]
+            if not positions:
+                # Keep a partial marker that may complete with the next read
+                pos = max(pos, size - 3)
+                break
+            if min(positions) > pos:
+                counters.count('frames_resynced')
+                pos = min(positions)
+            
+            is_rle = data[pos + 2] == ord('R')
+            header_size = 16 if is_rle else 12
+            if size < pos + header_size:
+                break
+            header = bytes(view[pos:pos + header_size])
+            sequence = int.from_bytes(header[4:8], 'little')
+            sample_count = int.from_bytes(header[8:12], 'little')
+            run_count = int.from_bytes(header[12:16], 'little') if is_rle else 0
+            if sample_count > self._max_samples() or run_count > sample_count:
+                # A corrupt header; waiting for its payload would stall the
+                # stream, so look for the next marker instead
+                counters.count('frames_corrupt')
+                pos += 4
+                continue
+            payload_size = 2 * run_count if is_rle else sample_count
+            trailer = 4 if self.crc else 0
+            end = pos + header_size + payload_size
+            if size < end + trailer:
+                break
+            
+            payload = np.frombuffer(data, dtype=np.uint8, count=payload_size,
+                                    offset=pos + header_size)
+            if trailer and zlib.crc32(view[pos + 4:end]) != int.from_bytes(view[end:end + 4], 'little'):
+                # Dropped; the sequence gap shows up like a skipped chunk
+                counters.count('frames_corrupt')
+                pos = end + trailer
+                continue
+            pos = end + trailer
+            samples = decode_rle(payload)[:sample_count] if is_rle else payload
+            
+            dropped = max(0, sequence - self.next_sequence)
+            self.next_sequence = sequence + 1
+            counters.count('chunks_received')
+            if dropped:
+                counters.count('chunks_dropped', dropped)
+            
+            chunks.append({
+                'type': 'chunk',
+                'samples': samples,
+                'sample_period_ns': self.stream_period_ns,
+                'sample_count': len(samples),
+                'sample_rate_hz': self.stream_rate_hz,
+                'sequence': sequence,
+                'dropped': dropped,
+                'timestamp': self.stream_start_time + sequence * sample_count / self.stream_rate_hz
+            })
+        self.stream_buffer = bytes(view[pos:size])
+        if self.publisher is not None:
+            for chunk in chunks:
+                self.publisher.publish(chunk)
+        return chunks
+    
     def set_sample_rate(self, rate_code):
         """Set sample rate using firmware commands
         rate_code: '1' = 1MHz, '2' = 2MHz, '5' = 5MHz, '6' = 6MHz
@@ -247,11 +900,15 @@ class LogicAnalyzerDevice:
         
         self.serial.reset_input_buffer()
         self.serial.write(rate_code.encode())
-        time.sleep(0.1)
+        time.sleep(self.response_delay)
         
-        # Read response
-        if self.serial.in_waiting > 0:
+        # Read response; the END line of a frame just read may still come first
+        while self.serial.in_waiting > 0:
             response = self.serial.readline().decode('utf-8', errors='ignore').strip()
-            return 'OK:' in response
+            if 'OK:' in response:
+                self.sample_rate_hz = RATE_CODES_HZ.get(rate_code, self.sample_rate_hz)
+                return True
+            if 'ERROR' in response:
+                break
         
         return False
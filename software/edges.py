@@ -0,0 +1,240 @@
+import numpy as np
+
+from perf import counters
+
+# Edges are stored as int32 offsets from a per-channel base index, half
+# the RAM of absolute int64 indices; a channel whose retained edges span
+# more than this many samples falls back to int64
+MAX_SPAN = np.iinfo(np.int32).max - 1
+
+def _search(data, base, indices, side='left'):
+    """np.searchsorted of absolute indices in offsets from base
+
+    The keys are converted to the array's dtype first: searching int32
+    data with int64 keys would make numpy copy the whole array each time.
+    """
+    keys = np.asarray(indices, dtype=np.int64) - base
+    if data.dtype == np.int32:
+        keys = np.clip(keys, -1, MAX_SPAN + 1).astype(np.int32)
+    return np.searchsorted(data, keys, side)
+
+class EdgeList:
+    """Growable sorted array of absolute sample indices with front drop
+
+    Indices are kept as offsets from base. Stored values are never moved
+    or overwritten: growing (or rebasing) copies into a new array, so a
+    run() taken earlier stays valid while appends go on.
+    """
+
+    def __init__(self, capacity=1024):
+        self.data = np.empty(capacity, dtype=np.int32)
+        self.base = 0
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    @property
+    def used_bytes(self):
+        return len(self) * self.data.itemsize
+
+    def append(self, indices, offset=0):
+        """Append sorted indices, each plus offset"""
+        count = len(indices)
+        if count == 0:
+            return
+        if self.tail == self.head:
+            # Empty: offsets can start from here. Slots before tail may
+            # still be viewed by a run() taken earlier, so none are reused
+            self.base = offset
+        last = offset + int(indices[-1]) - self.base
+        if self.tail + count > len(self.data) or last > self._max_value():
+            self._grow(count, offset + int(indices[-1]))
+        # Added in place, so narrow relative positions never overflow
+        np.add(indices, np.int64(offset - self.base), out=self.data[self.tail:self.tail + count],
+               casting='unsafe')
+        self.tail += count
+
+    def _max_value(self):
+        return MAX_SPAN if self.data.dtype == np.int32 else np.iinfo(np.int64).max
+
+    def _grow(self, count, last):
+        """Copy the retained offsets into a new array with room for count more
+
+        The new base is the oldest retained index; offsets that still do
+        not fit int32 switch the channel to int64.
+        """
+        size = self.tail - self.head
+        base = self.base + int(self.data[self.head]) if size else self.base
+        dtype = np.int32 if last - base <= MAX_SPAN else np.int64
+        # Sized from what is retained, so trimmed history gives RAM back
+        capacity = 1024
+        while capacity < 2 * (size + count):
+            capacity *= 2
+        data = np.empty(capacity, dtype=dtype)
+        np.subtract(self.data[self.head:self.tail], np.int64(base - self.base), out=data[:size],
+                    casting='unsafe')
+        self.data = data
+        self.base = base
+        self.head = 0
+        self.tail = size
+
+    def drop_before(self, index):
+        self.head += int(_search(self.data[self.head:self.tail], self.base, index))
+        if len(self.data) > 1024 and 8 * len(self) < len(self.data):
+            # Mostly dropped: give the RAM back
+            self._grow(0, self.base + int(self.data[self.tail - 1]) if len(self) else self.base)
+
+    def run(self):
+        """(offsets, base) of the retained indices; views, no copy"""
+        return self.data[self.head:self.tail], self.base
+
+def frame_edges(samples, num_channels=8, scratch=None):
+    """Per-channel positions of level changes inside one frame of packed samples
+
+    Position n means sample n differs from sample n - 1, so the first
+    sample is never included. scratch is an optional reusable uint8 buffer
+    at least as long as samples.
+    """
+    samples = np.frombuffer(samples, dtype=np.uint8)
+    changed = np.empty(len(samples), dtype=np.uint8) if scratch is None else scratch[:len(samples)]
+    if len(samples) == 0:
+        return [np.empty(0, dtype=np.intp) for _ in range(num_channels)]
+    # XOR with the previous sample flags every channel that changed
+    changed[0] = 0
+    np.bitwise_xor(samples[1:], samples[:-1], out=changed[1:])
+    rows = np.flatnonzero(changed)
+    bits = changed[rows]
+    return [rows[(bits >> ch) & 1 == 1] for ch in range(num_channels)]
+
+class EdgeView:
+    """Lookups shared by EdgeIndex and its snapshots; needs channel_run()"""
+
+    def search(self, ch, indices, side='left'):
+        """np.searchsorted of absolute indices among the channel's edges"""
+        return _search(*self.channel_run(ch), indices, side)
+
+    def between(self, ch, start, stop):
+        """Absolute indices of the channel's edges in [start, stop) (int64 copy)"""
+        data, base = self.channel_run(ch)
+        lo, hi = _search(data, base, [start, stop])
+        return np.add(data[lo:hi], np.int64(base), dtype=np.int64)
+
+    def nearest(self, ch, index):
+        """Absolute index of the channel's edge closest to index, or None"""
+        data, base = self.channel_run(ch)
+        if len(data) == 0:
+            return None
+        i = int(_search(data, base, index))
+        if i == 0:
+            return base + int(data[0])
+        if i == len(data):
+            return base + int(data[-1])
+        before, after = base + int(data[i - 1]), base + int(data[i])
+        return before if index - before <= after - index else after
+
+    def count_between(self, ch, start, stop):
+        """Number of the channel's edges in [start, stop)"""
+        lo, hi = self.search(ch, [start, stop])
+        return int(hi - lo)
+
+class EdgeSnapshot(EdgeView):
+    """The edges an EdgeIndex held at one moment; later appends do not show"""
+
+    def __init__(self, runs, nbytes):
+        self.runs = runs
+        self.nbytes = nbytes
+
+    def channel_run(self, ch):
+        return self.runs[ch]
+
+class EdgeIndex(EdgeView):
+    """Per-channel positions of every level change, built as samples arrive
+
+    Edge n of a channel is the absolute index of the first sample after a
+    change. Lookups are binary searches, so snapping to or stepping
+    between edges costs the same on a second or on hours of data.
+
+    The index lives in RAM; nbytes is what it holds there, which Capture
+    counts against its RAM budget along with the samples.
+    """
+
+    def __init__(self, num_channels=8):
+        self.num_channels = num_channels
+        self.edges = [EdgeList() for _ in range(num_channels)]
+        self.last_sample = None
+        self._changed = np.empty(0, dtype=np.uint8)     # reused scratch
+
+    @property
+    def nbytes(self):
+        return sum(edges.nbytes for edges in self.edges)
+
+    def append(self, samples, start, channel_mask=0xFF, edges=None, new_segment=False):
+        """Index packed samples whose first one has absolute index start
+
+        edges are the samples' frame_edges() when already computed, e.g. by
+        the acquisition process; only the first sample is compared here.
+        new_segment: the samples start a new burst, so their first sample
+        is not compared with the previous append's last one.
+        """
+        if len(samples) == 0:
+            return
+        with counters.timed('edge_index'):
+            samples = np.frombuffer(samples, dtype=np.uint8)
+            if edges is None:
+                if len(self._changed) < len(samples):
+                    self._changed = np.empty(len(samples), dtype=np.uint8)
+                edges = frame_edges(samples, self.num_channels, self._changed)
+            # The first sample changes against the previous append's last
+            # one, unless a gap lies between them
+            joined = self.last_sample is not None and not new_segment
+            previous = self.last_sample if joined else samples[0]
+            first = (samples[0] ^ previous) & channel_mask
+            for ch in range(self.num_channels):
+                if not channel_mask >> ch & 1:
+                    continue
+                hits = edges[ch]
+                if first >> ch & 1:
+                    hits = np.concatenate(([0], hits))
+                if len(hits):
+                    self.edges[ch].append(hits, start)
+            self.last_sample = samples[-1]
+
+    def drop_before(self, index):
+        for edges in self.edges:
+            edges.drop_before(index)
+
+    def excess_start(self, max_bytes):
+        """Absolute index to trim to so the retained edges fit max_bytes
+
+        Returns None when they fit already.
+        """
+        if sum(edges.used_bytes for edges in self.edges) <= max_bytes:
+            return None
+        runs = [edges.run() for edges in self.edges if len(edges)]
+        lo = min(base + int(data[0]) for data, base in runs)
+        hi = max(base + int(data[-1]) for data, base in runs) + 1
+        # Binary search for the oldest index whose newer edges fit
+        while lo < hi:
+            mid = (lo + hi) // 2
+            kept = sum((len(data) - int(_search(data, base, mid))) * data.itemsize
+                       for data, base in runs)
+            if kept > max_bytes:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def channel_run(self, ch):
+        """(offsets, base) of a channel's edges: base + offsets are the
+        absolute indices (views, no copy)"""
+        return self.edges[ch].run()
+
+    def snapshot(self):
+        """EdgeSnapshot of the current edges, O(channels) and without copying"""
+        return EdgeSnapshot([edges.run() for edges in self.edges], self.nbytes)
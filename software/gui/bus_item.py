@@ -0,0 +1,232 @@
+"""
+Bus lanes: a group of channels drawn as one lane of hex values
+"""
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import Qt, QRectF, QPointF
+from PyQt5.QtGui import QColor, QFont, QFontMetricsF, QPainter, QStaticText, QTransform
+
+from perf import counters
+from .density_item import minmax_columns
+
+# Value segments narrower than this merge into one activity block
+MIN_SEGMENT_PX = 4
+
+# Width of the slanted transition at each end of a value segment
+SLANT_PX = 3
+
+
+def parse_bus(text, default_name, num_channels=8):
+    """(name, channels) from "NAME:0-3" or "4,5,6,7"; channels[0] is the LSB"""
+    name, _, spec = text.rpartition(':')
+    channels = []
+    for part in spec.split(','):
+        part = part.strip()
+        if '-' in part:
+            first, last = (int(v) for v in part.split('-'))
+            step = 1 if last >= first else -1
+            channels.extend(range(first, last + step, step))
+        elif part:
+            channels.append(int(part))
+    if (not channels or len(set(channels)) != len(channels) or
+            not all(0 <= ch < num_channels for ch in channels)):
+        raise ValueError(f"Invalid bus channels: {spec!r}")
+    return name.strip() or default_name, channels
+
+
+def group_values(levels, channels):
+    """Bus values from packed samples, channels[0] as the least significant bit"""
+    values = np.zeros(len(levels), dtype=np.int64)
+    for bit, ch in enumerate(channels):
+        values |= ((levels >> ch) & 1).astype(np.int64) << bit
+    return values
+
+
+def bus_changes(capture, channels, start, stop):
+    """Segments of constant bus value in samples [start, stop)
+
+    Change points come from one diff of the packed samples masked to the
+    group, so no channel is unpacked. Each burst starts a new segment, and
+    segments end after their last sample so gaps between bursts stay
+    empty. Returns (starts, ends, values) on the compact timeline.
+    """
+    mask = 0
+    for ch in channels:
+        mask |= 1 << ch
+    packed = capture.get_samples(start, stop) & mask
+    changes = np.flatnonzero(packed[1:] != packed[:-1]) + 1
+    seg_start, _, seg_period, _, _ = capture.segment_arrays()
+    bursts = seg_start[(seg_start > start) & (seg_start < stop)] - start
+    points = np.union1d(np.concatenate(([0], changes)), bursts)
+
+    last = np.append(points[1:], stop - start) - 1 + start
+    ends = capture.compact_x(last) + seg_period[capture.segment_ids(last)]
+    return capture.compact_x(points + start), ends, group_values(packed[points], channels)
+
+
+def bus_columns(capture, channels, x_min, x_max, width):
+    """Segments of a bus with one pixel column resolution, from the EdgeIndex
+
+    Runs of columns where no member channel changes become one segment
+    with the bus value; columns with changes become activity (value -1).
+    Costs a few binary searches per column and reads no samples, so it
+    suits views far too long to diff. Returns (starts, ends, values).
+    """
+    low, high, valid = minmax_columns(capture, channels, x_min, x_max, width)
+    busy = (low != high).any(axis=0)
+    keys = np.zeros(width, dtype=np.int64)
+    for bit in range(len(channels)):
+        keys |= high[bit].astype(np.int64) << bit
+    keys[busy] = -1
+    keys[~valid] = -2
+
+    starts = np.flatnonzero(np.diff(keys, prepend=-3))
+    ends = np.append(starts[1:], width)
+    shown = keys[starts] != -2
+    xs = np.linspace(x_min, x_max, width + 1)
+    return xs[starts[shown]], xs[ends[shown]], keys[starts[shown]]
+
+
+class BusItem(pg.GraphicsObject):
+    """Draws bus lanes: a channel group's value as hex between transitions
+
+    The view hands over the segments of the visible window only
+    (set_segments). Segments narrower than MIN_SEGMENT_PX are merged into
+    solid activity blocks and values are labelled only where the text
+    fits, so a busy bus costs a few rectangles and at most one label per
+    text width however many changes the window holds.
+    """
+
+    def __init__(self, colors, label_color, lane_spacing=1.0, lane_height=0.8):
+        super().__init__()
+        self.colors = colors
+        self.label_color = label_color
+        self.lane_spacing = lane_spacing
+        self.lane_height = lane_height
+        self.font = QFont("monospace", 9, QFont.Bold)
+        self.font.setStyleHint(QFont.Monospace)
+        self.char_width = QFontMetricsF(self.font).horizontalAdvance('0')
+        self.buses = []
+        self.bases = []
+        self.labels = []
+        self.segments = []
+        self._rect = QRectF()
+
+    def set_buses(self, buses, bases):
+        """Configure lanes as (name, channels) drawn with their low level at bases"""
+        self.buses = list(buses)
+        self.bases = list(bases)
+        self.segments = [None] * len(self.buses)
+        self.labels = []
+        for bus, (name, channels) in enumerate(self.buses):
+            color = self.colors[bus % len(self.colors)]
+            # Runs like 0-7 or 7-4 are shown as a range
+            ordered = sorted(channels) in (channels, channels[::-1])
+            if ordered and len(channels) > 2 and abs(channels[-1] - channels[0]) == len(channels) - 1:
+                members = f"{channels[0]}-{channels[-1]}"
+            else:
+                members = ','.join(str(ch) for ch in channels)
+            label = QStaticText(
+                f'<span style="color: {color};">{name}</span> '
+                f'<span style="color: {self.label_color}; font-size: 8pt;">(CH{members})</span>'
+            )
+            label.setTextFormat(Qt.RichText)
+            label.prepare(QTransform(), self.font)
+            self.labels.append(label)
+        self.update()
+
+    def set_segments(self, x_min, x_max, segments):
+        """Show (starts, ends, values) per bus for the view [x_min, x_max)"""
+        self.segments = list(segments)
+        top = (max(self.bases) + 1) * self.lane_spacing if self.bases else 0.0
+        rect = QRectF(x_min, -0.5, x_max - x_min, top + 0.5)
+        if rect != self._rect:
+            self.prepareGeometryChange()
+            self._rect = rect
+        self.update()
+
+    def boundingRect(self):
+        return self._rect
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        # Follows the view rather than the data; never drive auto-range
+        return None, None
+
+    def paint(self, painter, option, widget=None):
+        with counters.timed('paint_bus'):
+            self._paint(painter)
+
+    def _paint(self, painter):
+        view = self.viewRect()
+        if view is None or not self.buses:
+            return
+
+        # Drawn in device pixels so slants and labels keep their size
+        transform = painter.transform()
+        painter.save()
+        painter.resetTransform()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setFont(self.font)
+        scale, offset = transform.m11(), transform.dx()
+        left = view.left() * scale + offset
+        right = view.right() * scale + offset
+
+        for bus, segments in enumerate(self.segments):
+            y_top = transform.map(QPointF(0, self.bases[bus] + self.lane_height)).y()
+            y_bottom = transform.map(QPointF(0, self.bases[bus])).y()
+            if segments is not None and len(segments[0]):
+                color = QColor(self.colors[bus % len(self.colors)])
+                digits = max(1, -(-len(self.buses[bus][1]) // 4))
+                self._paint_lane(painter, segments, color, digits,
+                                 left, right, scale, offset, y_top, y_bottom)
+
+            # Name pinned to the left edge, like the channel labels
+            label = self.labels[bus]
+            height = label.size().height()
+            painter.drawStaticText(QPointF(left + 4, (y_top + y_bottom) / 2 - height / 2), label)
+        painter.restore()
+
+    def _paint_lane(self, painter, segments, color, digits, left, right, scale, offset,
+                    y_top, y_bottom):
+        starts, ends, values = segments
+        # Clip just outside the view so no slant appears at its edges
+        margin = 2 * SLANT_PX
+        x0 = np.maximum(starts * scale + offset, left - margin)
+        x1 = np.minimum(ends * scale + offset, right + margin)
+        visible = x1 > x0
+        x0, x1, values = x0[visible], x1[visible], values[visible]
+        wide = (x1 - x0 >= MIN_SEGMENT_PX) & (values >= 0)
+
+        # Runs of touching narrow or busy segments become one block
+        narrow = np.flatnonzero(~wide)
+        if len(narrow):
+            breaks = (np.diff(narrow) > 1) | (x0[narrow[1:]] > x1[narrow[:-1]] + 1)
+            run_start = narrow[np.concatenate(([True], breaks))]
+            run_end = narrow[np.concatenate((breaks, [True]))]
+            fill = QColor(color)
+            fill.setAlpha(140)
+            for first, last in zip(run_start, run_end):
+                painter.fillRect(QRectF(x0[first], y_top, max(1.0, x1[last] - x0[first]),
+                                        y_bottom - y_top), fill)
+
+        index = np.flatnonzero(wide)
+        if len(index) == 0:
+            return
+        a, b = x0[index], x1[index]
+        slant = np.minimum(SLANT_PX, (b - a) / 2)
+        y_mid = (y_top + y_bottom) / 2
+        # Hexagon per value: mid, top, top, mid, bottom, bottom, mid, break
+        xs = np.column_stack((a, a + slant, b - slant, b, b - slant, a + slant, a,
+                              np.full(len(a), np.nan))).ravel()
+        ys = np.tile([y_mid, y_top, y_top, y_mid, y_bottom, y_bottom, y_mid, np.nan], len(a))
+        painter.setPen(pg.mkPen(color, width=1))
+        painter.drawPath(pg.arrayToQPath(xs, ys, connect='finite'))
+
+        # Labels centred on the visible part, where the text fits
+        text_width = digits * self.char_width + 2 * SLANT_PX
+        shown_a = np.maximum(a, left)
+        shown_b = np.minimum(b, right)
+        for k in np.flatnonzero(shown_b - shown_a >= text_width):
+            painter.drawText(QRectF(shown_a[k], y_top, shown_b[k] - shown_a[k], y_bottom - y_top),
+                             Qt.AlignCenter, f"{values[index[k]]:0{digits}X}")
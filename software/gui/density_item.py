@@ -0,0 +1,182 @@
+"""
+Density rendering of lanes too dense to draw as step lines
+"""
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import QRectF
+from PyQt5.QtGui import QColor, QImage, QPainter
+
+from perf import counters
+
+# Samples read per viewport to estimate the time spent high; longer views
+# are strided down to this
+DENSITY_MAX_SAMPLES = 1 << 20
+
+# Image rows per lane: the bottom one shows edge activity, the rest level
+LEVEL_ROWS = 3
+
+
+def density_columns(capture, channels, x_min, x_max, width):
+    """Per-pixel-column fraction high and edge count of several channels
+
+    Columns split [x_min, x_max) of the compact timeline evenly. Returns
+    (high, edges, valid) with one row per channel; columns without
+    samples are False in valid. Edge counts are exact (binary searches in
+    the capture's EdgeIndex); the fraction high comes from at most
+    DENSITY_MAX_SAMPLES evenly strided samples.
+    """
+    bounds = capture.compact_indices(np.linspace(x_min, x_max, width + 1))
+    start, stop = int(bounds[0]), int(bounds[-1])
+    high = np.zeros((len(channels), width))
+    edges = np.zeros((len(channels), width))
+    valid = bounds[1:] > bounds[:-1]
+    if stop <= start:
+        return high, edges, valid
+
+    for row, ch in enumerate(channels):
+        positions = capture.edges.search(ch, bounds + capture.sample_offset)
+        edges[row] = np.diff(positions)
+
+    step = -(-(stop - start) // DENSITY_MAX_SAMPLES)
+    packed = capture.get_samples(start, stop, step)
+    # Strided sample positions where each column starts and how many it has
+    first = np.minimum((bounds - start + step - 1) // step, len(packed))
+    counts = np.diff(first)
+    has_samples = counts > 0
+    if len(packed) == 0 or not has_samples.any():
+        return high, edges, valid
+    starts = first[:-1][has_samples]
+    for row, ch in enumerate(channels):
+        bits = ((packed >> ch) & 1).astype(np.int32)
+        sums = np.add.reduceat(bits, starts)
+        high[row, has_samples] = sums / counts[has_samples]
+    return high, edges, valid
+
+
+def minmax_columns(capture, channels, x_min, x_max, width):
+    """Lowest and highest level of each channel in each pixel column
+
+    Columns split [x_min, x_max) of the compact timeline evenly. Returns
+    (low, high, valid) with one row per channel; a column where the
+    channel toggles has low 0 and high 1, and columns without samples are
+    False in valid. Levels come from the capture's EdgeIndex: edges are
+    only indexed within bursts, so each burst's level starts from its
+    first sample and the level at a column start is that plus the parity
+    of the burst's edges before it. The cost is a few binary searches per
+    column and one sample read per visible burst.
+    """
+    bounds = capture.compact_indices(np.linspace(x_min, x_max, width + 1))
+    valid = bounds[1:] > bounds[:-1]
+    low = np.zeros((len(channels), width), dtype=np.uint8)
+    high = np.zeros((len(channels), width), dtype=np.uint8)
+    if not valid.any():
+        return low, high, valid
+
+    # Bursts in the window, the first one cut at the window start
+    first, stop = int(bounds[0]), int(bounds[-1])
+    starts = capture.segment_arrays()[0]
+    seg_first = capture.segment_of(first)
+    seg_last = capture.segment_of(max(first, stop - 1))
+    seg_starts = np.array(starts[seg_first:seg_last + 1], dtype=np.int64)
+    seg_starts[0] = first
+    seg_states = np.array([capture.state_at(int(s)) for s in seg_starts])
+    column_seg = np.searchsorted(seg_starts, bounds[:-1], side='right') - 1
+    # Bursts starting after the first sample of a column
+    later = seg_starts[1:]
+    later_column = np.searchsorted(bounds, later, side='right') - 1
+    inner = (later > bounds[later_column]) & (later_column < width)
+
+    offset = capture.sample_offset
+    absolute = bounds + offset
+    for row, ch in enumerate(channels):
+        seg_level = (seg_states >> ch) & 1
+        # Edges up to and including each burst's and column's first sample
+        seg_before = capture.edges.search(ch, seg_starts + offset, side='right')
+        before = capture.edges.search(ch, absolute, side='right')
+        level = seg_level[column_seg] ^ ((before[:-1] - seg_before[column_seg]) & 1)
+        # Edges strictly inside a column mean it holds both levels, as
+        # does a burst starting inside it at the other level
+        inside = capture.edges.search(ch, absolute[1:] - 1, side='right') - before[:-1]
+        toggles = inside > 0
+        columns = later_column[inner]
+        toggles[columns[seg_level[1:][inner] != level[columns]]] = True
+        low[row] = np.where(toggles, 0, level)
+        high[row] = np.where(toggles, 1, level)
+    return low, high, valid
+
+
+class DensityItem(pg.GraphicsObject):
+    """Draws every lane as an image strip, one pixel column per screen column
+
+    The upper rows of a lane show the fraction of time high as brightness,
+    the bottom row the number of edges per column on a log scale. Each
+    update is one small image per lane, whatever the number of edges.
+    """
+
+    def __init__(self, colors, lane_spacing=1.0, lane_height=0.8):
+        super().__init__()
+        self.colors = colors
+        self.lane_spacing = lane_spacing
+        self.lane_height = lane_height
+        self.channels = []
+        self.images = []
+        self._pixels = []
+        self._rect = QRectF()
+
+    def set_lanes(self, channels):
+        """Configure lanes as a list of channels, top to bottom"""
+        self.channels = list(channels)
+        self.clear()
+
+    def lane_base(self, lane):
+        return (len(self.channels) - 1 - lane) * self.lane_spacing
+
+    def clear(self):
+        self.images = []
+        self._pixels = []
+        self.update()
+
+    def set_columns(self, x_min, x_max, high, edges, valid):
+        """Show per-column fraction high and edge counts over [x_min, x_max)"""
+        with counters.timed('density_image'):
+            width = high.shape[1]
+            peak = edges.max() if edges.size else 0
+            activity = np.log1p(edges) / np.log1p(peak) if peak > 0 else edges
+            self.images = []
+            self._pixels = []
+            for row, ch in enumerate(self.channels):
+                color = QColor(self.colors[ch % len(self.colors)])
+                # Rows run up the lane: pyqtgraph's y axis points up
+                rgba = np.zeros((LEVEL_ROWS + 1, width, 4), dtype=np.uint8)
+                rgba[..., 0] = color.red()
+                rgba[..., 1] = color.green()
+                rgba[..., 2] = color.blue()
+                rgba[0, :, 3] = (255 * activity[row]).astype(np.uint8)
+                rgba[1:, :, 3] = (40 + 215 * high[row]).astype(np.uint8)
+                rgba[:, ~valid, 3] = 0
+                self._pixels.append(rgba)
+                self.images.append(QImage(rgba.data, width, LEVEL_ROWS + 1,
+                                          width * 4, QImage.Format_RGBA8888))
+
+        rect = QRectF(x_min, -0.5, x_max - x_min, len(self.channels) * self.lane_spacing + 0.5)
+        if rect != self._rect:
+            self.prepareGeometryChange()
+            self._rect = rect
+        self.update()
+
+    def boundingRect(self):
+        return self._rect
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        # Follows the view rather than the data; never drive auto-range
+        return None, None
+
+    def paint(self, painter, option, widget=None):
+        if not self.images:
+            return
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+        x_min, width = self._rect.left(), self._rect.width()
+        for lane, image in enumerate(self.images):
+            target = QRectF(x_min, self.lane_base(lane), width, self.lane_height)
+            painter.drawImage(target, image)
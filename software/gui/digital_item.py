@@ -0,0 +1,172 @@
+"""
+Multi-lane digital waveform graphics item
+"""
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5.QtCore import Qt, QRectF, QPointF
+from PyQt5.QtGui import QFont, QPainter, QStaticText, QTransform
+
+from perf import counters
+from .trace_buffer import TraceBuffer
+
+
+class DigitalWaveformItem(pg.GraphicsObject):
+    """Draws every channel lane and its label from a single scene item
+
+    Each lane keeps its step vertices (with the lane offset baked in) in a
+    TraceBuffer. One paint call clips every lane to the visible x range and
+    joins the lanes of each color into one QPainterPath (NaN breaks the
+    line between lanes), stroked with a single drawPath. Lanes that share
+    a color therefore cost one draw together; distinct colors need one
+    each, since only solid cosmetic pens take Qt's fast line path. Adding
+    lanes adds vertices but no per-item scene, bounds or paint overhead.
+    Labels are cached QStaticText drawn in screen space at the left edge
+    of the view.
+    """
+
+    def __init__(self, colors, label_color, lane_spacing=1.0, lane_height=0.8, show_labels=True):
+        super().__init__()
+        self.show_labels = show_labels
+        self.show_traces = True
+        self.colors = colors
+        self.label_color = label_color
+        self.lane_spacing = lane_spacing
+        self.lane_height = lane_height
+        self.label_font = QFont("monospace", 9, QFont.Bold)
+        self.label_font.setStyleHint(QFont.Monospace)
+        self.lanes = []
+        self.buffers = []
+        self.pens = []
+        self.labels = []
+        self._bounds = QRectF()
+        self._path_cache = {}
+
+    def set_lanes(self, lanes):
+        """Configure lanes as a list of (channel, pin_name), top to bottom"""
+        self.prepareGeometryChange()
+        self.lanes = list(lanes)
+        self.buffers = [TraceBuffer() for _ in self.lanes]
+        self.pens = []
+        self.labels = []
+        for ch, pin_name in self.lanes:
+            color = self.colors[ch % len(self.colors)]
+            # Wider pens make Qt stroke the path outline, which is far slower
+            self.pens.append(pg.mkPen(color=color, width=1, cosmetic=True))
+            label = QStaticText(
+                f'<span style="color: {color};">CH{ch}</span> '
+                f'<span style="color: {self.label_color}; font-size: 8pt;">({pin_name})</span>'
+            )
+            label.setTextFormat(Qt.RichText)
+            label.prepare(QTransform(), self.label_font)
+            self.labels.append(label)
+        self.data_changed()
+
+    def set_traces_visible(self, visible):
+        """Hide the step lines but keep the labels (e.g. under a density view)"""
+        if visible != self.show_traces:
+            self.show_traces = visible
+            self.update()
+
+    def lane_base(self, lane):
+        """Y offset of a lane's low level"""
+        return (len(self.lanes) - 1 - lane) * self.lane_spacing
+
+    def clear(self):
+        for buffer in self.buffers:
+            buffer.clear()
+        self.data_changed()
+
+    def append(self, lane, xs, ys):
+        """Append step vertices (already offset to the lane) to a lane"""
+        self.buffers[lane].append(xs, ys)
+
+    def drop_before(self, x_min):
+        for buffer in self.buffers:
+            buffer.drop_before(x_min)
+
+    def data_changed(self):
+        """Call after appending or dropping vertices to schedule a repaint"""
+        x_min = np.inf
+        x_max = -np.inf
+        for buffer in self.buffers:
+            if len(buffer):
+                x, _ = buffer.view()
+                x_min = min(x_min, x[0])
+                x_max = max(x_max, x[-1])
+        if x_min > x_max:
+            x_min = x_max = 0.0
+        top = len(self.lanes) * self.lane_spacing
+        bounds = QRectF(x_min, -0.5, x_max - x_min, top + 0.5)
+        if bounds != self._bounds:
+            self.prepareGeometryChange()
+            self._bounds = bounds
+        self._path_cache = {}
+        self.update()
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        if ax == 0:
+            return self._bounds.left(), self._bounds.right()
+        return self._bounds.top(), self._bounds.bottom()
+
+    def boundingRect(self):
+        return self._bounds
+
+    def _paths(self, x_min, x_max):
+        """(pen, QPainterPath) per lane color for the visible range (cached per view)"""
+        key = (x_min, x_max)
+        paths = self._path_cache.get(key)
+        if paths is None:
+            groups = {}
+            for lane, buffer in enumerate(self.buffers):
+                if len(buffer) < 2:
+                    continue
+                x, y = buffer.view()
+                # One vertex either side keeps edge segments crossing the border
+                i0 = max(0, int(np.searchsorted(x, x_min, side='left')) - 1)
+                i1 = int(np.searchsorted(x, x_max, side='right')) + 1
+                pen = self.pens[lane]
+                parts = groups.setdefault(pen.color().rgba(), (pen, []))[1]
+                parts.append((x[i0:i1], y[i0:i1]))
+            paths = []
+            for pen, parts in groups.values():
+                # A NaN vertex after each lane starts the next one unconnected
+                xs = np.concatenate([np.append(x, np.nan) for x, _ in parts])
+                ys = np.concatenate([np.append(y, np.nan) for _, y in parts])
+                paths.append((pen, pg.arrayToQPath(xs, ys, connect='finite')))
+            self._path_cache[key] = paths
+        return paths
+
+    def paint(self, painter, option, widget=None):
+        with counters.timed('paint'):
+            self._paint(painter)
+
+    def _paint(self, painter):
+        view = self.viewRect()
+        if view is None or not self.lanes:
+            return
+        x_min, x_max = view.left(), view.right()
+        if len(self._path_cache) > 4:
+            # Old view ranges are never revisited exactly
+            self._path_cache = {}
+
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        if self.show_traces:
+            for pen, path in self._paths(x_min, x_max):
+                painter.setPen(pen)
+                painter.drawPath(path)
+
+        if not self.show_labels:
+            return
+        
+        # Labels in device coordinates, pinned to the left edge of the view
+        transform = painter.transform()
+        painter.save()
+        painter.resetTransform()
+        painter.setFont(self.label_font)
+        for lane, label in enumerate(self.labels):
+            y_center = self.lane_base(lane) + self.lane_height / 2
+            pos = transform.map(QPointF(x_min, y_center))
+            height = label.size().height()
+            painter.drawStaticText(QPointF(pos.x() + 4, pos.y() - height / 2), label)
+        painter.restore()
@@ -0,0 +1,79 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QLabel,
+                             QTableWidget, QTableWidgetItem, QHeaderView)
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+import pyqtgraph as pg
+
+class EventsPanel(QDialog):
+    """List of the anomaly detector's events; double-click one to jump to it"""
+
+    COLUMNS = ["Time", "Kind", "Channel", "Detail"]
+
+    # Absolute sample index of the event picked by the user; object, as a
+    # C int would overflow past 2**31 samples
+    jump_requested = pyqtSignal(object)
+
+    def __init__(self, detector, parent=None):
+        super().__init__(parent)
+        self.detector = detector
+        self.shown_total = None
+        self.setWindowTitle("Events")
+        self.resize(640, 400)
+
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.cellDoubleClicked.connect(self.on_double_click)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        self.summary = QLabel()
+        buttons.addWidget(self.summary)
+        buttons.addStretch()
+        clear_btn = QPushButton("Clear")
+        clear_btn.setToolTip("Forget the listed events")
+        clear_btn.clicked.connect(self.clear)
+        buttons.addWidget(clear_btn)
+        layout.addLayout(buttons)
+
+        # Refresh while visible
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start(500)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        """Rebuild the table when the detector found something new, newest first"""
+        if self.detector.total == self.shown_total:
+            return
+        self.shown_total = self.detector.total
+        events = list(self.detector.events)[::-1]
+        self.table.setRowCount(len(events))
+        for row, event in enumerate(events):
+            values = [pg.siFormat(event['time'], precision=6, suffix='s'), event['kind'],
+                      f"CH{event['channel']}", event['detail']]
+            for col, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                item.setData(Qt.UserRole, event['index'])
+                self.table.setItem(row, col, item)
+        self.summary.setText(f"{len(events)} listed, {self.detector.total} found")
+
+    def clear(self):
+        self.detector.events.clear()
+        self.detector.total = 0
+        self.shown_total = None
+        self.refresh()
+
+    def on_double_click(self, row, col):
+        self.jump_requested.emit(self.table.item(row, col).data(Qt.UserRole))
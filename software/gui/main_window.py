@@ -4,12 +4,34 @@ from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout,
 from PyQt5.QtCore import QThread, pyqtSignal, Qt, QTimer
 from PyQt5.QtGui import QFont
 from .waveform_view import WaveformView
-from .styles import get_main_stylesheet, get_status_indicator_html, COLORS
+from .stats_panel import StatsPanel
+from .events_panel import EventsPanel
+from .styles import get_main_stylesheet, get_status_indicator_html, COLORS, CHANNEL_COLORS
 import sys
 import os
+import time
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from device import LogicAnalyzerDevice
-from capture import Capture
+from device import LogicAnalyzerDevice, DEFAULT_MAX_BAUD
+from capture import Capture, ALL_CHANNELS
+from storage import DEFAULT_RAM_BUDGET
+from scheduler import LiveScheduler
+from anomaly import AnomalyDetector
+from server import CaptureServer, SERVER_ADDRESS
+from acquisition import RemoteDevice, ACQUISITION_PROCESS
+from perf import counters
+from profiling import profiler
+
+# Live timer interval while streaming
+STREAM_POLL_MS = 50
+
+# Port list entry that probes every port for the analyzer
+AUTO_PORT = "Auto-detect"
+
+# Reasons a live burst is dropped without stopping live mode
+DROPPED_BURSTS = {
+    'crc': "a corrupted burst",
+    'overrun': "a burst the acquisition ring had no room for",
+}
 
 class MainWindow(QMainWindow):
     def __init__(self):
@@ -17,12 +39,29 @@ class MainWindow(QMainWindow):
         self.device = None
         self.current_capture = None
         self.live_mode = False
+        self.full_capture = None
         self.capture_count = 0
+        self.ram_budget = DEFAULT_RAM_BUDGET
+        self.channel_mask = ALL_CHANNELS
         
         # Live capture timer
         self.live_timer = QTimer()
         self.live_timer.timeout.connect(self.do_capture)
         self.live_interval_ms = 500  # Default 500ms
+        # Live bursts are paced by measured timing, live_interval_ms at most
+        self.scheduler = LiveScheduler()
+        self.capture_pending = False
+        # Glitch, stuck channel and activity checks on each new burst
+        self.detector = AnomalyDetector()
+        # LA_SERVER=<port|unix:path> shares every frame with local clients
+        self.server = None
+        if SERVER_ADDRESS:
+            try:
+                self.server = CaptureServer(SERVER_ADDRESS)
+                self.server.start()
+            except (OSError, ValueError) as e:
+                print(f"Capture server not started: {e}")
+                self.server = None
         
         # Professional Title
         self.setWindowTitle("STM32 Logic Analyzer Pro")
@@ -113,6 +152,23 @@ class MainWindow(QMainWindow):
         self.capture_btn.setEnabled(False)
         row1.addWidget(self.capture_btn)
         
+        row1.addSpacing(16)
+        row1.addWidget(QLabel("Channels:"))
+        
+        # One toggle per channel; disabled channels are neither kept nor drawn
+        self.channel_btns = []
+        for ch in range(8):
+            btn = QPushButton(str(ch))
+            btn.setObjectName("channelBtn")
+            btn.setCheckable(True)
+            btn.setChecked(True)
+            btn.setToolTip(f"Enable CH{ch} (PA{ch})")
+            btn.setStyleSheet(f"QPushButton#channelBtn:checked {{ border: 1px solid {CHANNEL_COLORS[ch]}; "
+                              f"color: {CHANNEL_COLORS[ch]}; }}")
+            btn.toggled.connect(self.on_channels_changed)
+            row1.addWidget(btn)
+            self.channel_btns.append(btn)
+        
         row1.addStretch()
         
         # Sample rate display
@@ -146,6 +202,12 @@ class MainWindow(QMainWindow):
         self.pause_btn.setEnabled(False)
         row2.addWidget(self.pause_btn)
         
+        self.stream_btn = QPushButton("Stream")
+        self.stream_btn.setCheckable(True)
+        self.stream_btn.setToolTip("Live mode streams continuously without gaps (low sample rates)")
+        self.stream_btn.setEnabled(False)
+        row2.addWidget(self.stream_btn)
+        
         row2.addWidget(QLabel("Interval:"))
         
         self.interval_slider = QSlider(Qt.Horizontal)
@@ -153,7 +215,8 @@ class MainWindow(QMainWindow):
         self.interval_slider.setMaximum(5000)
         self.interval_slider.setValue(500)
         self.interval_slider.setMaximumWidth(200)
-        self.interval_slider.setToolTip("Live capture interval (100ms - 5s)")
+        self.interval_slider.setToolTip("Longest pause between live bursts (100ms - 5s); "
+                                        "bursts follow sooner when the link allows")
         self.interval_slider.valueChanged.connect(self.update_live_interval)
         row2.addWidget(self.interval_slider)
         
@@ -162,8 +225,41 @@ class MainWindow(QMainWindow):
         self.interval_label.setMinimumWidth(60)
         row2.addWidget(self.interval_label)
         
+        row2.addWidget(QLabel("Buffer:"))
+        
+        # RAM held by the live buffer; older samples spill to disk
+        self.budget_combo = QComboBox()
+        self.budget_options = [
+            ("16 MB", 16 * 1024 * 1024),
+            ("64 MB", 64 * 1024 * 1024),
+            ("256 MB", 256 * 1024 * 1024),
+            ("1 GB", 1024 * 1024 * 1024),
+        ]
+        self.budget_combo.addItems([name for name, _ in self.budget_options])
+        self.budget_combo.setCurrentIndex(
+            [size for _, size in self.budget_options].index(self.ram_budget))
+        self.budget_combo.setToolTip("Live buffer RAM budget (older samples spill to disk)")
+        self.budget_combo.currentIndexChanged.connect(self.on_budget_changed)
+        row2.addWidget(self.budget_combo)
+        
         row2.addStretch()
         
+        self.profile_btn = QPushButton("Profile")
+        self.profile_btn.setCheckable(True)
+        self.profile_btn.setToolTip("Profile the next live ticks (cProfile + tracemalloc)")
+        self.profile_btn.clicked.connect(self.toggle_profiling)
+        row2.addWidget(self.profile_btn)
+        
+        self.stats_btn = QPushButton("Stats")
+        self.stats_btn.setToolTip("Show performance counters")
+        self.stats_btn.clicked.connect(self.show_stats)
+        row2.addWidget(self.stats_btn)
+        
+        self.events_btn = QPushButton("Events")
+        self.events_btn.setToolTip("Glitches, stuck channels and unusual activity found so far")
+        self.events_btn.clicked.connect(self.show_events)
+        row2.addWidget(self.events_btn)
+        
         toolbar_layout.addLayout(row2)
         
         layout.addWidget(toolbar_container)
@@ -184,6 +280,68 @@ class MainWindow(QMainWindow):
         self.status_bar = QStatusBar()
         self.setStatusBar(self.status_bar)
         self.status_bar.showMessage("Ready")
+        
+        # Performance summary, refreshed once a second
+        self.perf_label = QLabel()
+        self.status_bar.addPermanentWidget(self.perf_label)
+        self.stats_panel = None
+        self.events_panel = None
+        self.perf_timer = QTimer(self)
+        self.perf_timer.timeout.connect(self.update_perf_summary)
+        self.perf_timer.start(1000)
+        
+        # Profiling session, armed from the environment or the Profile button
+        profiler.on_finished = self.on_profile_finished
+        out_dir = profiler.start_from_env()
+        if out_dir:
+            self.profile_btn.setChecked(True)
+            self.status_bar.showMessage(f"Profiling armed, writing to {out_dir}")
+
+    def update_perf_summary(self):
+        self.perf_label.setText(counters.summary())
+    
+    def toggle_profiling(self):
+        """Start a profiling session or stop the running one early"""
+        if self.profile_btn.isChecked():
+            out_dir = profiler.start()
+            self.status_bar.showMessage(f"Profiling next live ticks, writing to {out_dir}")
+        else:
+            profiler.stop()
+    
+    def on_profile_finished(self, out_dir, slow_ticks):
+        self.profile_btn.setChecked(False)
+        self.status_bar.showMessage(
+            f"Profile written to {out_dir} ({slow_ticks} ticks over budget)"
+        )
+    
+    def show_stats(self):
+        """Open the performance stats panel"""
+        if self.stats_panel is None:
+            self.stats_panel = StatsPanel(self)
+        self.stats_panel.show()
+        self.stats_panel.raise_()
+
+    def show_events(self):
+        """Open the list of detected events"""
+        if self.events_panel is None:
+            self.events_panel = EventsPanel(self.detector, self)
+            self.events_panel.jump_requested.connect(self.jump_to_event)
+        self.events_panel.show()
+        self.events_panel.raise_()
+
+    def jump_to_event(self, index):
+        if self.waveform_view.jump_to(index):
+            if self.live_mode and not self.pause_btn.isChecked():
+                self.status_bar.showMessage("Auto-scroll stopped at the event; Pause/Resume to follow again")
+        else:
+            self.status_bar.showMessage("That event is no longer in the buffer")
+
+    def detect_events(self, capture):
+        """Run the detector over the samples just appended"""
+        found = self.detector.process(capture)
+        total = self.detector.total
+        self.events_btn.setText(f"Events ({total})" if total else "Events")
+        return found
 
     def update_status_indicator(self, status, text):
         """Update the status indicator with colored dot"""
@@ -194,6 +352,7 @@ class MainWindow(QMainWindow):
         self.port_combo.clear()
         ports = LogicAnalyzerDevice.list_ports()
         if ports:
+            self.port_combo.addItem(AUTO_PORT)
             self.port_combo.addItems(ports)
         else:
             self.port_combo.addItem("No ports found")
@@ -212,15 +371,36 @@ class MainWindow(QMainWindow):
             self.sample_rate_label.setText("Rate: --")
             self.live_btn.setEnabled(False)
             self.pause_btn.setEnabled(False)
+            self.stream_btn.setEnabled(False)
         else:
             # Connect
             port = self.port_combo.currentText()
             if port == "No ports found":
                 self.status_bar.showMessage("No serial ports available")
                 return
+            if port == AUTO_PORT:
+                self.status_bar.showMessage("Searching for the logic analyzer...")
+                self.status_bar.repaint()
+                port = LogicAnalyzerDevice.discover()
+                if port is None:
+                    self.update_status_indicator("error", "Not Found")
+                    self.status_bar.showMessage("No logic analyzer found on any port")
+                    return
+                self.port_combo.setCurrentText(port)
+            
+            # LA_RECORD_DIR=<dir> records every session for later replay
+            record_path = None
+            record_dir = os.environ.get('LA_RECORD_DIR')
+            if record_dir:
+                os.makedirs(record_dir, exist_ok=True)
+                record_path = os.path.join(record_dir, time.strftime('session_%Y%m%d_%H%M%S.larec'))
             
+            # LA_ACQ_PROCESS=1 reads and indexes frames in a worker process
+            device_class = RemoteDevice if ACQUISITION_PROCESS else LogicAnalyzerDevice
             try:
-                self.device = LogicAnalyzerDevice(port)
+                self.device = device_class(port, record_path=record_path,
+                                           replay_realtime=True,
+                                           max_baudrate=DEFAULT_MAX_BAUD)
                 if self.device.connect():
                     self.connect_btn.setText("Disconnect")
                     self.connect_btn.setProperty("connected", True)
@@ -228,9 +408,14 @@ class MainWindow(QMainWindow):
                     self.capture_btn.setEnabled(True)
                     self.live_btn.setEnabled(True)
                     info = self.device.device_info
+                    self.stream_btn.setEnabled(self.device.stream_limit_hz() > 0)
+                    if self.server is not None:
+                        self.device.publisher = self.server
+                        self.server.publish_info(info)
                     self.update_status_indicator("connected", "Connected")
                     self.status_bar.showMessage(
-                        f"Connected to {info['device_name']} v{info['version']} on {port}"
+                        f"Connected to {info['device_name']} v{info['version']} on {port} "
+                        f"at {self.device.baudrate} baud"
                     )
                 else:
                     self.update_status_indicator("error", "Connection Failed")
@@ -259,25 +444,86 @@ class MainWindow(QMainWindow):
         if not self.device:
             return
         
+        # Only live ticks count towards a profiling session
+        with profiler.tick('do_capture', counted=self.live_mode):
+            if self.device.streaming:
+                self._do_stream()
+            elif self.live_mode and not self.capture_pending:
+                self._request_burst()
+            else:
+                self._do_capture()
+    
+    def _request_burst(self):
+        """Start a live burst; the timer fires again when it should be sampled"""
+        if not self.device.request_capture():
+            return
+        self.capture_pending = True
+        self.scheduler.requested()
+        self.live_timer.start(self.scheduler.read_delay_ms(self.device))
+    
+    def _do_stream(self):
+        """Append the streaming chunks received since the last tick"""
+        chunks = self.device.read_stream()
+        if not chunks:
+            return
+        
+        for chunk in chunks:
+            if self.full_capture is None:
+                self.full_capture = Capture(
+                    chunk['samples'],
+                    chunk['sample_period_ns'],
+                    timestamp=chunk['timestamp'],
+                    ram_budget=self.ram_budget,
+                    channel_mask=self.channel_mask,
+                    edges=chunk.get('edges')
+                )
+            else:
+                # Consecutive chunks continue the segment; after a gap the
+                # chunk's own time opens a new one
+                self.full_capture.append_samples(
+                    chunk['samples'],
+                    chunk['sample_period_ns'],
+                    timestamp=chunk['timestamp'] if chunk['dropped'] else None,
+                    edges=chunk.get('edges')
+                )
+        self.current_capture = self.full_capture
+        self.detect_events(self.current_capture)
+        self.waveform_view.display_capture(self.current_capture, is_rolling_update=True)
+        
+        dropped = counters.counters.get('chunks_dropped', 0)
+        self.status_bar.showMessage(
+            f"Streaming: {self.current_capture.sample_count} samples buffered, "
+            f"{dropped} chunks dropped"
+        )
+    
+    def _do_capture(self):
         # Don't disable button in live mode
         if not self.live_mode:
             self.update_status_indicator("capturing", "Capturing...")
             self.status_bar.showMessage("Capturing data...")
             self.capture_btn.setEnabled(False)
         
-        # Capture (blocking for now)
-        frame = self.device.capture()
+        if self.live_mode:
+            # Collect the burst started by _request_burst()
+            self.capture_pending = False
+            frame = self.device.read_capture()
+        else:
+            frame = self.device.capture()
+        host_start = time.perf_counter()
         
         if frame and frame['type'] == 'capture':
-            new_capture = Capture(
-                frame['samples'],
-                frame['sample_period_ns']
-            )
+            rate = 1000.0 / frame['sample_period_ns']
+            new_capture = None
+            if not self.live_mode or self.full_capture is None:
+                new_capture = Capture(
+                    frame['samples'],
+                    frame['sample_period_ns'],
+                    timestamp=frame['timestamp'],
+                    ram_budget=self.ram_budget,
+                    channel_mask=self.channel_mask,
+                    edges=frame.get('edges')
+                )
             
-            if self.live_mode and self.current_capture:
-                # Append to existing capture
-                self.current_capture.append_samples(frame['samples'])
-                
             if self.live_mode:
                 # Live Buffer Management
                 if self.full_capture is None:
@@ -285,36 +531,50 @@ class MainWindow(QMainWindow):
                     self.full_capture = new_capture
                     self.current_capture = self.full_capture
                 else:
-                    # Append to existing buffer
-                    self.full_capture.append_samples(frame['samples'])
-                    # Enforce 5-minute rolling buffer (300 seconds)
-                    self.full_capture.keep_duration(300.0)
+                    # Append to existing buffer as a new burst segment
+                    self.full_capture.append_samples(
+                        frame['samples'],
+                        frame['sample_period_ns'],
+                        timestamp=frame['timestamp'],
+                        edges=frame.get('edges')
+                    )
                     self.current_capture = self.full_capture
+                self.detect_events(self.current_capture)
 
                 # Update display
                 self.waveform_view.display_capture(self.current_capture, is_rolling_update=True)
                 
-                rate = new_capture.get_sample_rate_mhz()
                 self.sample_rate_label.setText(f"Rate: {rate:.2f} MHz")
+                duty = self.scheduler.duty_cycle(self.device)
                 self.status_bar.showMessage(
-                    f"Live: {self.current_capture.sample_count} samples buffered"
+                    f"Live: {self.current_capture.sample_count} samples buffered, "
+                    f"sampling {duty:.0%} of the time"
                 )
                 self.update_status_indicator("capturing", "Live Capture")
+                
+                # Next request once the host has caught up
+                self.scheduler.host_time(time.perf_counter() - host_start)
+                self.live_timer.start(self.scheduler.idle_ms(self.live_interval_ms))
             else:
                 # New capture (single shot)
                 self.current_capture = new_capture
                 self.capture_count += 1
+                self.detector.reset()
+                self.detect_events(new_capture)
                 
                 # Display
                 self.waveform_view.display_capture(new_capture)
                 
-                rate = new_capture.get_sample_rate_mhz()
                 self.sample_rate_label.setText(f"Rate: {rate:.2f} MHz")
                 
                 self.update_status_indicator("connected", "Connected")
                 self.status_bar.showMessage(
                     f"Captured {new_capture.sample_count} samples @ {rate:.2f} MHz"
                 )
+        elif self.live_mode and self.device.last_error in DROPPED_BURSTS:
+            # The burst is lost; the link itself is fine
+            self.status_bar.showMessage(f"Live: dropped {DROPPED_BURSTS[self.device.last_error]}")
+            self.live_timer.start(self.scheduler.idle_ms(self.live_interval_ms))
         else:
             self.update_status_indicator("error", "Capture Failed")
             self.status_bar.showMessage("Capture failed")
@@ -331,24 +591,46 @@ class MainWindow(QMainWindow):
         if self.live_mode:
             # Start live capture
             self.capture_count = 0
+            if self.full_capture is not None:
+                self.full_capture.close()  # Delete the old spill files
             self.current_capture = None  # Reset buffer
             self.full_capture = None     # Reset full capture buffer
+            self.detector.reset()
             self.live_btn.setText("Stop Live")
             # Style update for active state
-            self.live_btn.setStyleSheet(f"background-color: {COLORS['error']}; border: 1px solid {COLORS['error']}; color: white;")
+            self.live_btn.setStyleSheet(f"background-color: {COLORS['error']}; "
+                                        f"border: 1px solid {COLORS['error']}; color: white;")
             self.capture_btn.setEnabled(False)
             self.pause_btn.setEnabled(True)
             self.pause_btn.setChecked(False)
             self.pause_btn.setText("Pause")
             
             self.update_status_indicator("capturing", "Live Capture")
-            self.status_bar.showMessage(f"Live capture started (interval: {self.live_interval_ms}ms)")
+            self.stream_btn.setEnabled(False)
+            
+            self.capture_pending = False
+            if self.stream_btn.isChecked():
+                if not self.device.start_stream():
+                    self.status_bar.showMessage(
+                        f"Streaming not possible at this rate (limit {self.device.stream_limit_hz()} Hz "
+                        f"at {self.device.baudrate} baud); using bursts")
+                    self.live_timer.start(0)
+                    return
+                self.status_bar.showMessage(f"Streaming at {self.device.stream_rate_hz} Hz")
+                # Poll often so the device's chunks never back up
+                self.live_timer.start(STREAM_POLL_MS)
+                return
+            
+            self.status_bar.showMessage(f"Live capture started (max interval: {self.live_interval_ms}ms)")
             
-            # Start timer
-            self.live_timer.start(self.live_interval_ms)
+            # The first burst starts right away; the scheduler paces the rest
+            self.live_timer.start(0)
         else:
             # Stop live capture
             self.live_timer.stop()
+            self.capture_pending = False
+            self.device.stop_stream()
+            self.stream_btn.setEnabled(self.device.stream_limit_hz() > 0)
             self.live_btn.setText("Start Live")
             self.live_btn.setStyleSheet("")
             self.capture_btn.setEnabled(True)
@@ -368,7 +650,7 @@ class MainWindow(QMainWindow):
             self.update_status_indicator("warning", "Paused")
             self.waveform_view.set_auto_scroll(False) # Stop scrolling
         else:
-            self.live_timer.start(self.live_interval_ms)
+            self.live_timer.start(STREAM_POLL_MS if self.device.streaming else 0)
             self.pause_btn.setText("Pause")
             self.update_status_indicator("capturing", "Live Capture")
             self.waveform_view.set_auto_scroll(True) # Resume scrolling
@@ -378,11 +660,33 @@ class MainWindow(QMainWindow):
         self.live_interval_ms = value
         self.interval_label.setText(f"{value}ms")
         
-        # Update timer if running
-        if self.live_mode:
-            self.live_timer.setInterval(value)
-            self.status_bar.showMessage(f"Live interval: {value}ms")
+        # The scheduler applies it from the next burst on
+        if self.live_mode and not self.device.streaming:
+            self.status_bar.showMessage(f"Max live interval: {value}ms")
 
+    def on_channels_changed(self):
+        """Apply the channel toggles to the live buffer and the view"""
+        mask = 0
+        for ch, btn in enumerate(self.channel_btns):
+            if btn.isChecked():
+                mask |= 1 << ch
+        if mask == 0:
+            # Keep at least one lane
+            self.sender().setChecked(True)
+            return
+        self.channel_mask = mask
+        if self.full_capture is not None:
+            self.full_capture.set_channel_mask(mask)
+        self.waveform_view.set_channel_mask(mask)
+        self.status_bar.showMessage(f"{bin(mask).count('1')} channels enabled")
+    
+    def on_budget_changed(self, index):
+        """Apply a new RAM budget to the live buffer"""
+        name, self.ram_budget = self.budget_options[index]
+        if self.full_capture is not None:
+            self.full_capture.set_ram_budget(self.ram_budget)
+        self.status_bar.showMessage(f"Buffer RAM budget set to {name}")
+    
     def on_rate_changed(self, index):
         """Handle sample rate change"""
         if not self.device:
@@ -402,8 +706,34 @@ class MainWindow(QMainWindow):
         
         if index in rate_commands:
             cmd, rate_name = rate_commands[index]
+            # The rate can only change between streams
+            was_streaming = self.device.streaming
+            self.device.stop_stream()
+            # A live burst still in flight was sampled at the old rate and
+            # would arrive in place of the reply; collect it and drop it
+            discarded = self.capture_pending
+            if discarded:
+                self.capture_pending = False
+                self.device.read_capture()
             success = self.device.set_sample_rate(cmd)
             if success:
+                # Bursts at the new rate must not be stitched onto the old timeline
+                if self.live_mode and self.full_capture is not None:
+                    self.full_capture.start_new_segment()
                 self.status_bar.showMessage(f"Sample rate set to {rate_name}")
+                if was_streaming and not self.device.start_stream():
+                    self.live_timer.start(0)
+                    self.status_bar.showMessage(f"Streaming not possible at {rate_name}; using bursts")
             else:
                 self.status_bar.showMessage(f"Failed to set sample rate to {rate_name}")
+            if discarded and not self.pause_btn.isChecked():
+                # Request the next burst now rather than at the dropped one's read time
+                self.live_timer.start(0)
+    
+    def closeEvent(self, event):
+        """Stop serving frames: subscribers see the stream end and the
+        socket (or unix socket file) is released"""
+        if self.server is not None:
+            self.server.stop()
+            self.server = None
+        super().closeEvent(event)
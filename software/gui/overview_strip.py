@@ -0,0 +1,147 @@
+"""
+Overview strip showing edge density over the whole retained capture
+"""
+
+import time
+
+import numpy as np
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtCore import Qt, QRectF, QTimer, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QPainter, QPen
+
+from perf import counters
+
+# Height of one lane in the strip, in pixels
+LANE_PIXELS = 4
+
+# Minimum time between density rebuilds while data streams in
+REBUILD_INTERVAL_S = 0.25
+
+
+class OverviewStrip(QWidget):
+    """Per-channel edge density of the full capture with the viewport marked
+
+    Each pixel column counts the edges inside it with two binary searches
+    per lane into the capture's EdgeIndex, which is built as samples
+    arrive. A rebuild therefore costs O(width * log edges) however long
+    the capture is, and runs at most every REBUILD_INTERVAL_S; paints in
+    between only draw the cached image and the viewport box.
+
+    Clicking or dragging emits navigate with the compact timeline
+    position under the mouse.
+    """
+
+    navigate = pyqtSignal(float)
+
+    def __init__(self, colors, background, parent=None):
+        super().__init__(parent)
+        self.colors = colors
+        self.background = QColor(background)
+        self.channels = []
+        self.capture = None
+        self.image = None
+        self.data_range = (0.0, 0.0)
+        self.viewport = None
+        self._pixels = None
+        self.last_rebuild = 0.0
+        self.rebuild_timer = QTimer(self)
+        self.rebuild_timer.setSingleShot(True)
+        self.rebuild_timer.timeout.connect(self.rebuild)
+        self.setCursor(Qt.PointingHandCursor)
+        self.setToolTip("Edge density of the whole capture; click or drag to navigate")
+        self.set_channels(range(8))
+
+    def set_channels(self, channels):
+        """Show lanes for these channels, top to bottom"""
+        self.channels = list(channels)
+        self.setFixedHeight(max(1, len(self.channels)) * LANE_PIXELS + 2)
+        self.schedule_rebuild()
+
+    def set_capture(self, capture):
+        """Note new data; the density is rebuilt at most every REBUILD_INTERVAL_S"""
+        self.capture = capture
+        self.schedule_rebuild()
+
+    def schedule_rebuild(self):
+        if self.rebuild_timer.isActive():
+            return
+        elapsed = time.perf_counter() - self.last_rebuild
+        delay = max(0.0, REBUILD_INTERVAL_S - elapsed)
+        self.rebuild_timer.start(int(delay * 1000))
+
+    def set_viewport(self, x_min, x_max):
+        self.viewport = (x_min, x_max)
+        self.update()
+
+    def resizeEvent(self, event):
+        self.schedule_rebuild()
+        super().resizeEvent(event)
+
+    def rebuild(self):
+        """Recompute the density image from the capture's edge index"""
+        self.last_rebuild = time.perf_counter()
+        self.update()
+        capture = self.capture
+        width = self.width()
+        if capture is None or capture.sample_count == 0 or width <= 0 or not self.channels:
+            self.image = None
+            return
+
+        with counters.timed('overview'):
+            x0, x1 = capture.compact_range()
+            self.data_range = (x0, x1)
+            # Absolute sample index at every column boundary
+            bounds = capture.compact_indices(np.linspace(x0, x1, width + 1))
+            bounds += capture.sample_offset
+
+            counts = np.empty((len(self.channels), width), dtype=np.float64)
+            for lane, ch in enumerate(self.channels):
+                counts[lane] = np.diff(capture.edges.search(ch, bounds))
+
+            # Log scale so a single glitch is still visible next to a busy bus
+            peak = counts.max()
+            level = np.log1p(counts) / np.log1p(peak) if peak > 0 else counts
+
+            rgba = np.zeros((len(self.channels), width, 4), dtype=np.uint8)
+            for lane, ch in enumerate(self.channels):
+                color = QColor(self.colors[ch % len(self.colors)])
+                rgba[lane, :, 0] = color.red()
+                rgba[lane, :, 1] = color.green()
+                rgba[lane, :, 2] = color.blue()
+                # Faint trace even where idle so lanes stay identifiable
+                rgba[lane, :, 3] = (40 + 215 * level[lane]).astype(np.uint8)
+            self._pixels = np.ascontiguousarray(rgba)
+            self.image = QImage(self._pixels.data, width, len(self.channels),
+                                width * 4, QImage.Format_RGBA8888)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), self.background)
+        if self.image is None:
+            return
+        area = QRectF(0, 1, self.width(), self.height() - 2)
+        painter.drawImage(area, self.image)
+
+        x0, x1 = self.data_range
+        if self.viewport is not None and x1 > x0:
+            left = (self.viewport[0] - x0) / (x1 - x0) * self.width()
+            right = (self.viewport[1] - x0) / (x1 - x0) * self.width()
+            box = QRectF(left, 0, max(2.0, right - left), self.height() - 1)
+            painter.fillRect(box, QColor(255, 255, 255, 30))
+            painter.setPen(QPen(QColor(255, 255, 255, 160), 1))
+            painter.drawRect(box)
+
+    def _navigate_to(self, event):
+        x0, x1 = self.data_range
+        if x1 <= x0 or self.width() <= 0:
+            return
+        frac = min(max(event.pos().x() / self.width(), 0.0), 1.0)
+        self.navigate.emit(x0 + frac * (x1 - x0))
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton:
+            self._navigate_to(event)
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self._navigate_to(event)
@@ -0,0 +1,88 @@
+from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QPushButton,
+                             QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog)
+from PyQt5.QtCore import QTimer
+import time
+from perf import counters
+
+class StatsPanel(QDialog):
+    """Live view of the hot-path performance counters"""
+
+    COLUMNS = ["Metric", "Count", "Mean", "P50", "P95", "Max"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Performance Stats")
+        self.resize(640, 480)
+
+        layout = QVBoxLayout(self)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        buttons = QHBoxLayout()
+        reset_btn = QPushButton("Reset")
+        reset_btn.setToolTip("Clear all counters")
+        reset_btn.clicked.connect(self.reset)
+        buttons.addWidget(reset_btn)
+        buttons.addStretch()
+
+        json_btn = QPushButton("Export JSON")
+        json_btn.clicked.connect(lambda: self.export('json'))
+        buttons.addWidget(json_btn)
+
+        csv_btn = QPushButton("Export CSV")
+        csv_btn.clicked.connect(lambda: self.export('csv'))
+        buttons.addWidget(csv_btn)
+        layout.addLayout(buttons)
+
+        # Refresh while visible
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.refresh)
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresh_timer.start(1000)
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def refresh(self):
+        """Rebuild the table from a counters snapshot"""
+        snap = counters.snapshot()
+        rows = []
+        for name, s in sorted(snap['stages'].items()):
+            rows.append([f"{name} (ms)", str(s['count'])] +
+                        [f"{s[k] * 1000:.3f}" for k in ('mean', 'p50', 'p95', 'max')])
+        for name, r in sorted(snap['rates'].items()):
+            rows.append([f"{name} (/s)", str(r['total']), f"{r['per_second']:.1f}", "", "", ""])
+        for name, value in sorted(snap['counters'].items()):
+            rows.append([name, str(value), "", "", "", ""])
+        for name, value in sorted(snap['gauges'].items()):
+            rows.append([name, "", str(value), "", "", ""])
+
+        self.table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(value))
+
+    def reset(self):
+        counters.reset()
+        self.refresh()
+
+    def export(self, fmt):
+        """Write a counters dump chosen by the user"""
+        default = time.strftime(f"la_stats_%Y%m%d_%H%M%S.{fmt}")
+        path, _ = QFileDialog.getSaveFileName(self, "Export Stats", default,
+                                              f"{fmt.upper()} files (*.{fmt})")
+        if not path:
+            return
+        if fmt == 'json':
+            counters.dump_json(path)
+        else:
+            counters.dump_csv(path)
@@ -46,6 +46,9 @@ COLORS = {
 # Get channel colors as list
 CHANNEL_COLORS = [COLORS[f'ch{i}'] for i in range(8)]
 
+# Bus lanes cycle through these, distinct from the channel colors
+BUS_COLORS = [COLORS['info'], COLORS['success'], COLORS['warning'], COLORS['text_bright']]
+
 def get_main_stylesheet():
     """Returns the main application stylesheet"""
     return f"""
@@ -115,6 +118,13 @@ def get_main_stylesheet():
         border: 1px solid {COLORS['bg_tertiary']};
     }}
     
+    /* Channel enable toggles */
+    QPushButton#channelBtn {{
+        min-width: 24px;
+        padding: 4px 6px;
+        color: {COLORS['text_disabled']};
+    }}
+    
     /* Connect Button States */
     QPushButton#connectBtn[connected="true"] {{
         background-color: {COLORS['bg_tertiary']};
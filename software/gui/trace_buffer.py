@@ -0,0 +1,137 @@
+"""
+Append-only vertex storage for digital step traces
+"""
+
+import numpy as np
+
+# Samples per segment drawn at full resolution; longer segments are strided
+SEGMENT_MAX_POINTS = 50000
+
+
+class TraceBuffer:
+    """Growable x/y vertex buffer with O(1) amortized append and front drop
+
+    Vertices live in [head, tail) of preallocated arrays. Appends write at
+    the tail and dropping old vertices only moves head, so per-tick work is
+    proportional to the new data, not the retained history.
+    """
+
+    def __init__(self, capacity=4096):
+        self.x = np.empty(capacity, dtype=np.float64)
+        self.y = np.empty(capacity, dtype=np.float64)
+        self.head = 0
+        self.tail = 0
+
+    def __len__(self):
+        return self.tail - self.head
+
+    def clear(self):
+        self.head = 0
+        self.tail = 0
+
+    def append(self, xs, ys):
+        """Append vertices at the tail"""
+        count = len(xs)
+        if self.tail + count > len(self.x):
+            self._make_room(count)
+        self.x[self.tail:self.tail + count] = xs
+        self.y[self.tail:self.tail + count] = ys
+        self.tail += count
+
+    def drop_before(self, x_min):
+        """Drop vertices left of x_min (x is non-decreasing)
+
+        The last vertex before x_min is kept so a level that has not
+        changed since still reaches x_min.
+        """
+        drop = int(np.searchsorted(self.x[self.head:self.tail], x_min, side='left'))
+        self.head += max(0, drop - 1)
+
+    def view(self):
+        """Return (x, y) views of the live vertices, no copy"""
+        return self.x[self.head:self.tail], self.y[self.head:self.tail]
+
+    def _make_room(self, count):
+        size = self.tail - self.head
+        capacity = len(self.x)
+        while size + count > capacity:
+            capacity *= 2
+        if capacity != len(self.x):
+            x = np.empty(capacity, dtype=np.float64)
+            y = np.empty(capacity, dtype=np.float64)
+        else:
+            x, y = self.x, self.y
+        # Compact live vertices to the front (memmove-safe for overlap)
+        x[:size] = self.x[self.head:self.tail]
+        y[:size] = self.y[self.head:self.tail]
+        self.x, self.y = x, y
+        self.head = 0
+        self.tail = size
+
+
+def expand_steps(capture, lanes, start, stop, y_scale=1.0, min_stride=1, segment_step=1):
+    """Build step-waveform vertices for samples [start, stop) of several lanes
+
+    lanes: list of (channel, y_base). Returns one (xs, ys) pair per lane.
+
+    Only transitions produce vertices, so idle lines cost almost nothing.
+    The range is split at segment boundaries; each new segment after the
+    first starts with a NaN break so connect='finite' leaves gaps empty.
+    A range continuing a segment joins the previous chunk's last vertex.
+    Packed samples are read once per segment and shared by all lanes.
+
+    min_stride and segment_step thin out very long ranges (e.g. history
+    paged in from disk) by striding samples and skipping whole segments.
+    """
+    parts = [([], []) for _ in lanes]
+
+    seg = capture.segment_of(start)
+    while start < stop and seg < capture.num_segments:
+        seg_start = capture.seg_start[seg]
+        seg_stop = min(stop, seg_start + capture.seg_length[seg])
+        period = capture.seg_period[seg]
+        x0 = capture.seg_x[seg] + (start - seg_start) * period
+        x_end = x0 + (seg_stop - start) * period
+        is_break = start == seg_start and seg_start > 0
+
+        stride = max(min_stride, -(-(seg_stop - start) // SEGMENT_MAX_POINTS))
+        packed = capture.get_samples(start, seg_stop, stride)
+        if len(packed) == 0:
+            break
+
+        for (ch, y_base), (xs_parts, ys_parts) in zip(lanes, parts):
+            data = (packed >> ch) & 0x01
+
+            # Indices (into data) where the level changes
+            changes = np.flatnonzero(np.diff(data)) + 1
+            n = len(changes)
+            xs = np.empty(2 * n + 3, dtype=np.float64)
+            ys = np.empty(2 * n + 3, dtype=np.float64)
+
+            # Break vertex before a new segment, or a harmless duplicate
+            xs[0] = x0
+            ys[0] = np.nan if is_break else data[0]
+            xs[1] = x0
+            ys[1] = data[0]
+            change_x = x0 + changes * (stride * period)
+            xs[2:-1:2] = change_x
+            ys[2:-1:2] = data[changes - 1]
+            xs[3:-1:2] = change_x
+            ys[3:-1:2] = data[changes]
+            xs[-1] = x_end
+            ys[-1] = data[-1]
+
+            xs_parts.append(xs)
+            ys_parts.append(ys * y_scale + y_base)
+
+        seg += segment_step
+        if seg < capture.num_segments:
+            start = max(seg_stop, capture.seg_start[seg])
+
+    result = []
+    for xs_parts, ys_parts in parts:
+        if xs_parts:
+            result.append((np.concatenate(xs_parts), np.concatenate(ys_parts)))
+        else:
+            result.append((np.empty(0), np.empty(0)))
+    return result
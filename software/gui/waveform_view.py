@@ -1,31 +1,88 @@
 import pyqtgraph as pg
-from PyQt5.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QScrollBar
-from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QLabel, QScrollBar,
+                             QComboBox, QInputDialog, QMessageBox)
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont
 import numpy as np
 import sys
 import os
+import time
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from perf import counters
+from profiling import profiler
 
 # Import colors from styles
 try:
-    from .styles import CHANNEL_COLORS, COLORS
+    from .styles import CHANNEL_COLORS, BUS_COLORS, COLORS
+    from .trace_buffer import expand_steps
+    from .digital_item import DigitalWaveformItem
+    from .overview_strip import OverviewStrip
+    from .density_item import DensityItem, density_columns
+    from .bus_item import BusItem, bus_changes, bus_columns, parse_bus
 except ImportError:
     # Fallback colors if styles not available
     CHANNEL_COLORS = [
         '#ff5252', '#ffb142', '#2ccce4', '#33d9b2',
         '#706fd3', '#f78fb3', '#82ccdd', '#b33939'
     ]
+    BUS_COLORS = ['#9cdcfe', '#4ec9b0', '#cca700', '#ffffff']
     COLORS = {'bg_dark': '#181818', 'bg_tertiary': '#2d2d2d', 'text_primary': '#d4d4d4'}
+    from gui.trace_buffer import expand_steps
+    from gui.digital_item import DigitalWaveformItem
+    from gui.overview_strip import OverviewStrip
+    from gui.density_item import DensityItem, density_columns
+    from gui.bus_item import BusItem, bus_changes, bus_columns, parse_bus
 
 # Enable OpenGL for hardware acceleration
 pg.setConfigOptions(useOpenGL=True, enableExperimental=True, antialias=True)
 
+# Upper bound on waveform repaints per second
+DEFAULT_MAX_FPS = 30
+
+# Samples read per repaint when the view reaches into spilled history
+HISTORY_MAX_SAMPLES = 1 << 20
+# Segments drawn per repaint of spilled history; more are skipped evenly
+HISTORY_MAX_SEGMENTS = 500
+
+# Above this many samples per pixel lanes are drawn as density strips
+# instead of step lines (LA_DENSITY_SPP overrides it)
+DEFAULT_DENSITY_SPP = float(os.environ.get('LA_DENSITY_SPP', 64))
+
+# Measurement cursors and their colours, cycled
+MAX_CURSORS = 4
+CURSOR_COLORS = ['#ffffff', '#cca700', '#9cdcfe', '#4ec9b0']
+
+# Widest view, in samples, when jumping to an event so glitches are visible
+JUMP_SAMPLES = 200
+
+# Bus lanes shown at startup, e.g. LA_BUSES="DATA:0-7;LOW:0-3" (LSB first)
+DEFAULT_BUSES = os.environ.get('LA_BUSES', '')
+
+class SegmentTimeAxis(pg.AxisItem):
+    """Bottom axis labelling compact timeline positions with their real time"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.capture = None
+    
+    def tickStrings(self, values, scale, spacing):
+        if self.capture is None or self.capture.num_segments < 2:
+            return super().tickStrings(values, scale, spacing)
+        
+        # Enough decimals to tell neighbouring ticks apart, in the axis'
+        # SI-prefixed units
+        spacing *= scale
+        decimals = max(0, int(np.ceil(-np.log10(spacing))) + 1) if spacing > 0 else 3
+        times = self.capture.compact_to_time(values) * scale
+        return [f"{t:.{decimals}f}" for t in times]
+
 class WaveformView(QWidget):
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, max_fps=DEFAULT_MAX_FPS, density_threshold=DEFAULT_DENSITY_SPP):
         super().__init__(parent)
         self.num_channels = 8
         self.channel_colors = CHANNEL_COLORS
+        # Disabled channels get no lane and cost nothing to render
+        self.channel_mask = 0xFF
         
         # Pin mapping reference (CH -> STM32 Pin)
         self.pin_mapping = {
@@ -35,7 +92,32 @@ class WaveformView(QWidget):
         self.zoom_level = 1.0
         self.updating_scrollbar = False
         
+        # Render scheduler: display_capture only marks the view dirty, the
+        # timer repaints at most max_fps times per second
+        self.max_fps = max_fps
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.timeout.connect(self.render_pending)
+        self.pending_capture = None
+        self.pending_full_redraw = False
+        self.data_dirty = False
+        self.last_render_time = 0.0
+        self.last_render_window = None
+        
+        # Zoomed out past this many samples per pixel, draw density strips
+        self.density_threshold = density_threshold
+        self.density_window = None
+        
+        # Channel groups drawn as one lane of hex values, above the channels
+        self.buses = []
+        self.bus_window = None
+        
         self.setup_ui()
+        for spec in filter(None, DEFAULT_BUSES.split(';')):
+            try:
+                self.add_bus(spec)
+            except ValueError as e:
+                print(f"LA_BUSES: {e}")
     
     def setup_ui(self):
         layout = QVBoxLayout()
@@ -70,12 +152,66 @@ class WaveformView(QWidget):
         zoom_fit_btn.setToolTip("Fit to window")
         controls.addWidget(zoom_fit_btn)
         
+        controls.addSpacing(16)
+        
+        # Cursor controls
+        cursor_label = QLabel("CURSORS")
+        cursor_label.setStyleSheet(f"color: {COLORS['text_secondary']}; font-weight: bold; font-size: 9pt;")
+        controls.addWidget(cursor_label)
+        
+        self.add_cursor_btn = QPushButton("Add")
+        self.add_cursor_btn.setMaximumWidth(60)
+        self.add_cursor_btn.clicked.connect(self.add_cursor)
+        self.add_cursor_btn.setToolTip("Add a cursor in the middle of the view")
+        controls.addWidget(self.add_cursor_btn)
+        
+        clear_cursors_btn = QPushButton("Clear")
+        clear_cursors_btn.setMaximumWidth(60)
+        clear_cursors_btn.clicked.connect(self.clear_cursors)
+        clear_cursors_btn.setToolTip("Remove all cursors")
+        controls.addWidget(clear_cursors_btn)
+        
+        self.snap_combo = QComboBox()
+        self.snap_combo.addItem("Snap: off", None)
+        for ch in range(self.num_channels):
+            self.snap_combo.addItem(f"Snap: CH{ch}", ch)
+        self.snap_combo.setToolTip("Cursors snap to the nearest edge of this channel")
+        self.snap_combo.currentIndexChanged.connect(self.on_snap_changed)
+        controls.addWidget(self.snap_combo)
+        
+        controls.addSpacing(16)
+        
+        # Bus controls
+        bus_label = QLabel("BUSES")
+        bus_label.setStyleSheet(f"color: {COLORS['text_secondary']}; font-weight: bold; font-size: 9pt;")
+        controls.addWidget(bus_label)
+        
+        add_bus_btn = QPushButton("Add")
+        add_bus_btn.setMaximumWidth(60)
+        add_bus_btn.clicked.connect(self.prompt_bus)
+        add_bus_btn.setToolTip("Show a group of channels as one lane of hex values")
+        controls.addWidget(add_bus_btn)
+        
+        clear_buses_btn = QPushButton("Clear")
+        clear_buses_btn.setMaximumWidth(60)
+        clear_buses_btn.clicked.connect(self.clear_buses)
+        clear_buses_btn.setToolTip("Remove all bus lanes")
+        controls.addWidget(clear_buses_btn)
+        
         controls.addStretch()
         
         layout.addLayout(controls)
         
+        # Cursor readout, shown while cursors exist
+        self.cursor_readout = QLabel()
+        self.cursor_readout.setContentsMargins(8, 0, 8, 6)
+        self.cursor_readout.setStyleSheet(f"color: {COLORS['text_primary']}; font-family: monospace; font-size: 9pt;")
+        self.cursor_readout.hide()
+        layout.addWidget(self.cursor_readout)
+        
         # Create plot widget with dark theme
-        self.plot_widget = pg.PlotWidget()
+        self.time_axis = SegmentTimeAxis(orientation='bottom')
+        self.plot_widget = pg.PlotWidget(axisItems={'bottom': self.time_axis})
         
         # Dark background
         self.plot_widget.setBackground(COLORS['bg_dark'])
@@ -107,9 +243,17 @@ class WaveformView(QWidget):
         self.plot_widget.scene().sigMouseClicked.connect(self.on_mouse_clicked)
         # Connect X range changed to update scrollbar
         self.plot_widget.sigXRangeChanged.connect(self.update_scrollbar_from_plot)
+        # Data held back while off-screen may now be visible
+        self.plot_widget.sigXRangeChanged.connect(self.on_view_range_changed)
         
         layout.addWidget(self.plot_widget)
         
+        # Edge density of the whole capture, click to jump there
+        self.overview = OverviewStrip(self.channel_colors, COLORS['bg_dark'])
+        self.overview.set_channels([ch for ch, _ in self.enabled_lanes()])
+        self.overview.navigate.connect(self.on_overview_navigate)
+        layout.addWidget(self.overview)
+        
         # Horizontal Scrollbar
         self.scrollbar = QScrollBar(Qt.Horizontal)
         self.scrollbar.setRange(0, 10000)
@@ -136,10 +280,214 @@ class WaveformView(QWidget):
         
         self.setLayout(layout)
         
-        # Store plot items
-        self.channel_plots = []
-        self.channel_labels = []
+        # Vertical layout of the lanes
+        self.channel_height = 0.8
+        self.channel_spacing = 1.0
+        
+        # All lanes and their labels are drawn by one graphics item
+        self.waveform_item = DigitalWaveformItem(
+            self.channel_colors, COLORS['text_secondary'],
+            self.channel_spacing, self.channel_height
+        )
+        self.waveform_item.set_lanes(self.enabled_lanes())
+        self.plot_widget.addItem(self.waveform_item)
+        
+        # Samples spilled to disk are only drawn when scrolled into view
+        self.history_item = DigitalWaveformItem(
+            self.channel_colors, COLORS['text_secondary'],
+            self.channel_spacing, self.channel_height, show_labels=False
+        )
+        self.history_item.set_lanes([])
+        self.plot_widget.addItem(self.history_item)
+        self.history_window = None
+        
+        # Replaces both of the above when zoomed far out
+        self.density_item = DensityItem(self.channel_colors, self.channel_spacing, self.channel_height)
+        self.density_item.set_lanes([ch for ch, _ in self.enabled_lanes()])
+        self.density_item.setZValue(-1)    # under the lane labels
+        self.plot_widget.addItem(self.density_item)
+        
+        # Bus lanes, recomputed for the visible window only
+        self.bus_item = BusItem(BUS_COLORS, COLORS['text_secondary'],
+                                self.channel_spacing, self.channel_height)
+        self.plot_widget.addItem(self.bus_item)
+        
+        gap_pen = pg.mkPen(color=COLORS['text_disabled'], width=1, style=Qt.DashLine)
+        self.gap_markers = self.plot_widget.plot([], [], pen=gap_pen, connect='pairs')
         self.current_capture = None
+        
+        # capture_id of the capture held in the item's vertex buffers and
+        # the absolute sample index (see Capture.sample_offset) they are
+        # rendered up to
+        self.rendered_capture = None
+        self.rendered_until = 0
+        
+        # Measurement cursors, kept at compact timeline positions
+        self.cursors = []
+        self.snapping = False
+        # Marks the event last jumped to; created on the first jump
+        self.event_marker = None
+    
+    def enabled_lanes(self):
+        """(channel, pin name) of every enabled channel, top to bottom"""
+        return [(ch, self.pin_mapping.get(ch, '?')) for ch in range(self.num_channels)
+                if self.channel_mask >> ch & 1]
+    
+    def set_channel_mask(self, channel_mask):
+        """Show only the channels whose bit is set; lanes fill the view"""
+        if channel_mask == self.channel_mask:
+            return
+        self.channel_mask = channel_mask
+        self.waveform_item.set_lanes(self.enabled_lanes())
+        self.history_item.set_lanes([])
+        self.history_window = None
+        self.overview.set_channels([ch for ch, _ in self.enabled_lanes()])
+        self.density_item.set_lanes([ch for ch, _ in self.enabled_lanes()])
+        self.density_window = None
+        self._layout_buses()
+        self._update_y_axis()
+        
+        # Rebuild the vertex buffers without touching the zoom
+        self.rendered_capture = None
+        self.last_render_window = None
+        if self.pending_capture is not None:
+            self.display_capture(self.pending_capture, is_rolling_update=True)
+    
+    def _update_y_axis(self):
+        """Fit the Y range and channel ticks to the enabled lanes"""
+        lanes = self.waveform_item.lanes
+        self.plot_widget.setYRange(-0.5, max(1, self.lane_count()) * self.channel_spacing + 0.5)
+        y_ticks = [(self.waveform_item.lane_base(lane) + self.channel_height/2, f'CH{ch}') 
+                   for lane, (ch, _) in enumerate(lanes)]
+        y_ticks += [(base + self.channel_height/2, name)
+                    for base, (name, _) in zip(self.bus_item.bases, self.buses)]
+        self.plot_widget.getAxis('left').setTicks([y_ticks])
+    
+    def lane_count(self):
+        """Channel lanes plus bus lanes"""
+        return len(self.waveform_item.lanes) + len(self.buses)
+    
+    def add_bus(self, spec):
+        """Add a bus lane from "NAME:channels", e.g. "DATA:0-7" or "4,5,6,7" (LSB first)"""
+        self.set_buses(self.buses + [parse_bus(spec, f"BUS{len(self.buses)}", self.num_channels)])
+    
+    def prompt_bus(self):
+        spec, ok = QInputDialog.getText(self, "Add bus",
+                                        "Channels, least significant first (e.g. 0-3 or DATA:0-7):")
+        if not ok or not spec.strip():
+            return
+        try:
+            self.add_bus(spec)
+        except ValueError as e:
+            QMessageBox.warning(self, "Add bus", str(e))
+    
+    def clear_buses(self):
+        self.set_buses([])
+    
+    def set_buses(self, buses):
+        """Show these (name, channels) groups as bus lanes above the channels"""
+        self.buses = list(buses)
+        self._layout_buses()
+        self._update_y_axis()
+        if self.current_capture is not None:
+            self._update_gap_markers(self.current_capture)
+            self._update_buses(self.current_capture)
+    
+    def _layout_buses(self):
+        # Stacked above the channel lanes, first bus on top
+        count = self.lane_count()
+        bases = [(count - 1 - i) * self.channel_spacing for i in range(len(self.buses))]
+        self.bus_item.set_buses(self.buses, bases)
+        self.bus_window = None
+    
+    def add_cursor(self):
+        """Add a cursor in the middle of the visible range"""
+        if len(self.cursors) >= MAX_CURSORS:
+            return
+        x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+        color = CURSOR_COLORS[len(self.cursors) % len(CURSOR_COLORS)]
+        name = f"C{len(self.cursors) + 1}"
+        line = pg.InfiniteLine(pos=(x_min + x_max) / 2, angle=90, movable=True,
+                               pen=pg.mkPen(color=color, width=1, style=Qt.DashLine),
+                               hoverPen=pg.mkPen(color=color, width=2),
+                               label=name, labelOpts={'position': 0.97, 'color': color})
+        line.name = name
+        line.sigPositionChanged.connect(self.on_cursor_moved)
+        self.plot_widget.addItem(line)
+        self.cursors.append(line)
+        self.add_cursor_btn.setEnabled(len(self.cursors) < MAX_CURSORS)
+        self.on_cursor_moved(line)
+    
+    def clear_cursors(self):
+        for line in self.cursors:
+            self.plot_widget.removeItem(line)
+        self.cursors = []
+        self.add_cursor_btn.setEnabled(True)
+        self.update_cursor_readout()
+    
+    def snap_channel(self):
+        return self.snap_combo.currentData()
+    
+    def on_snap_changed(self):
+        for line in self.cursors:
+            self.snap_cursor(line)
+        self.update_cursor_readout()
+    
+    def on_cursor_moved(self, line):
+        if self.snapping:
+            return
+        self.snap_cursor(line)
+        self.update_cursor_readout()
+    
+    def snap_cursor(self, line):
+        """Move a cursor onto the nearest edge of the snap channel"""
+        capture = self.current_capture
+        ch = self.snap_channel()
+        if capture is None or ch is None:
+            return
+        edge = capture.nearest_edge(ch, capture.compact_index(line.value()))
+        if edge is None:
+            return
+        # setPos re-emits sigPositionChanged; don't snap recursively
+        self.snapping = True
+        try:
+            line.setPos(float(capture.compact_x(edge)))
+        finally:
+            self.snapping = False
+    
+    def update_cursor_readout(self):
+        """Show time and channel states at each cursor and the deltas between them"""
+        capture = self.current_capture
+        if not self.cursors or capture is None:
+            self.cursor_readout.hide()
+            return
+        
+        cursors = sorted(self.cursors, key=lambda line: line.value())
+        xs = np.array([line.value() for line in cursors])
+        times = capture.compact_to_time(xs)
+        ch = self.snap_channel()
+        parts = []
+        for line, t in zip(cursors, times):
+            index = capture.compact_index(line.value())
+            state = capture.state_at(index)
+            # CH7 first, like the bit order of a packed sample
+            bits = ''.join(str(state >> c & 1) if capture.channel_mask >> c & 1 else '-'
+                           for c in reversed(range(capture.num_channels)))
+            parts.append(f"{line.name} {pg.siFormat(t, precision=9, suffix='s')} [{bits}]")
+        
+        for i in range(1, len(cursors)):
+            a, b = cursors[i - 1], cursors[i]
+            dt = times[i] - times[i - 1]
+            text = f"{a.name}\u2192{b.name} \u0394t={pg.siFormat(dt, precision=6, suffix='s')}"
+            if dt > 0:
+                text += f" 1/\u0394t={pg.siFormat(1.0 / dt, precision=5, suffix='Hz')}"
+            if ch is not None:
+                start, stop = capture.compact_index(a.value()), capture.compact_index(b.value())
+                text += f" CH{ch} edges={capture.edge_count(ch, start, stop)}"
+            parts.append(text)
+        
+        self.cursor_readout.setText("   ".join(parts))
+        self.cursor_readout.show()
     
     def on_mouse_clicked(self, event):
         """Stop auto-scroll on user interaction"""
@@ -153,14 +501,21 @@ class WaveformView(QWidget):
     
     def update_scrollbar_from_plot(self):
         """Update scrollbar position and page size based on plot ViewBox"""
-        if self.updating_scrollbar or not self.current_capture:
+        if not self.current_capture:
             return
-            
         view_box = self.plot_widget.getViewBox()
         view_range = view_box.viewRange()[0] # [min, max]
+        self.overview.set_viewport(*view_range)
+        if self.updating_scrollbar:
+            return
+        
         start_time, end_time = view_range
         
-        total_time = self.current_capture.time[-1] if len(self.current_capture.time) > 0 else 1.0
+        # Positions are on the capture's compact timeline
+        data_start, data_end = self.current_capture.compact_range()
+        start_time -= data_start
+        end_time -= data_start
+        total_time = data_end - data_start
         if total_time <= 0: total_time = 1e-9 # Avoid div/0
         
         # Map time to 0-10000 scrollbar range
@@ -186,6 +541,42 @@ class WaveformView(QWidget):
         self.scrollbar.setValue(value)
         self.scrollbar.blockSignals(False)
         
+    def on_overview_navigate(self, x):
+        """Center the view on a position picked in the overview strip"""
+        if not self.current_capture:
+            return
+        self.auto_scroll = False
+        x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+        half = (x_max - x_min) / 2
+        self.plot_widget.setXRange(x - half, x + half, padding=0)
+        
+    def jump_to(self, index):
+        """Center the view on absolute sample index and mark it
+
+        Zooms in to at most JUMP_SAMPLES so a short pulse is visible.
+        Returns False when the sample is no longer in the buffer.
+        """
+        capture = self.current_capture
+        if capture is None:
+            return False
+        relative = index - capture.sample_offset
+        if not 0 <= relative < capture.sample_count:
+            return False
+        self.auto_scroll = False
+        x = float(capture.compact_x(relative))
+        x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+        period = capture.seg_period[capture.segment_of(relative)]
+        half = min(x_max - x_min, JUMP_SAMPLES * period) / 2
+        self.plot_widget.setXRange(x - half, x + half, padding=0)
+
+        if self.event_marker is None:
+            color = COLORS.get('warning', '#cca700')
+            self.event_marker = pg.InfiniteLine(angle=90, movable=False,
+                                                pen=pg.mkPen(color=color, width=1, style=Qt.DotLine))
+            self.plot_widget.addItem(self.event_marker)
+        self.event_marker.setPos(x)
+        return True
+        
     def on_scrollbar_scroll(self, value):
         """Update plot X range based on scrollbar value"""
         if not self.current_capture:
@@ -194,7 +585,8 @@ class WaveformView(QWidget):
         self.updating_scrollbar = True
         self.auto_scroll = False # User interaction stops auto-scroll
         
-        total_time = self.current_capture.time[-1] if len(self.current_capture.time) > 0 else 1.0
+        data_start, data_end = self.current_capture.compact_range()
+        total_time = data_end - data_start
         SCROLL_MAX = 10000
         
         view_box = self.plot_widget.getViewBox()
@@ -204,7 +596,7 @@ class WaveformView(QWidget):
         # value / SCROLL_MAX = start_time / total_time
         # But wait, scrollbar value is typically start of the separate "page".
         
-        start_time = (value / SCROLL_MAX) * total_time
+        start_time = data_start + (value / SCROLL_MAX) * total_time
         end_time = start_time + current_view_width
         
         self.plot_widget.setXRange(start_time, end_time, padding=0)
@@ -224,26 +616,97 @@ class WaveformView(QWidget):
     
     def zoom_fit(self):
         """Fit waveform to window"""
-        self.plot_widget.autoRange()
+        if not self.current_capture:
+            self.plot_widget.autoRange()
+            return
+        # Item bounds only cover what is in RAM; fit the whole capture
+        self.plot_widget.setXRange(*self.current_capture.compact_range(), padding=0.02)
+    
+    def set_density_threshold(self, samples_per_pixel):
+        """Set the samples per pixel above which density strips are drawn"""
+        self.density_threshold = samples_per_pixel
+        if self.current_capture is not None:
+            self._update_detail(self.current_capture)
+    
+    def set_max_fps(self, fps):
+        """Set the repaint rate cap"""
+        self.max_fps = max(1, fps)
     
     def display_capture(self, capture, is_rolling_update=False):
-        """Display a Capture object with enhanced styling and performance"""
-        if not capture or len(capture.time) == 0:
+        """Queue a Capture for display
+        
+        Returns immediately; updates arriving faster than max_fps are
+        coalesced into a single repaint, which draws one snapshot() of it.
+        """
+        if not capture or capture.sample_count == 0:
             return
         
+        self.pending_capture = capture
+        self.pending_full_redraw = self.pending_full_redraw or not is_rolling_update
+        self.data_dirty = True
+        self.schedule_render()
+    
+    def schedule_render(self):
+        """Start the render timer, respecting the frame interval"""
+        if self.render_timer.isActive():
+            return
+        elapsed = time.perf_counter() - self.last_render_time
+        delay = max(0.0, 1.0 / self.max_fps - elapsed)
+        self.render_timer.start(int(delay * 1000))
+    
+    def on_view_range_changed(self):
+        if self.updating_scrollbar:
+            return
+        if self.data_dirty:
+            self.schedule_render()
+        elif self.current_capture is not None:
+            self._update_detail(self.current_capture)
+    
+    def visible_window(self, capture):
+        """Describe what a repaint would show; None if it always changes"""
+        if self.auto_scroll:
+            return None
+        x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+        data_start, data_end = capture.compact_range()
+        return (capture.capture_id, x_min, x_max, max(x_min, data_start), min(x_max, data_end))
+    
+    def render_pending(self):
+        """Render timer slot: repaint the latest queued capture if needed"""
+        if not self.data_dirty:
+            return
+        # One consistent state for the whole frame
+        capture = self.pending_capture.snapshot()
+        full_redraw = self.pending_full_redraw
+        
+        window = self.visible_window(capture)
+        if not full_redraw and window is not None and window == self.last_render_window:
+            # New data is off-screen; keep it pending until the view moves
+            self.current_capture = capture
+            self.update_scrollbar_from_plot()
+            return
+        
+        self.data_dirty = False
+        self.pending_full_redraw = False
+        self.last_render_time = time.perf_counter()
+        with counters.timed('render'), profiler.tick('render_capture', counted=False):
+            self.render_capture(capture, is_rolling_update=not full_redraw)
+        counters.rate('render_frames')
+        self.last_render_window = self.visible_window(capture)
+    
+    def render_capture(self, capture, is_rolling_update=False):
+        """Display a Capture object with enhanced styling and performance"""
         self.current_capture = capture
+        self.time_axis.capture = capture
         
         # Initialize or Clear if not rolling update
         if not is_rolling_update:
-             self.plot_widget.clear()
-             self.channel_plots = []
-             self.channel_labels = []
              self.plot_widget.plotItem.enableAutoRange(pg.ViewBox.XYAxes)
         
-        
-        # Calculate vertical spacing
-        channel_height = 0.8
-        channel_spacing = 1.0
+        if not is_rolling_update or capture.capture_id != self.rendered_capture:
+            # Rebuild the vertex buffers from the whole capture
+            self.waveform_item.clear()
+            self.rendered_capture = capture.capture_id
+            self.rendered_until = capture.sample_offset
         
         # Handle Auto-scrolling calc *before* updating data
         # We want to see a fixed window of time (e.g. 5-10s) or keep user's zoom level
@@ -259,84 +722,37 @@ class WaveformView(QWidget):
             self.plot_widget.plotItem.disableAutoRange(pg.ViewBox.XAxis)
 
         # Performance optimization:
-        # Instead of downsampling blindly, let's use the full data but
-        # rely on OpenGL line drawing which is fast.
-        
-        max_points = 50000 
-        downsample = max(1, len(capture.time) // max_points)
-        
-        # Determine time window for downsampling?
-        # Actually, we can just use all data for now with downsampling logic
-        current_time = capture.time[-1]
-        
-        for ch in range(self.num_channels):
-            channel_data = capture.get_channel(ch)
-            
-            # Efficient indexing for downsampling
-            if downsample > 1:
-                time_ds = capture.time[::downsample]
-                data_ds = channel_data[::downsample]
-            else:
-                time_ds = capture.time
-                data_ds = channel_data
-            
-            # Create step-like digital waveform
-            time_expanded, data_expanded = self._expand_digital(time_ds, data_ds)
-            
-            # Offset vertically
-            y_base = (self.num_channels - 1 - ch) * channel_spacing
-            
-            # Scale data (0..1)
-            data_plot = (data_expanded * channel_height) + y_base
-            
-            if is_rolling_update and ch < len(self.channel_plots):
-                 # Update existing plot
-                self.channel_plots[ch].setData(time_expanded, data_plot)
-                
-                # Update text pos to stay visible? 
-                # For now, let's just keep them at start.
-            else:
-                # Create new plot
-                pen = pg.mkPen(color=self.channel_colors[ch], width=1.5)
-                
-                plot = self.plot_widget.plot(
-                    time_expanded, 
-                    data_plot,
-                    pen=pen,
-                    name=f'CH{ch}',
-                    antialias=False, 
-                    autoDownsample=False 
-                )
-                if ch >= len(self.channel_plots):
-                    self.channel_plots.append(plot)
-                else:
-                    self.channel_plots[ch] = plot
-                
-                # Add channel label if new
-                if ch >= len(self.channel_labels):
-                    pin_name = self.pin_mapping.get(ch, '?')
-                    label_text = f'''
-                    <div style="font-family: monospace; font-weight: bold;">
-                        <span style="color: {self.channel_colors[ch]};">CH{ch}</span>
-                        <span style="color: {COLORS['text_secondary']}; font-size: 8pt;">({pin_name})</span>
-                    </div>
-                    '''
-                    text_item = pg.TextItem(html=label_text, anchor=(0, 0.5))
-                    text_item.setPos(capture.time[0], y_base + channel_height/2)
-                    self.plot_widget.addItem(text_item)
-                    self.channel_labels.append(text_item)
-                else:
-                    # Just update pos
-                    self.channel_labels[ch].setPos(capture.time[0], y_base + channel_height/2)
+        # Only samples appended since the last render are expanded into step
+        # vertices; samples trimmed from the capture are dropped from the
+        # front of the buffers. Per-tick work is proportional to new data.
+        
+        # The buffers only hold samples still in RAM; samples trimmed or
+        # spilled before we rendered them are skipped here and drawn by
+        # the history item when scrolled into view
+        resident = capture.resident_start()
+        new_start = max(resident, self.rendered_until - capture.sample_offset)
+        new_stop = capture.sample_count
+        _, current_time = capture.compact_range()
+        
+        # Step-like digital waveforms for the new samples only, offset
+        # vertically to each lane
+        lanes = [(ch, self.waveform_item.lane_base(lane))
+                 for lane, (ch, _) in enumerate(self.waveform_item.lanes)]
+        with counters.timed('expand_steps'):
+            traces = expand_steps(capture, lanes, new_start, new_stop, self.channel_height)
+        for lane, (xs, ys) in enumerate(traces):
+            self.waveform_item.append(lane, xs, ys)
+        
+        self.waveform_item.drop_before(float(capture.compact_x(min(resident, new_stop - 1))))
+        self.waveform_item.data_changed()
+        self.rendered_until = capture.sample_offset + new_stop
 
+        self._update_gap_markers(capture)
         
         # Set Y axis range
         if not is_rolling_update:
-            self.plot_widget.setYRange(-0.5, self.num_channels * channel_spacing + 0.5)
-            y_ticks = [((self.num_channels - 1 - i) * channel_spacing + channel_height/2, f'CH{i}') 
-                       for i in range(self.num_channels)]
-            self.plot_widget.getAxis('left').setTicks([y_ticks])
-            self.plot_widget.autoRange()
+            self._update_y_axis()
+            self.zoom_fit()
 
         # Apply scrolling
         if should_scroll:
@@ -344,20 +760,112 @@ class WaveformView(QWidget):
             # view_width is from BEFORE the data update
             self.plot_widget.setXRange(current_time - view_width, current_time, padding=0)
     
+        self._update_detail(capture)
+        self.overview.set_capture(capture)
         self.update_scrollbar_from_plot()
+        if self.cursors:
+            self.update_cursor_readout()
 
-    def _expand_digital(self, time, data):
-        """Convert to step waveform by duplicating points using numpy"""
-        if len(time) < 2:
-            return time, data
-        
-        # Vectorized step expansion:
-        # We repeat time twice, shift one copy, to get start/end of each segment
-        # X: [t0, t1, t1, t2, t2, t3...]
-        # Y: [d0, d0, d1, d1, d2, d2...]
-        
-        # Use simple repeat which is very fast
-        time_expanded = np.repeat(time, 2)[1:]
-        data_expanded = np.repeat(data, 2)[:-1]
+    def _update_detail(self, capture):
+        """Draw the view as density strips or as step lines plus history"""
+        if self._update_density(capture):
+            self.waveform_item.set_traces_visible(False)
+            self.history_item.hide()
+        else:
+            self.waveform_item.set_traces_visible(True)
+            self.history_item.show()
+            self._update_history(capture)
+        self._update_buses(capture)
+    
+    def _update_buses(self, capture):
+        """Recompute the bus segments of the visible window"""
+        if not self.buses:
+            return
+        view_box = self.plot_widget.getViewBox()
+        x_min, x_max = view_box.viewRange()[0]
+        width = int(view_box.width())
+        window = (capture.capture_id, x_min, x_max, width,
+                  capture.sample_offset, capture.sample_offset + capture.sample_count)
+        if width <= 0 or window == self.bus_window:
+            return
+        self.bus_window = window
+        
+        first, last = capture.compact_indices([x_min, x_max])
+        last = min(capture.sample_count, int(last) + 1)
+        # Zoomed out like the density view, the edge index gives per-column
+        # values; otherwise the visible samples (at most density_threshold
+        # per pixel) are diffed directly
+        dense = (last - first) / width >= self.density_threshold
+        segments = []
+        with counters.timed('bus_segments'):
+            for _, channels in self.buses:
+                if last <= first:
+                    segments.append(None)
+                elif dense:
+                    segments.append(bus_columns(capture, channels, x_min, x_max, width))
+                else:
+                    segments.append(bus_changes(capture, channels, int(first), last))
+        self.bus_item.set_segments(x_min, x_max, segments)
+    
+    def _update_density(self, capture):
+        """Redraw the density strips if zoomed out far enough; False otherwise"""
+        view_box = self.plot_widget.getViewBox()
+        x_min, x_max = view_box.viewRange()[0]
+        width = int(view_box.width())
+        first, last = capture.compact_indices([x_min, x_max])
+        if width <= 0 or (last - first) / width < self.density_threshold:
+            if self.density_window is not None:
+                self.density_window = None
+                self.density_item.clear()
+            return False
+        
+        window = (capture.capture_id, x_min, x_max, width,
+                  capture.sample_offset, capture.sample_offset + capture.sample_count)
+        if window != self.density_window:
+            self.density_window = window
+            channels = self.density_item.channels
+            with counters.timed('density'):
+                high, edges, valid = density_columns(capture, channels, x_min, x_max, width)
+            self.density_item.set_columns(x_min, x_max, high, edges, valid)
+        return True
+    
+    def _update_history(self, capture):
+        """Draw the visible part of the capture that was spilled to disk"""
+        resident = capture.resident_start()
+        x_min, x_max = self.plot_widget.getViewBox().viewRange()[0]
+        start = capture.compact_index(x_min)
+        stop = min(resident, capture.compact_index(x_max) + 1)
+        if start >= stop:
+            window = None
+        else:
+            # Thin out long ranges so scrolling far back stays responsive
+            min_stride = -(-(stop - start) // HISTORY_MAX_SAMPLES)
+            first, last = capture.segment_of(start), capture.segment_of(stop - 1)
+            segment_step = max(1, (last - first + 1) // HISTORY_MAX_SEGMENTS)
+            window = (capture.capture_id, capture.sample_offset + start,
+                      capture.sample_offset + stop, min_stride, segment_step)
+        if window == self.history_window:
+            return
+        self.history_window = window
         
-        return time_expanded, data_expanded
+        if window is None:
+            self.history_item.set_lanes([])
+            return
+        self.history_item.set_lanes(self.waveform_item.lanes)
+        lanes = [(ch, self.history_item.lane_base(lane))
+                 for lane, (ch, _) in enumerate(self.history_item.lanes)]
+        with counters.timed('expand_history'):
+            traces = expand_steps(capture, lanes, start, stop, self.channel_height,
+                                  min_stride, segment_step)
+        for lane, (xs, ys) in enumerate(traces):
+            self.history_item.append(lane, xs, ys)
+        self.history_item.data_changed()
+
+    def _update_gap_markers(self, capture):
+        """Draw a dashed separator at every shrunk gap between bursts"""
+        gaps = capture.gap_positions()
+        
+        # All separators share one item, drawn as disconnected pairs
+        xs = np.repeat(gaps, 2)
+        ys = np.tile([-0.5, self.lane_count() * self.channel_spacing], len(gaps))
+        self.gap_markers.setData(xs, ys, connect='pairs')
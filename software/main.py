@@ -1,4 +1,5 @@
 import sys
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtGui import QFont
 from gui.main_window import MainWindow
@@ -15,4 +16,6 @@ def main():
     sys.exit(app.exec_())
 
 if __name__ == '__main__':
+    # The acquisition worker is spawned from the frozen executable too
+    multiprocessing.freeze_support()
     main()
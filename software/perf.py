@@ -0,0 +1,213 @@
+import csv
+import json
+import math
+import time
+from collections import deque
+
+# Histogram buckets grow by sqrt(2) starting at 1us; 64 buckets reach ~71 min
+HIST_MIN = 1e-6
+HIST_BUCKETS = 64
+
+class Histogram:
+    """Fixed-size log-bucketed histogram of durations in seconds"""
+
+    def __init__(self):
+        self.buckets = [0] * HIST_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+        self.last = 0.0
+
+    def record(self, value):
+        if value <= HIST_MIN:
+            index = 0
+        else:
+            index = min(HIST_BUCKETS - 1, int(2 * math.log2(value / HIST_MIN)) + 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += value
+        self.last = value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """Approximate percentile (upper edge of the bucket holding it)"""
+        if self.count == 0:
+            return 0.0
+        target = q / 100.0 * self.count
+        seen = 0
+        for index, n in enumerate(self.buckets):
+            seen += n
+            if seen >= target:
+                return min(self.max, HIST_MIN * 2 ** (index / 2))
+        return self.max
+
+    def merge(self, other):
+        """Add another histogram's durations to this one"""
+        if other.count == 0:
+            return
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.last = other.last
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'max': self.max,
+            'last': self.last,
+        }
+
+class RateMeter:
+    """Events or amounts per second over a sliding window"""
+
+    def __init__(self, window=5.0, maxlen=4096):
+        self.window = window
+        self.events = deque(maxlen=maxlen)
+        self.total = 0
+
+    def add(self, amount=1):
+        self.events.append((time.perf_counter(), amount))
+        self.total += amount
+
+    def rate(self):
+        now = time.perf_counter()
+        while self.events and now - self.events[0][0] > self.window:
+            self.events.popleft()
+        if not self.events:
+            return 0.0
+        span = max(now - self.events[0][0], 1e-3)
+        return sum(amount for _, amount in self.events) / span
+
+class _Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.start)
+        return False
+
+class PerfCounters:
+    """Always-on hot-path instrumentation
+
+    Stage timings go into fixed-size histograms, link bytes and render
+    frames into sliding-window rate meters, and everything else into plain
+    counters and gauges. Memory use is bounded regardless of run length.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.time()
+        self.stages = {}
+        self.rates = {}
+        self.counters = {}
+        self.gauges = {}
+
+    def timed(self, stage):
+        """Context manager recording the duration of a stage"""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        return _Timer(histogram)
+
+    def record(self, stage, seconds):
+        """Record a duration measured elsewhere"""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram()
+        histogram.record(seconds)
+
+    def rate(self, name, amount=1):
+        """Add to a per-second rate (e.g. link bytes, rendered frames)"""
+        meter = self.rates.get(name)
+        if meter is None:
+            meter = self.rates[name] = RateMeter()
+        meter.add(amount)
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, value):
+        self.gauges[name] = value
+
+    def drain(self):
+        """Metrics recorded since the last drain(), for merge() in another
+        process; this instance starts over empty"""
+        delta = (self.stages, {name: m.total for name, m in self.rates.items()},
+                 self.counters, self.gauges)
+        self.stages, self.rates, self.counters, self.gauges = {}, {}, {}, {}
+        return delta
+
+    def merge(self, delta):
+        """Add metrics drained from another process's instance"""
+        stages, rates, counts, gauges = delta
+        for name, histogram in stages.items():
+            if name in self.stages:
+                self.stages[name].merge(histogram)
+            else:
+                self.stages[name] = histogram
+        for name, amount in rates.items():
+            self.rate(name, amount)
+        for name, amount in counts.items():
+            self.count(name, amount)
+        self.gauges.update(gauges)
+
+    def snapshot(self):
+        """Plain dict of every metric, suitable for JSON"""
+        return {
+            'started': self.started,
+            'timestamp': time.time(),
+            'stages': {name: h.summary() for name, h in self.stages.items()},
+            'rates': {name: {'per_second': m.rate(), 'total': m.total}
+                      for name, m in self.rates.items()},
+            'counters': dict(self.counters),
+            'gauges': dict(self.gauges),
+        }
+
+    def summary(self):
+        """One-line summary for the status bar"""
+        rates = self.rates
+        link = rates['link_bytes'].rate() if 'link_bytes' in rates else 0.0
+        fps = rates['render_frames'].rate() if 'render_frames' in rates else 0.0
+        memory = self.gauges.get('buffer_bytes', 0)
+        dropped = self.counters.get('frames_dropped', 0)
+        resynced = self.counters.get('frames_resynced', 0)
+        return (f"Link {link / 1024:.1f} KB/s | {fps:.0f} FPS | "
+                f"Buffer {memory / 1e6:.1f} MB | Dropped {dropped} | Resync {resynced}")
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def dump_csv(self, path):
+        """One row per metric: kind, name, field, value"""
+        snap = self.snapshot()
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['kind', 'name', 'field', 'value'])
+            for kind in ('stages', 'rates'):
+                for name, fields in snap[kind].items():
+                    for field, value in fields.items():
+                        writer.writerow([kind, name, field, value])
+            for kind in ('counters', 'gauges'):
+                for name, value in snap[kind].items():
+                    writer.writerow([kind, name, '', value])
+
+# Process-wide instance shared by the device, capture and GUI layers
+counters = PerfCounters()
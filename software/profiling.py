@@ -0,0 +1,158 @@
+import cProfile
+import csv
+import os
+import pstats
+import tempfile
+import time
+import tracemalloc
+
+# Environment variables that arm a session at startup
+ENV_TICKS = 'LA_PROFILE_TICKS'          # number of live capture ticks
+ENV_DIR = 'LA_PROFILE_DIR'              # parent directory for the reports
+ENV_BUDGET = 'LA_PROFILE_BUDGET_MS'     # flag ticks slower than this
+
+DEFAULT_TICKS = 100
+DEFAULT_TOP_N = 25
+
+class _Tick:
+    __slots__ = ('session', 'label', 'counted', 'start', 'depth', 'base_memory')
+
+    def __init__(self, session, label, counted):
+        self.session = session
+        self.label = label
+        self.counted = counted
+
+    def __enter__(self):
+        session = self.session
+        self.depth = session._depth
+        session._depth += 1
+        if self.depth == 0:
+            session.profiler.enable()
+            # Peak above the starting point shows transient allocations
+            # (e.g. np.concatenate temporaries) that are freed again
+            tracemalloc.reset_peak()
+            self.base_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        session = self.session
+        elapsed = time.perf_counter() - self.start
+        session._depth -= 1
+        peak = None
+        if self.depth == 0:
+            session.profiler.disable()
+            peak = tracemalloc.get_traced_memory()[1] - self.base_memory
+        session._end_tick(self.label, elapsed, peak, self.counted)
+        return False
+
+class _Idle:
+    """Context manager used while no session is running"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_IDLE = _Idle()
+
+class ProfileSession:
+    """Opt-in cProfile + tracemalloc session over N live ticks
+
+    Wrap each unit of work in tick(label). While a session runs, ticks are
+    profiled (nested ticks share the outer profile) and timed; counted ticks
+    move the session towards its end. When done, the output directory holds:
+
+        profile.prof      cProfile stats (snakeviz, pstats)
+        profile.txt       top functions by cumulative time
+        allocations.txt   top allocation sites from tracemalloc
+        ticks.csv         every tick with its latency, transient allocation
+                          peak and budget flag
+    """
+
+    def __init__(self):
+        self.active = False
+        self.on_finished = None
+        self.out_dir = None
+
+    def start(self, ticks=DEFAULT_TICKS, base_dir=None, budget_ms=None, top_n=DEFAULT_TOP_N):
+        """Arm a session for the next `ticks` counted ticks"""
+        if self.active:
+            return self.out_dir
+        if base_dir is None:
+            base_dir = os.path.join(tempfile.gettempdir(), 'stm32_la_profiles')
+        self.out_dir = os.path.join(base_dir, time.strftime('%Y%m%d_%H%M%S'))
+        os.makedirs(self.out_dir, exist_ok=True)
+
+        self.ticks_left = ticks
+        self.budget = budget_ms / 1000.0 if budget_ms else None
+        self.top_n = top_n
+        self.tick_log = []
+        self.slow_ticks = 0
+        self.profiler = cProfile.Profile()
+        self._depth = 0
+        self._own_tracemalloc = not tracemalloc.is_tracing()
+        if self._own_tracemalloc:
+            tracemalloc.start()
+        self.start_snapshot = tracemalloc.take_snapshot()
+        self.active = True
+        return self.out_dir
+
+    def start_from_env(self):
+        """Start a session if LA_PROFILE_TICKS is set; return its directory"""
+        ticks = os.environ.get(ENV_TICKS)
+        if not ticks:
+            return None
+        budget = os.environ.get(ENV_BUDGET)
+        return self.start(int(ticks), os.environ.get(ENV_DIR),
+                          float(budget) if budget else None)
+
+    def tick(self, label, counted=True):
+        """Context manager profiling one unit of work"""
+        if not self.active:
+            return _IDLE
+        return _Tick(self, label, counted)
+
+    def _end_tick(self, label, elapsed, peak, counted):
+        over = self.budget is not None and elapsed > self.budget
+        if over:
+            self.slow_ticks += 1
+        peak_kb = '' if peak is None else f"{peak / 1024:.1f}"
+        self.tick_log.append((time.time(), label, f"{elapsed * 1000.0:.3f}", peak_kb, over))
+        if counted:
+            self.ticks_left -= 1
+            if self.ticks_left <= 0 and self._depth == 0:
+                self.stop()
+
+    def stop(self):
+        """End the session early or on completion and write the reports"""
+        if not self.active:
+            return None
+        self.active = False
+        self.profiler.disable()
+
+        self.profiler.dump_stats(os.path.join(self.out_dir, 'profile.prof'))
+        with open(os.path.join(self.out_dir, 'profile.txt'), 'w') as f:
+            stats = pstats.Stats(self.profiler, stream=f)
+            stats.sort_stats('cumulative').print_stats(self.top_n)
+
+        snapshot = tracemalloc.take_snapshot()
+        if self._own_tracemalloc:
+            tracemalloc.stop()
+        with open(os.path.join(self.out_dir, 'allocations.txt'), 'w') as f:
+            f.write(f"Top {self.top_n} allocation sites by growth over the session\n\n")
+            for stat in snapshot.compare_to(self.start_snapshot, 'lineno')[:self.top_n]:
+                f.write(f"{stat}\n")
+
+        with open(os.path.join(self.out_dir, 'ticks.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['timestamp', 'label', 'elapsed_ms', 'alloc_peak_kb', 'over_budget'])
+            writer.writerows(self.tick_log)
+
+        if self.on_finished:
+            self.on_finished(self.out_dir, self.slow_ticks)
+        return self.out_dir
+
+# Process-wide session shared by the main window and waveform view
+profiler = ProfileSession()
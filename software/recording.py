@@ -0,0 +1,359 @@
+import argparse
+import json
+import struct
+import time
+from collections import deque
+
+from perf import counters
+
+# Port names of the form "replay:<path>" connect to a recording
+REPLAY_PREFIX = 'replay:'
+
+MAGIC = b'LAREC1\n'
+
+# Record: direction, seconds since recording start, payload length
+RECORD = struct.Struct('<Bdi')
+RX = 0          # bytes the host received (or discarded)
+TX = 1          # bytes the host sent
+RESET = 2       # host called reset_input_buffer()
+
+class RecordingSerial:
+    """Wraps a serial port and logs all traffic to a recording file
+
+    Bytes still waiting when the host resets its input buffer are read
+    and logged first, so a replay can discard exactly the same bytes.
+    """
+
+    def __init__(self, serial_port, path, port_name=None):
+        self.serial = serial_port
+        self.file = open(path, 'wb')
+        self.started = time.perf_counter()
+        header = {
+            'port': port_name,
+            'baudrate': getattr(serial_port, 'baudrate', None),
+            'created': time.time(),
+        }
+        self.file.write(MAGIC)
+        self.file.write(json.dumps(header).encode() + b'\n')
+
+    def _log(self, direction, data=b''):
+        elapsed = time.perf_counter() - self.started
+        self.file.write(RECORD.pack(direction, elapsed, len(data)))
+        self.file.write(data)
+
+    @property
+    def baudrate(self):
+        return self.serial.baudrate
+
+    @baudrate.setter
+    def baudrate(self, baud):
+        # Speed switches are not logged; a replay keeps the recorded bytes
+        self.serial.baudrate = baud
+
+    @property
+    def in_waiting(self):
+        return self.serial.in_waiting
+
+    def read(self, size=1):
+        data = self.serial.read(size)
+        if data:
+            self._log(RX, data)
+        return data
+
+    def readinto(self, buffer):
+        n = self.serial.readinto(buffer)
+        if n:
+            self._log(RX, bytes(buffer[:n]))
+        return n
+
+    def readline(self):
+        data = self.serial.readline()
+        if data:
+            self._log(RX, data)
+        return data
+
+    def write(self, data):
+        self._log(TX, bytes(data))
+        return self.serial.write(data)
+
+    def reset_input_buffer(self):
+        waiting = self.serial.in_waiting
+        if waiting:
+            self._log(RX, self.serial.read(waiting))
+        self._log(RESET)
+        self.serial.reset_input_buffer()
+
+    def close(self):
+        self.serial.close()
+        self.file.close()
+
+def load_recording(path):
+    """Return (header dict, list of (direction, time, data))"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a logic analyzer recording")
+        header = json.loads(f.readline())
+        records = []
+        while True:
+            raw = f.read(RECORD.size)
+            if len(raw) < RECORD.size:
+                break
+            direction, elapsed, length = RECORD.unpack(raw)
+            records.append((direction, elapsed, f.read(length)))
+    return header, records
+
+class ReplaySerial:
+    """Serial stand-in that plays a recording back to the host
+
+    The host's own reset_input_buffer() calls keep it in step with the
+    recording: each one discards received bytes up to the next recorded
+    reset. In real time mode bytes arrive with their recorded spacing;
+    otherwise everything up to the next reset is available at once.
+    Host writes are compared with the recorded ones and mismatches
+    counted as replay_tx_mismatch.
+    """
+
+    def __init__(self, path, realtime=False, timeout=2):
+        self.header, records = load_recording(path)
+        self.realtime = realtime
+        self.timeout = timeout
+        self.baudrate = self.header.get('baudrate')
+        self.is_open = True
+        # Received bytes split into runs between recorded resets
+        self.runs = deque([deque()])
+        self.tx = deque()
+        for direction, elapsed, data in records:
+            if direction == RX:
+                self.runs[-1].append((elapsed, data))
+            elif direction == RESET:
+                self.runs.append(deque())
+            else:
+                self.tx.append(data)
+        self._rx = bytearray()
+        self.clock_offset = None
+
+    def _now(self):
+        # Recording time corresponding to the current moment
+        now = time.perf_counter()
+        if self.clock_offset is None:
+            run = self.runs[0]
+            self.clock_offset = now - (run[0][0] if run else 0.0)
+        return now - self.clock_offset
+
+    def _release(self):
+        run = self.runs[0]
+        if not self.realtime:
+            while run:
+                self._rx += run.popleft()[1]
+            return
+        now = self._now()
+        while run and run[0][0] <= now:
+            self._rx += run.popleft()[1]
+
+    @property
+    def finished(self):
+        """True once every recorded byte has been delivered"""
+        return len(self.runs) == 1 and not self.runs[0] and not self._rx
+
+    @property
+    def run_finished(self):
+        """True once the bytes before the next recorded reset are delivered"""
+        self._release()
+        return not self.runs[0] and not self._rx
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self._rx)
+
+    def read(self, size=1):
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while self.in_waiting < size and self.runs[0] and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while self.in_waiting < size and self.runs[0] and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        n = min(size, len(self._rx))
+        buffer[:n] = self._rx[:n]
+        del self._rx[:n]
+        return n
+
+    def readline(self):
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while True:
+            self._release()
+            end = self._rx.find(b'\n')
+            if end >= 0 or not self.runs[0] or time.perf_counter() >= deadline:
+                break
+            time.sleep(0.001)
+        size = end + 1 if end >= 0 else len(self._rx)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def write(self, data):
+        expected = self.tx.popleft() if self.tx else None
+        if expected != bytes(data):
+            counters.count('replay_tx_mismatch')
+        return len(data)
+
+    def reset_input_buffer(self):
+        # Drop what the recorded session dropped and continue from there
+        self._rx.clear()
+        if len(self.runs) > 1:
+            self.runs.popleft()
+            if self.realtime and self.runs[0]:
+                self.clock_offset = time.perf_counter() - self.runs[0][0][0]
+
+    def close(self):
+        self.is_open = False
+
+def open_replay(port, realtime=False):
+    return ReplaySerial(port[len(REPLAY_PREFIX):], realtime=realtime)
+
+# Rate command bytes, replayed through set_sample_rate()
+RATE_CODES = b'EDBA1256'
+
+def _connect_replay(path, realtime=False):
+    from device import LogicAnalyzerDevice
+
+    # Encoding, checksum and speed negotiation are replayed like any other
+    # command by _replay_commands()
+    device = LogicAnalyzerDevice(REPLAY_PREFIX + path, compression=False,
+                                 replay_realtime=realtime, checksums=False)
+    if not device.connect():
+        raise RuntimeError("Recording has no device info response")
+    return device
+
+def _replay_commands(device, ingest):
+    """Issue the recorded host commands again, passing frame lists to ingest"""
+    replay = device.serial
+    while replay.tx:
+        command = replay.tx[0][:1]
+        if command in b'Cc':
+            frame = device.capture(timeout=1)
+            ingest([frame] if frame else [])
+        elif command == b'S':
+            if device.start_stream():
+                # Chunks run up to the reset in the recorded stop_stream()
+                while not replay.run_finished:
+                    ingest(device.read_stream())
+                    time.sleep(device.poll_interval)
+                ingest(device.read_stream())
+            device.stop_stream()
+        elif command in (b'L', b'U'):
+            device.set_encoding('RLE' if command == b'L' else 'RAW')
+        elif command in (b'Q', b'N'):
+            device.set_crc(command == b'Q')
+        elif command == b'K':
+            # Takes its echoes (Y) from the recording as well
+            device._switch_baud(int(replay.tx[0][1:]))
+        elif command and command in RATE_CODES:
+            device.set_sample_rate(command.decode())
+        elif command in b'Rr':
+            device.reset_device()
+        else:
+            replay.write(replay.tx[0])
+
+def append_frame(capture, frame):
+    """Add a replayed frame or chunk to capture; None starts a new Capture"""
+    from capture import Capture
+
+    if capture is None:
+        return Capture(frame['samples'], frame['sample_period_ns'],
+                       timestamp=frame['timestamp'])
+    contiguous = frame.get('type') == 'chunk' and not frame['dropped']
+    capture.append_samples(frame['samples'], frame['sample_period_ns'],
+                           timestamp=None if contiguous else frame['timestamp'])
+    return capture
+
+def load_capture(path):
+    """Replay a recording as fast as possible and return its Capture (or None)"""
+    device = _connect_replay(path)
+    capture = None
+
+    def ingest(batch):
+        nonlocal capture
+        for frame in batch:
+            capture = append_frame(capture, frame)
+
+    _replay_commands(device, ingest)
+    device.disconnect()
+    return capture
+
+def benchmark(path, realtime=False, render=False):
+    """Replay a recording through device -> Capture (-> WaveformView)
+
+    The host commands found in the recording are issued again through
+    LogicAnalyzerDevice, so responses are parsed by the real code paths.
+    Returns counters and throughput figures for the run.
+    """
+    view = app = None
+    if render:
+        from PyQt5.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication([])
+        from gui.waveform_view import WaveformView
+        view = WaveformView()
+        view.resize(1200, 600)
+        view.show()
+
+    device = _connect_replay(path, realtime)
+    capture = None
+    frames = 0
+
+    def ingest(batch):
+        nonlocal capture, frames
+        for frame in batch:
+            frames += 1
+            capture = append_frame(capture, frame)
+            if view is not None:
+                view.display_capture(capture, is_rolling_update=True)
+        if app is not None:
+            app.processEvents()
+
+    counters.reset()
+    start = time.perf_counter()
+    _replay_commands(device, ingest)
+    elapsed = time.perf_counter() - start
+
+    samples = capture.sample_count if capture else 0
+    result = {
+        'frames': frames,
+        'samples': samples,
+        'seconds': elapsed,
+        'frames_per_second': frames / elapsed if elapsed else 0.0,
+        'samples_per_second': samples / elapsed if elapsed else 0.0,
+        'counters': counters.snapshot(),
+    }
+    device.disconnect()
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a serial recording and measure host ingest")
+    parser.add_argument('recording')
+    parser.add_argument('--realtime', action='store_true', help="keep the recorded timing")
+    parser.add_argument('--render', action='store_true', help="also feed a WaveformView")
+    parser.add_argument('--json', help="write the full result here")
+    args = parser.parse_args(argv)
+
+    result = benchmark(args.recording, args.realtime, args.render)
+    print(f"{result['frames']} frames, {result['samples']} samples in {result['seconds']:.3f} s")
+    print(f"{result['frames_per_second']:.1f} frames/s, "
+          f"{result['samples_per_second'] / 1e6:.2f} Msamples/s")
+    stages = result['counters']['stages']
+    for name in sorted(stages):
+        s = stages[name]
+        print(f"  {name:16s} n={s['count']:<6d} mean={s['mean'] * 1000:.3f} ms "
+              f"p95={s['p95'] * 1000:.3f} ms")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(result, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Headless rendering of capture windows to PNG or SVG
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from perf import counters
+from gui.styles import CHANNEL_COLORS, COLORS
+from gui.density_item import minmax_columns
+
+# Pixel layout: label column on the left, time ruler at the bottom
+LABEL_WIDTH = 56
+RULER_HEIGHT = 20
+MARGIN = 6
+LANE_PIXELS = 40
+# Fraction of a lane's pitch the trace spans, as in WaveformView
+LANE_HEIGHT = 0.8
+
+
+# Offscreen application created for scripts; kept alive for the process
+_app = None
+
+
+def _gui_app():
+    """The running Qt application, or an offscreen one for scripts"""
+    global _app
+    from PyQt5.QtGui import QGuiApplication
+
+    if QGuiApplication.instance() is None:
+        # No display server needed; an existing QT_QPA_PLATFORM wins
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        _app = QGuiApplication([])
+    return QGuiApplication.instance()
+
+
+def _paint(painter, capture, channels, x_min, x_max, width, height):
+    from PyQt5.QtCore import Qt, QPointF, QRectF
+    from PyQt5.QtGui import QColor, QFont, QPainterPath, QPen
+    import pyqtgraph as pg
+
+    painter.fillRect(QRectF(0, 0, width, height), QColor(COLORS['bg_dark']))
+    plot_width = max(1, width - LABEL_WIDTH - MARGIN)
+    pitch = (height - RULER_HEIGHT - MARGIN) / max(1, len(channels))
+    font = QFont("monospace", 9, QFont.Bold)
+    font.setStyleHint(QFont.Monospace)
+    painter.setFont(font)
+
+    low, high, valid = minmax_columns(capture, channels, x_min, x_max, plot_width)
+    for lane, ch in enumerate(channels):
+        color = QColor(CHANNEL_COLORS[ch % len(CHANNEL_COLORS)])
+        top = MARGIN + lane * pitch
+        y_high = top + pitch * (1 - LANE_HEIGHT) / 2
+        y_low = y_high + pitch * LANE_HEIGHT
+        painter.setPen(color)
+        painter.drawText(QRectF(MARGIN, top, LABEL_WIDTH - MARGIN, pitch),
+                         Qt.AlignVCenter | Qt.AlignLeft, f"CH{ch}")
+
+        # One path element per run of equal columns, not per sample
+        path = QPainterPath()
+        blocks = QPainterPath()
+        key = np.where(valid, low[lane] * 2 + high[lane], -1)
+        starts = np.flatnonzero(np.diff(key, prepend=-2))
+        ends = np.append(starts[1:], plot_width)
+        drawing = False
+        for start, end in zip(starts, ends):
+            kind = key[start]
+            x0, x1 = LABEL_WIDTH + start, LABEL_WIDTH + end
+            if kind < 0:
+                drawing = False
+            elif kind == 1:
+                # Toggles inside every column: a solid activity block
+                blocks.addRect(QRectF(x0, y_high, x1 - x0, y_low - y_high))
+                drawing = False
+            else:
+                y = y_high if kind == 3 else y_low
+                if drawing:
+                    path.lineTo(QPointF(x0, y))
+                else:
+                    path.moveTo(QPointF(x0, y))
+                path.lineTo(QPointF(x1, y))
+                drawing = True
+        painter.setPen(QPen(color, 1))
+        painter.drawPath(path)
+        painter.fillPath(blocks, color)
+
+    # Real gaps between bursts, dashed as in the interactive view
+    painter.setPen(QPen(QColor(COLORS['text_disabled']), 1, Qt.DashLine))
+    scale = plot_width / (x_max - x_min)
+    for x in capture.gap_positions():
+        if x_min <= x < x_max:
+            px = LABEL_WIDTH + (x - x_min) * scale
+            painter.drawLine(QPointF(px, MARGIN), QPointF(px, height - RULER_HEIGHT))
+
+    t0, t1 = capture.compact_to_time([x_min, x_max])
+    painter.setPen(QColor(COLORS['text_secondary']))
+    ruler = QRectF(LABEL_WIDTH, height - RULER_HEIGHT, plot_width, RULER_HEIGHT)
+    painter.drawText(ruler, Qt.AlignVCenter | Qt.AlignLeft, pg.siFormat(t0, precision=6, suffix='s'))
+    painter.drawText(ruler, Qt.AlignVCenter | Qt.AlignRight, pg.siFormat(t1, precision=6, suffix='s'))
+    painter.drawText(ruler, Qt.AlignCenter,
+                     f"{pg.siFormat(t1 - t0, suffix='s')} / {plot_width} px")
+
+
+def render(capture, path, width=1600, height=None, x_min=None, x_max=None, channels=None):
+    """Render [x_min, x_max) of a capture's compact timeline to a PNG or SVG
+
+    The format follows path's extension. The window defaults to the whole
+    retained capture and channels to the enabled ones; height defaults to
+    LANE_PIXELS per lane. Works without a display server. Reads one
+    capture.snapshot(), so the capture may keep appending meanwhile.
+    """
+    from PyQt5.QtCore import QRect, QSize
+    from PyQt5.QtGui import QImage, QPainter
+
+    _gui_app()
+    capture = capture.snapshot()
+    if channels is None:
+        channels = [ch for ch in range(capture.num_channels) if capture.channel_mask >> ch & 1]
+    if height is None:
+        height = len(channels) * LANE_PIXELS + RULER_HEIGHT + MARGIN
+    full = capture.compact_range()
+    x_min = full[0] if x_min is None else x_min
+    x_max = full[1] if x_max is None else x_max
+    if x_max <= x_min:
+        raise ValueError(f"Empty render window [{x_min}, {x_max})")
+
+    with counters.timed('render'):
+        if path.lower().endswith('.svg'):
+            from PyQt5.QtSvg import QSvgGenerator
+
+            target = QSvgGenerator()
+            target.setFileName(path)
+            target.setSize(QSize(width, height))
+            target.setViewBox(QRect(0, 0, width, height))
+        else:
+            target = QImage(width, height, QImage.Format_RGB32)
+        painter = QPainter(target)
+        try:
+            _paint(painter, capture, channels, x_min, x_max, width, height)
+        finally:
+            painter.end()
+        if isinstance(target, QImage) and not target.save(path):
+            raise OSError(f"Could not write {path}")
+    return path
+
+
+# Recording and its capture, loaded once per worker process by _worker_init()
+_worker_source = None
+_worker_capture = None
+
+
+def _worker_init(source):
+    global _worker_source, _worker_capture
+    from recording import load_capture
+
+    _worker_source = source
+    _worker_capture = load_capture(source)
+
+
+def _worker_render(args):
+    path, options = args
+    # Raised here rather than in _worker_init(), which would only break the pool
+    if _worker_capture is None:
+        raise ValueError(f"Recording {_worker_source} contains no frames")
+    return render(_worker_capture, path, **options)
+
+
+def render_windows(source, windows, jobs=None, **options):
+    """Render many (path, x_min, x_max) windows of a capture
+
+    source is a Capture (rendered here, one window after the other) or a
+    recording file, which each of jobs worker processes loads once and
+    then renders its share of the windows from. Returns the written paths.
+    """
+    tasks = [(path, dict(options, x_min=x_min, x_max=x_max)) for path, x_min, x_max in windows]
+    if not isinstance(source, str):
+        # Every window shows the same state of the capture
+        source = source.snapshot()
+        return [render(source, path, **opts) for path, opts in tasks]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_worker_init,
+                             initargs=(source,)) as pool:
+        return list(pool.map(_worker_render, tasks))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render a recorded capture to PNG or SVG without a display")
+    parser.add_argument('recording', help=".larec file, see LA_RECORD_DIR")
+    parser.add_argument('-o', '--output', default='capture.png',
+                        help="output file; .svg for vector output")
+    parser.add_argument('--width', type=int, default=1600)
+    parser.add_argument('--height', type=int)
+    parser.add_argument('--start', type=float, help="window start on the compact timeline (s)")
+    parser.add_argument('--stop', type=float, help="window end on the compact timeline (s)")
+    parser.add_argument('--channels', help="comma separated channel numbers")
+    parser.add_argument('--windows', type=int, default=1,
+                        help="split the range into this many images, numbered after the output name")
+    parser.add_argument('--jobs', type=int, help="worker processes for --windows")
+    args = parser.parse_args(argv)
+
+    options = {'width': args.width, 'height': args.height}
+    if args.channels:
+        options['channels'] = [int(ch) for ch in args.channels.split(',')]
+
+    from recording import load_capture
+
+    capture = load_capture(args.recording)
+    if capture is None:
+        parser.error("recording contains no frames")
+    full = capture.compact_range()
+    start = full[0] if args.start is None else args.start
+    stop = full[1] if args.stop is None else args.stop
+    bounds = np.linspace(start, stop, args.windows + 1)
+    stem, ext = os.path.splitext(args.output)
+    names = ([args.output] if args.windows == 1 else
+             [f"{stem}_{i:03d}{ext}" for i in range(args.windows)])
+    windows = list(zip(names, bounds[:-1], bounds[1:]))
+
+    # Workers load the recording themselves; one window is drawn right here
+    source = args.recording if args.windows > 1 and args.jobs != 1 else capture
+    for path in render_windows(source, windows, jobs=args.jobs, **options):
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
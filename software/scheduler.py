@@ -0,0 +1,53 @@
+import time
+
+from perf import counters
+
+# Shortest pause between bursts, so queued repaints and input get a turn
+MIN_IDLE_MS = 20
+
+# Start reading this long before the device should finish sampling
+READ_LEAD_MS = 10
+
+class LiveScheduler:
+    """Paces live-mode bursts from the measured timing of each one
+
+    A burst is requested, the event loop keeps running while the device
+    samples, and the frame is read when sampling should be done
+    (read_delay_ms). The next burst is requested after idle_ms(): as
+    soon as the host has had as much time as it spent on the last frame,
+    never less than MIN_IDLE_MS and never more than the user's maximum
+    interval. The device therefore samples nearly back to back at fast
+    rates, and slow rates no longer run into a fixed read timeout.
+    """
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.host_s = 0.0           # smoothed time spent processing a frame
+        self.cycle_start = None
+
+    def read_delay_ms(self, device):
+        """Milliseconds from requesting a burst until its frame is read"""
+        sampling, _ = device.expected_burst_time()
+        return max(0, int(sampling * 1000) - READ_LEAD_MS)
+
+    def requested(self):
+        now = time.perf_counter()
+        if self.cycle_start is not None:
+            counters.record('live_cycle', now - self.cycle_start)
+        self.cycle_start = now
+
+    def host_time(self, seconds):
+        """Record the host time spent on the last frame (read excluded)"""
+        self.host_s += self.smoothing * (seconds - self.host_s)
+
+    def idle_ms(self, max_interval_ms):
+        """Milliseconds to wait before requesting the next burst"""
+        return int(min(max_interval_ms, max(MIN_IDLE_MS, self.host_s * 1000)))
+
+    def duty_cycle(self, device):
+        """Fraction of the last cycle the device spent sampling"""
+        if device.last_burst is None or self.cycle_start is None:
+            return 0.0
+        sampling, _ = device.expected_burst_time()
+        cycle = time.perf_counter() - self.cycle_start
+        return min(1.0, sampling / cycle) if cycle > 0 else 0.0
@@ -0,0 +1,276 @@
+"""
+Local fan-out of device frames to any number of subscribers
+"""
+
+import argparse
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+
+from perf import counters
+
+# Serve frames at this address when set (LA_SERVER): a TCP port on
+# 127.0.0.1, or unix:<path> for a Unix socket
+SERVER_ADDRESS = os.environ.get('LA_SERVER')
+
+# Encoded messages waiting per subscriber; one that falls further behind
+# is disconnected (LA_SERVER_QUEUE)
+MAX_QUEUE = int(os.environ.get('LA_SERVER_QUEUE', 64))
+
+# Message: magic, kind, sample period (ns), rate (Hz), timestamp,
+# sequence, dropped chunks before it, payload length
+MESSAGE = struct.Struct('<4sBQIdqII')
+MAGIC = b'LAF1'
+INFO = 0        # payload is the device info as JSON
+CAPTURE = 1     # payload is a burst's packed samples
+CHUNK = 2       # payload is a streaming chunk's packed samples
+
+KINDS = {'capture': CAPTURE, 'chunk': CHUNK}
+
+LOOPBACK = ('127.0.0.1', 'localhost', '::1')
+
+def parse_address(address):
+    """(family, sockaddr) for "7878", "localhost:7878" or "unix:/tmp/la.sock"
+
+    Only loopback addresses are accepted; the server is for this machine.
+    """
+    address = str(address)
+    if address.startswith('unix:'):
+        return socket.AF_UNIX, address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    host = host.strip('[]') or '127.0.0.1'
+    if host not in LOOPBACK:
+        raise ValueError(f"Not a local address: {address!r}")
+    if host == '::1':
+        return socket.AF_INET6, (host, int(port))
+    return socket.AF_INET, ('127.0.0.1', int(port))
+
+def encode_frame(frame):
+    """One message for a frame or chunk dict as the device returns them"""
+    samples = np.asarray(frame['samples'], dtype=np.uint8)
+    header = MESSAGE.pack(MAGIC, KINDS[frame['type']], frame['sample_period_ns'],
+                          frame.get('sample_rate_hz', 0), frame['timestamp'],
+                          frame.get('sequence', -1), frame.get('dropped', 0), len(samples))
+    return header + samples.tobytes()
+
+def encode_info(info):
+    payload = json.dumps(info).encode()
+    return MESSAGE.pack(MAGIC, INFO, 0, 0, time.time(), -1, 0, len(payload)) + payload
+
+class _Subscriber:
+    """One connected client, fed from its own bounded queue by a thread"""
+
+    def __init__(self, sock, name, max_queue):
+        self.sock = sock
+        self.name = name
+        self.queue = queue.Queue(max_queue)
+        self.thread = threading.Thread(target=self._send, name=f'la_send_{name}', daemon=True)
+
+    def _send(self):
+        try:
+            while True:
+                data = self.queue.get()
+                if data is None:
+                    break
+                self.sock.sendall(data)
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+    def close(self):
+        # Unblocks a send in progress; the thread then closes the socket
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        try:
+            self.queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+class CaptureServer:
+    """Publishes every frame from LogicAnalyzerDevice to local subscribers
+
+    Attach it as the device's publisher. publish() encodes a frame once
+    and only queues it for each subscriber, so acquisition never waits on
+    a socket; a subscriber whose queue is full is disconnected. New
+    subscribers receive the latest device info first, then live frames.
+    """
+
+    def __init__(self, address=SERVER_ADDRESS, max_queue=MAX_QUEUE):
+        self.address = address
+        self.max_queue = max_queue
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.info = None
+        self.listener = None
+        self.thread = None
+
+    def start(self):
+        family, sockaddr = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.unlink(sockaddr)  # Left over by a previous run
+        self.listener = socket.socket(family, socket.SOCK_STREAM)
+        if family != socket.AF_UNIX:
+            self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(sockaddr)
+        self.listener.listen()
+        self.thread = threading.Thread(target=self._accept, name='la_server', daemon=True)
+        self.thread.start()
+
+    def _accept(self):
+        listener = self.listener
+        count = 0
+        while True:
+            try:
+                sock, _ = listener.accept()
+            except OSError:
+                break  # Listener closed by stop()
+            if sock.family != socket.AF_UNIX:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            count += 1
+            subscriber = _Subscriber(sock, count, self.max_queue)
+            with self.lock:
+                if self.info is not None:
+                    subscriber.queue.put_nowait(self.info)
+                self.subscribers.append(subscriber)
+                counters.gauge('server_clients', len(self.subscribers))
+            subscriber.thread.start()
+
+    def _broadcast(self, data):
+        with self.lock:
+            for subscriber in list(self.subscribers):
+                try:
+                    subscriber.queue.put_nowait(data)
+                except queue.Full:
+                    # Too slow to keep up: dropped rather than stalling capture
+                    self.subscribers.remove(subscriber)
+                    subscriber.close()
+                    counters.count('server_clients_dropped')
+            # Ones that hung up have had their sender thread exit
+            self.subscribers = [s for s in self.subscribers if s.thread.is_alive()]
+            counters.gauge('server_clients', len(self.subscribers))
+
+    def publish(self, frame):
+        """Queue a frame or chunk for every subscriber; never blocks"""
+        if not self.subscribers:
+            return
+        with counters.timed('server_publish'):
+            self._broadcast(encode_frame(frame))
+        counters.count('server_frames')
+
+    def publish_info(self, info):
+        """Send device info now and to every later subscriber"""
+        self.info = encode_info(info)
+        self._broadcast(self.info)
+
+    def stop(self):
+        if self.listener is not None:
+            # shutdown() wakes the blocked accept(); close() alone may not
+            try:
+                self.listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.listener.close()
+            self.listener = None
+        with self.lock:
+            for subscriber in self.subscribers:
+                subscriber.close()
+            self.subscribers = []
+        family, sockaddr = parse_address(self.address)
+        if family == socket.AF_UNIX and os.path.exists(sockaddr):
+            os.unlink(sockaddr)
+
+class CaptureClient:
+    """Receives a CaptureServer's frames and rebuilds Capture objects"""
+
+    def __init__(self, address=SERVER_ADDRESS, timeout=None):
+        family, sockaddr = parse_address(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(sockaddr)
+        self.file = self.sock.makefile('rb')
+        self.device_info = None
+
+    def read(self):
+        """Next frame dict (like the device's), or None once the server hung up
+
+        Info messages update device_info and are not returned.
+        """
+        while True:
+            header = self.file.read(MESSAGE.size)
+            if len(header) < MESSAGE.size:
+                return None
+            magic, kind, period_ns, rate_hz, timestamp, sequence, dropped, length = \
+                MESSAGE.unpack(header)
+            if magic != MAGIC:
+                raise ValueError("Not a capture server stream")
+            payload = self.file.read(length)
+            if len(payload) < length:
+                return None
+            if kind == INFO:
+                self.device_info = json.loads(payload)
+                continue
+            frame = {
+                'type': 'capture' if kind == CAPTURE else 'chunk',
+                'samples': np.frombuffer(payload, dtype=np.uint8),
+                'sample_period_ns': period_ns,
+                'sample_count': length,
+                'sample_rate_hz': rate_hz,
+                'timestamp': timestamp,
+            }
+            if kind == CHUNK:
+                frame['sequence'] = sequence
+                frame['dropped'] = dropped
+            return frame
+
+    def frames(self):
+        """Yield frames until the server goes away"""
+        while True:
+            frame = self.read()
+            if frame is None:
+                return
+            yield frame
+
+    def captures(self, capture=None):
+        """Yield one growing Capture after each frame, as the GUI builds it"""
+        from recording import append_frame
+
+        for frame in self.frames():
+            capture = append_frame(capture, frame)
+            yield capture
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Print the frames a running capture server publishes")
+    parser.add_argument('address', nargs='?', default=SERVER_ADDRESS,
+                        help="port or unix:<path>, see LA_SERVER")
+    parser.add_argument('--count', type=int, help="stop after this many frames")
+    args = parser.parse_args(argv)
+    if not args.address:
+        parser.error("no address given and LA_SERVER is not set")
+
+    client = CaptureClient(args.address)
+    try:
+        for n, capture in enumerate(client.captures(), 1):
+            print(f"{n}: {capture.sample_count} samples in {capture.num_segments} bursts, "
+                  f"{capture.get_sample_rate_mhz():.3f} MHz")
+            if n == args.count:
+                break
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+import argparse
+import os
+import select
+import time
+import zlib
+from collections import deque
+
+import numpy as np
+
+# Port name that connects LogicAnalyzerDevice to SimulatedSerial
+SIM_PORT = 'SIM'
+
+BUFFER_SIZE = 2048
+
+# Streaming sends each half of the circular DMA buffer as one chunk
+STREAM_HALF = BUFFER_SIZE // 2
+STREAM_MAX_RATE = 100000
+
+# Rate commands understood by the firmware
+RATE_COMMANDS = {
+    'E': (100, "100Hz"),
+    'D': (1000, "1kHz"),
+    'B': (10000, "10kHz"),
+    'A': (100000, "100kHz"),
+    '1': (1000000, "1MHz"),
+    '2': (2000000, "2MHz"),
+    '5': (5000000, "5MHz"),
+    '6': (6000000, "6MHz"),
+}
+
+# Link speeds the firmware can switch to, and how long it waits for an
+# echo at a new speed before going back to the old one
+LINK_BAUDS = (115200, 230400, 460800, 921600, 1000000, 2000000, 3000000, 4500000)
+BAUD_CONFIRM_S = 0.25
+
+# Text sent on the simulated UART line (CH0)
+UART_MESSAGE = b"Hello from LA8\r\n"
+UART_BAUD = 9600
+UART_SLOTS = 64         # character slots per message period, rest idle
+
+def generate_samples(count, rate_hz, t0):
+    """Packed samples of a slow test bus starting t0 seconds into the run
+
+    CH0: 9600 baud UART sending UART_MESSAGE, then idle
+    CH1: 100 Hz square wave
+    CH2: 1 kHz square wave
+    CH3-7: low
+    """
+    t = t0 + np.arange(count) / rate_hz
+
+    # UART: start bit, 8 data bits LSB first, stop bit; idle high
+    bit = (t * UART_BAUD).astype(np.int64)
+    slot = (bit // 10) % UART_SLOTS
+    pos = bit % 10
+    message = np.frombuffer(UART_MESSAGE, dtype=np.uint8)
+    char = message[np.minimum(slot, len(message) - 1)]
+    data_bit = (char >> np.clip(pos - 1, 0, 7)) & 1
+    uart = np.where(pos == 0, 0, np.where(pos == 9, 1, data_bit))
+    uart = np.where(slot < len(message), uart, 1)
+
+    slow = (t * 200).astype(np.int64) & 1
+    fast = (t * 2000).astype(np.int64) & 1
+    return (uart | (slow << 1) | (fast << 2)).astype(np.uint8)
+
+def encode_chunk(seq, samples, rle, crc=False):
+    """A streaming chunk frame as sent by the firmware's sendChunk()"""
+    header = seq.to_bytes(4, 'little') + len(samples).to_bytes(4, 'little')
+    pairs = encode_rle(samples) if rle else b''
+    if rle and len(pairs) < len(samples):
+        tag, body = b'CHR:', header + (len(pairs) // 2).to_bytes(4, 'little') + pairs
+    else:
+        tag, body = b'CHK:', header + samples.tobytes()
+    return tag + body + (zlib.crc32(body).to_bytes(4, 'little') if crc else b'')
+
+def encode_rle(samples):
+    """Run-length encode packed samples as the firmware does
+
+    Returns (level, run - 1) byte pairs; runs longer than 256 are split.
+    """
+    samples = np.asarray(samples, dtype=np.uint8)
+    if len(samples) == 0:
+        return b''
+    edges = np.flatnonzero(np.diff(samples)) + 1
+    starts = np.concatenate(([0], edges))
+    runs = np.diff(np.concatenate((starts, [len(samples)])))
+    # Split long runs into chunks of at most 256
+    chunks = (runs + 255) // 256
+    levels = np.repeat(samples[starts], chunks)
+    lengths = np.full(chunks.sum(), 256, dtype=np.int64)
+    lengths[np.cumsum(chunks) - 1] = runs - (chunks - 1) * 256
+    return np.column_stack((levels, lengths - 1)).astype(np.uint8).tobytes()
+
+class SimulatedSerial:
+    """In-process stand-in for the firmware behind a serial port
+
+    Implements the subset of pyserial used by LogicAnalyzerDevice and
+    answers the firmware's commands. Responses are released at the UART
+    byte rate and captures take their real sampling time, so transfer
+    timing matches hardware.
+
+    baudrate is the host's side of the link and link_baud the firmware's.
+    Bytes sent while they differ, or above link_limit (the fastest speed
+    the wiring carries cleanly), arrive as noise.
+    """
+
+    def __init__(self, baudrate=115200, timeout=2, link_limit=None):
+        self.baudrate = baudrate
+        self.link_baud = baudrate
+        self.link_limit = link_limit
+        self.previous_baud = None       # set while a switch awaits its echo
+        self.baud_switch_time = 0.0
+        self.crc = False
+        self._line_cmd = None           # K or Y while its argument arrives
+        self._line = bytearray()
+        self.timeout = timeout
+        self.is_open = True
+        self.sample_rate_hz = 100000
+        self.rle = False
+        self.started = time.perf_counter()
+        self.capture_end = 0.0
+        self.streaming = False
+        self.stream_start = 0.0
+        self.halves_sent = 0
+        self._rx = bytearray()          # bytes the host can read now
+        self._tx = deque()              # (release time, bytes) still in flight
+        self._tx_end = 0.0
+
+    @property
+    def bytes_per_second(self):
+        # 8N1: ten bits on the wire per byte
+        return self.link_baud / 10.0
+
+    def _garbled(self, baud):
+        return baud != self.baudrate or (self.link_limit is not None and baud > self.link_limit)
+
+    def _send(self, data, at=None):
+        # Each write keeps the speed it was sent at
+        start = max(time.perf_counter() if at is None else at, self._tx_end)
+        self._tx.append((start, bytes(data), self.link_baud))
+        self._tx_end = start + len(data) / self.bytes_per_second
+
+    def _println(self, text):
+        self._send(text.encode() + b'\r\n')
+
+    def _pump_stream(self, now):
+        # Like the firmware loop: whenever the UART is free and a half has
+        # filled, send the newest filled half; older unsent ones are lost
+        half_period = STREAM_HALF / self.sample_rate_hz
+        while self.streaming:
+            filled_at = self.stream_start + (self.halves_sent + 1) * half_period
+            at = max(self._tx_end, filled_at)
+            if at > now:
+                break
+            seq = max(self.halves_sent, int((at - self.stream_start) / half_period) - 1)
+            t0 = self.stream_start - self.started + seq * half_period
+            samples = generate_samples(STREAM_HALF, self.sample_rate_hz, t0)
+            self._send(encode_chunk(seq, samples, self.rle, self.crc), at=at)
+            self.halves_sent = seq + 1
+
+    def _release(self):
+        now = time.perf_counter()
+        if self.previous_baud is not None and now - self.baud_switch_time > BAUD_CONFIRM_S:
+            self.link_baud = self.previous_baud
+            self.previous_baud = None
+        self._pump_stream(now)
+        while self._tx:
+            start, data, baud = self._tx[0]
+            if now < start:
+                break
+            rate = baud / 10.0
+            n = min(len(data), int((now - start) * rate))
+            received = os.urandom(n) if self._garbled(baud) else data[:n]
+            self._rx += received
+            if n == len(data):
+                self._tx.popleft()
+            else:
+                self._tx[0] = (start + n / rate, data[n:], baud)
+                break
+
+    @property
+    def in_waiting(self):
+        self._release()
+        return len(self._rx)
+
+    def read(self, size=1):
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while self.in_waiting < size and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def readinto(self, buffer):
+        size = len(buffer)
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while self.in_waiting < size and time.perf_counter() < deadline:
+            time.sleep(0.001)
+        n = min(size, len(self._rx))
+        buffer[:n] = self._rx[:n]
+        del self._rx[:n]
+        return n
+
+    def readline(self):
+        deadline = time.perf_counter() + (self.timeout or 0)
+        while True:
+            self._release()
+            end = self._rx.find(b'\n')
+            if end >= 0 or time.perf_counter() >= deadline:
+                break
+            time.sleep(0.001)
+        size = end + 1 if end >= 0 else len(self._rx)
+        data = bytes(self._rx[:size])
+        del self._rx[:size]
+        return data
+
+    def reset_input_buffer(self):
+        self._release()
+        self._rx.clear()
+
+    def close(self):
+        self.is_open = False
+
+    def write(self, data):
+        self._release()
+        if self._garbled(self.link_baud):
+            # The firmware only sees framing errors
+            return len(data)
+        for cmd in data.decode('ascii', errors='ignore'):
+            if self._line_cmd is not None:
+                # K and Y take the rest of the line as their argument
+                if cmd == '\n':
+                    self._handle_line(self._line_cmd, self._line.decode().strip())
+                    self._line_cmd = None
+                else:
+                    self._line += cmd.encode()
+            elif cmd in 'KY':
+                self._line_cmd = cmd
+                self._line.clear()
+            elif cmd not in '\r\n' and self.previous_baud is None:
+                self._handle_command(cmd)
+        return len(data)
+
+    def _handle_line(self, cmd, arg):
+        if cmd == 'Y':
+            token, _, check = arg.partition(':')
+            if check != f"{zlib.crc32(token.encode()):08x}":
+                self._println("ERROR:ECHO")
+                return
+            self.previous_baud = None
+            self._println(f"ECHO:{arg}")
+        elif self.previous_baud is None:
+            baud = int(arg) if arg.isdigit() else 0
+            if baud not in LINK_BAUDS or self.streaming:
+                self._println("ERROR:BAUD")
+                return
+            # Acknowledged at the old speed, then the UART is reprogrammed
+            self._println(f"OK:BAUD:{baud}")
+            self.previous_baud = self.link_baud
+            self.link_baud = baud
+            self.baud_switch_time = time.perf_counter()
+
+    def _handle_command(self, cmd):
+        if cmd in 'Cc':
+            self._start_capture()
+        elif cmd in 'Ii':
+            self._send_info()
+        elif cmd == 'S':
+            self._start_stream()
+        elif cmd == 'X':
+            self._pump_stream(time.perf_counter())
+            self.streaming = False
+            self._println("OK:STOPPED")
+        elif cmd in 'Rr':
+            self.streaming = False
+            self._tx.clear()
+            self._tx_end = 0.0
+            self.capture_end = 0.0
+            self._println("OK:RESET")
+        elif cmd == 'L':
+            self.rle = True
+            self._println("OK:RLE")
+        elif cmd == 'U':
+            self.rle = False
+            self._println("OK:RAW")
+        elif cmd == 'Q':
+            self.crc = True
+            self._println("OK:CRC")
+        elif cmd == 'N':
+            self.crc = False
+            self._println("OK:NOCRC")
+        elif cmd in RATE_COMMANDS:
+            self.sample_rate_hz, name = RATE_COMMANDS[cmd]
+            self._println(f"OK:{name}")
+        else:
+            self._println("ERROR:UNKNOWN_CMD")
+
+    def _send_info(self):
+        self._println("INFO:STM32-UART-LA8")
+        self._println("VERSION:4.3-SIM")
+        self._println("CHANNELS:8")
+        self._println(f"BUFFER:{BUFFER_SIZE}")
+        self._println(f"RATE:{self.sample_rate_hz}Hz")
+        self._println("RATES:100Hz,1kHz,10kHz,100kHz,1MHz,2MHz,5MHz,6MHz")
+        self._println("ENCODINGS:RAW,RLE")
+        self._println("CHECKSUMS:CRC32")
+        self._println("BAUDS:" + ",".join(str(b) for b in LINK_BAUDS))
+        self._println(f"STREAM_LIMIT:{STREAM_MAX_RATE}")
+        busy = time.perf_counter() < self.capture_end or self.streaming
+        self._println(f"STATUS:{'BUSY' if busy else 'READY'}")
+
+    def _start_stream(self):
+        if time.perf_counter() < self.capture_end or self.streaming:
+            self._println("ERROR:BUSY")
+            return
+        if self.sample_rate_hz > STREAM_MAX_RATE:
+            self._println("ERROR:RATE_TOO_HIGH")
+            return
+        self._println(f"OK:STREAM:{self.sample_rate_hz}")
+        self.streaming = True
+        self.stream_start = time.perf_counter()
+        self.halves_sent = 0
+
+    def _start_capture(self):
+        now = time.perf_counter()
+        if now < self.capture_end or self.streaming:
+            self._println("ERROR:BUSY")
+            return
+        duration = BUFFER_SIZE / self.sample_rate_hz
+        self.capture_end = now + duration
+        samples = generate_samples(BUFFER_SIZE, self.sample_rate_hz, now - self.started)
+
+        count = BUFFER_SIZE.to_bytes(4, 'little')
+        rate = self.sample_rate_hz.to_bytes(4, 'little')
+        pairs = encode_rle(samples) if self.rle else b''
+        # Like the firmware, fall back to raw when runs do not pay off
+        if self.rle and len(pairs) < BUFFER_SIZE:
+            tag, header, payload = b'RLE:', count + rate + (len(pairs) // 2).to_bytes(4, 'little'), pairs
+        else:
+            tag, header, payload = b'DATA:', count + rate, samples.tobytes()
+        trailer = zlib.crc32(payload, zlib.crc32(header)).to_bytes(4, 'little') if self.crc else b''
+        frame = tag + header + b'\n' + payload + trailer
+        self._send(frame + b'\nEND\r\n', at=self.capture_end)
+
+def _termios_bauds():
+    import termios
+    return {getattr(termios, f'B{b}'): b for b in LINK_BAUDS if hasattr(termios, f'B{b}')}
+
+def main(argv=None):
+    """Serve the simulated firmware on a pseudo-terminal
+
+    The printed device path can be opened like the real board, so the
+    GUI and pyserial code paths run unchanged. The host's baud rate is
+    taken from the terminal settings, so speed negotiation (and its
+    fallback, with --link-limit) behaves as on a real UART.
+    """
+    import pty
+    import termios
+    import tty
+
+    parser = argparse.ArgumentParser(description="Simulated LA8 firmware on a pseudo-terminal")
+    parser.add_argument('--link-limit', type=int,
+                        help="fastest baud rate that transfers cleanly")
+    args = parser.parse_args(argv)
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    speeds = _termios_bauds()
+    sim = SimulatedSerial(timeout=0, link_limit=args.link_limit)
+    print(os.ttyname(slave), flush=True)
+
+    try:
+        while True:
+            ready, _, _ = select.select([master], [], [], 0.001)
+            # Speeds without a termios constant read back as unknown: noise
+            sim.baudrate = speeds.get(termios.tcgetattr(slave)[4], 0)
+            if ready:
+                sim.write(os.read(master, 4096))
+            if sim.in_waiting:
+                os.write(master, sim.read(sim.in_waiting))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(master)
+        os.close(slave)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,378 @@
+import bisect
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from perf import counters
+
+# Samples per storage block. Blocks are the unit of compression and spilling.
+BLOCK_SAMPLES = 1 << 16
+
+DEFAULT_RAM_BUDGET = 64 * 1024 * 1024
+DEFAULT_DISK_BUDGET = 4 * 1024 * 1024 * 1024
+
+# Newest full blocks kept uncompressed for fast access
+HOT_BLOCKS = 8
+
+# zlib level for older blocks; level 1 already collapses the long runs of
+# identical bytes typical of bus traffic, at a fraction of the CPU cost
+COMPRESS_LEVEL = 1
+
+# Spilled blocks are appended to temporary files of this size; a file is
+# deleted once no block in it is held by the store or a snapshot
+SPILL_FILE_BYTES = 64 * 1024 * 1024
+
+# Compressed blocks kept decompressed after a read
+PAGE_CACHE_BLOCKS = 32
+
+class Block:
+    """A run of packed samples starting at absolute sample index `start`
+
+    A block is hot (data), compressed in RAM (zdata) or spilled to disk
+    (spill, offset), holding zlib-compressed bytes in the last two cases.
+    """
+    __slots__ = ('start', 'length', 'data', 'zdata', 'stored', 'spill', 'offset', 'future')
+
+    def __init__(self, start):
+        self.start = start
+        self.length = 0
+        self.data = np.empty(BLOCK_SAMPLES, dtype=np.uint8)
+        self.zdata = None
+        self.stored = 0             # compressed size once compressed
+        self.spill = None
+        self.offset = 0
+        self.future = None          # pending background compression
+
+    def ram_cost(self):
+        if self.data is not None:
+            return BLOCK_SAMPLES
+        if self.zdata is not None:
+            return self.stored
+        return 0
+
+def _compress(data):
+    return zlib.compress(data.tobytes(), COMPRESS_LEVEL)
+
+class SpillFile:
+    """Append-only temporary file holding spilled blocks"""
+
+    def __init__(self, directory=None):
+        self.file = tempfile.TemporaryFile(prefix='la_spill_', dir=directory)
+        self.size = 0
+        self.blocks = 0
+        # Seek and read/write go together; snapshot readers use other threads
+        self.lock = threading.Lock()
+
+    def write(self, data):
+        offset = self.size
+        with self.lock:
+            self.file.seek(offset)
+            self.file.write(data)
+        self.size += len(data)
+        self.blocks += 1
+        return offset
+
+    def read(self, offset, length):
+        with self.lock:
+            self.file.seek(offset)
+            return self.file.read(length)
+
+    def release(self):
+        """Forget one block; returns True once the store holds none of them"""
+        self.blocks -= 1
+        return self.blocks == 0
+
+    def close(self):
+        self.file.close()
+
+class SampleStore:
+    """Tiered packed sample storage with a RAM budget
+
+    Samples (one uint8 per sample, bit n = channel n) are addressed by
+    absolute index and kept in fixed-size blocks. The newest HOT_BLOCKS
+    stay uncompressed; older full blocks are zlib-compressed on a
+    background thread. When RAM use still exceeds ram_budget, the oldest
+    compressed blocks are written to temporary files. Reads decompress
+    (and page in) transparently through a small LRU cache. RAM the owner
+    holds for the same samples (index_bytes, their edge index) counts
+    against the budget too, so it makes more samples spill.
+
+    Only the owner appends, drops and calls read(); other threads read
+    through snapshot(). Block lists are replaced rather than edited and a
+    block's tiers are swapped so a reader always finds one of them, which
+    keeps snapshots valid without locking the writer out.
+    """
+
+    def __init__(self, ram_budget=DEFAULT_RAM_BUDGET, disk_budget=DEFAULT_DISK_BUDGET,
+                 spill_dir=None):
+        self.ram_budget = ram_budget
+        self.disk_budget = disk_budget
+        self.spill_dir = spill_dir
+        self.blocks = []
+        self.block_starts = []
+        self.first_resident = 0     # index of the oldest block still in RAM
+        self.next_compress = 0      # index of the oldest block not yet queued
+        self.end = 0                # absolute index after the last sample
+        self.ram_bytes = 0
+        self.index_bytes = 0        # owner's RAM for these samples, see above
+        self.disk_bytes = 0
+        self.raw_bytes = 0          # uncompressed size of compressed blocks
+        self.stored_bytes = 0       # their compressed size
+        self.spill_file = None
+        self.page_cache = OrderedDict()
+        self.cache_lock = threading.Lock()
+        self.compressing = deque()
+        self.executor = None
+
+    @property
+    def start(self):
+        return self.block_starts[0] if self.blocks else self.end
+
+    def append(self, samples, mask=0xFF):
+        """Append packed samples (uint8 array or bytes-like)
+
+        Samples are copied straight into the tail block, AND-ed with mask
+        on the way when it clears any channel.
+        """
+        samples = np.frombuffer(samples, dtype=np.uint8)
+        pos = 0
+        while pos < len(samples):
+            tail = self.blocks[-1] if self.blocks else None
+            if tail is None or tail.length == BLOCK_SAMPLES:
+                tail = Block(self.end)
+                self.blocks.append(tail)
+                self.block_starts.append(self.end)
+                self.ram_bytes += BLOCK_SAMPLES
+            count = min(len(samples) - pos, BLOCK_SAMPLES - tail.length)
+            if mask == 0xFF:
+                tail.data[tail.length:tail.length + count] = samples[pos:pos + count]
+            else:
+                np.bitwise_and(samples[pos:pos + count], mask,
+                               out=tail.data[tail.length:tail.length + count])
+            tail.length += count
+            self.end += count
+            pos += count
+        self._rebalance()
+
+    def set_ram_budget(self, ram_budget):
+        self.ram_budget = ram_budget
+        self._rebalance()
+
+    def _rebalance(self):
+        self._collect_compressed()
+        self._queue_compression()
+        self._spill_over_budget()
+
+    def _queue_compression(self):
+        # Full blocks that fell out of the hot window compress in the background
+        while self.next_compress < len(self.blocks) - HOT_BLOCKS:
+            block = self.blocks[self.next_compress]
+            self.next_compress += 1
+            if block.data is None or block.future is not None:
+                continue
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='la_compress')
+            block.future = self.executor.submit(_compress, block.data[:block.length])
+            self.compressing.append(block)
+
+    def _collect_compressed(self):
+        # Swap finished blocks to their compressed form, oldest first
+        while self.compressing and self.compressing[0].future.done():
+            self._finish_compression(self.compressing.popleft())
+
+    def _finish_compression(self, block):
+        future, block.future = block.future, None
+        if future.cancelled() or block.data is None:
+            return
+        self._set_compressed(block, future.result())
+
+    def _set_compressed(self, block, zdata):
+        self.ram_bytes -= block.ram_cost()
+        block.zdata = zdata
+        block.stored = len(zdata)
+        block.data = None
+        self.ram_bytes += block.ram_cost()
+        self.raw_bytes += block.length
+        self.stored_bytes += block.stored
+        counters.count('blocks_compressed')
+
+    def _spill_over_budget(self):
+        # The open tail block always stays in RAM
+        while (self.ram_bytes + self.index_bytes > self.ram_budget and
+               self.first_resident < len(self.blocks) - 1):
+            block = self.blocks[self.first_resident]
+            if block.future is not None:
+                # Wait for it rather than compressing twice
+                self.compressing.remove(block)
+                self._finish_compression(block)
+            if block.zdata is None:
+                self._set_compressed(block, _compress(block.data[:block.length]))
+            if self.spill_file is None or self.spill_file.size >= SPILL_FILE_BYTES:
+                self.spill_file = SpillFile(self.spill_dir)
+            self.ram_bytes -= block.ram_cost()
+            block.offset = self.spill_file.write(block.zdata)
+            block.spill = self.spill_file
+            block.zdata = None
+            self.first_resident += 1
+            self.disk_bytes += block.stored
+            counters.count('blocks_spilled')
+
+    def resident_start(self):
+        """Absolute index of the oldest sample held in RAM"""
+        if self.first_resident >= len(self.blocks):
+            return self.end
+        return self.block_starts[self.first_resident]
+
+    def hot_start(self):
+        """Absolute index of the oldest sample in the uncompressed window"""
+        index = max(self.first_resident, len(self.blocks) - HOT_BLOCKS)
+        if index >= len(self.blocks):
+            return self.end
+        return self.block_starts[index]
+
+    def compression_ratio(self):
+        """Raw over compressed size of the compressed blocks"""
+        return self.raw_bytes / self.stored_bytes if self.stored_bytes else 1.0
+
+    def disk_excess_start(self):
+        """Absolute index to trim to so spilled data fits the disk budget"""
+        excess = self.disk_bytes - self.disk_budget
+        index = 0
+        while excess > 0 and index < self.first_resident:
+            excess -= self.blocks[index].stored
+            index += 1
+        return self.block_starts[index] if index < len(self.blocks) else self.end
+
+    def _block_data(self, block):
+        # Each tier is read once: the owner may swap it out meanwhile, but
+        # sets the next one before clearing the last
+        data = block.data
+        if data is not None:
+            return data
+        with self.cache_lock:
+            data = self.page_cache.get(block)
+            if data is not None:
+                self.page_cache.move_to_end(block)
+                return data
+        zdata = block.zdata
+        if zdata is None:
+            with counters.timed('page_in'):
+                zdata = block.spill.read(block.offset, block.stored)
+        with counters.timed('decompress'):
+            data = np.frombuffer(zlib.decompress(zdata), dtype=np.uint8)
+        with self.cache_lock:
+            self.page_cache[block] = data
+            if len(self.page_cache) > PAGE_CACHE_BLOCKS:
+                self.page_cache.popitem(last=False)
+        return data
+
+    def read(self, start, stop, step=1):
+        """Return samples [start:stop:step] by absolute index
+
+        A range inside one hot or cached block is returned as a view.
+        """
+        self._collect_compressed()
+        return self._read(self.blocks, self.block_starts, max(start, self.start),
+                          min(stop, self.end), step)
+
+    def _read(self, blocks, block_starts, start, stop, step):
+        if start >= stop:
+            return np.empty(0, dtype=np.uint8)
+        index = bisect.bisect_right(block_starts, start) - 1
+        parts = []
+        pos = start
+        while pos < stop:
+            block = blocks[index]
+            block_stop = min(stop, block.start + block.length)
+            data = self._block_data(block)
+            parts.append(data[pos - block.start:block_stop - block.start:step])
+            # The next selected sample may skip whole blocks
+            pos += -(-(block_stop - pos) // step) * step
+            # block_starts grows after blocks, so it bounds the lookahead
+            while index < len(block_starts) - 1 and pos >= block_starts[index + 1]:
+                index += 1
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def snapshot(self):
+        """StoreSnapshot of the samples held now, in O(1)"""
+        return StoreSnapshot(self, self.blocks, self.block_starts, self.start, self.end)
+
+    def drop_before(self, index):
+        """Release whole blocks that end at or before absolute index"""
+        drop = 0
+        while drop < len(self.blocks) - 1 and self.block_starts[drop + 1] <= index:
+            block = self.blocks[drop]
+            if block.future is not None:
+                block.future.cancel()
+                self.compressing.remove(block)
+                block.future = None
+            if block.zdata is not None or block.spill is not None:
+                self.raw_bytes -= block.length
+                self.stored_bytes -= block.stored
+            self.ram_bytes -= block.ram_cost()
+            with self.cache_lock:
+                self.page_cache.pop(block, None)
+            if block.spill is not None:
+                self.disk_bytes -= block.stored
+                # Deleted when the last snapshot holding its blocks goes
+                if block.spill.release() and block.spill is self.spill_file:
+                    self.spill_file = None
+            drop += 1
+        if drop:
+            # New lists, so snapshots keep the blocks they were taken with
+            self.blocks = self.blocks[drop:]
+            self.block_starts = self.block_starts[drop:]
+            self.first_resident = max(0, self.first_resident - drop)
+            self.next_compress = max(0, self.next_compress - drop)
+
+    def close(self):
+        """Stop background compression and let go of the spill files
+
+        A spill file is deleted once no block refers to it any more, so
+        snapshots other threads still hold keep reading theirs.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.blocks = []
+        self.block_starts = []
+        self.first_resident = 0
+        self.next_compress = 0
+        self.ram_bytes = 0
+        self.disk_bytes = 0
+        self.raw_bytes = 0
+        self.stored_bytes = 0
+        self.spill_file = None
+        self.page_cache.clear()
+        self.compressing.clear()
+
+class StoreSnapshot:
+    """Samples [start, end) of a SampleStore as they were at one moment
+
+    Holds the store's block lists of that moment, so samples the owner
+    drops later stay readable; appends beyond end are never seen. Safe to
+    read from another thread while the owner keeps appending.
+    """
+
+    def __init__(self, store, blocks, block_starts, start, end):
+        self.store = store
+        self.blocks = blocks
+        self.block_starts = block_starts
+        self.start = start
+        self.end = end
+
+    @property
+    def ram_bytes(self):
+        return self.store.ram_bytes
+
+    def hot_start(self):
+        return min(max(self.store.hot_start(), self.start), self.end)
+
+    def read(self, start, stop, step=1):
+        """Return samples [start:stop:step] by absolute index"""
+        return self.store._read(self.blocks, self.block_starts, max(start, self.start),
+                                min(stop, self.end), step)
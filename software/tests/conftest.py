@@ -0,0 +1,8 @@
+"""
+Shared test setup: the host modules import each other by plain name
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
@@ -0,0 +1,82 @@
+"""
+Device access through the acquisition worker process and its shared ring
+"""
+
+import time
+
+import numpy as np
+
+from acquisition import RemoteDevice, SharedRing
+from edges import frame_edges
+from perf import counters
+from simulator import SIM_PORT
+
+
+def test_shared_ring_refuses_unreleased_space():
+    ring = SharedRing(100)
+    try:
+        first = ring.write(np.arange(60, dtype=np.uint8), 0)
+        assert first == 0
+        # Would overwrite bytes the reader still holds
+        assert ring.write(np.arange(60, dtype=np.uint8), 0) is None
+        # Once they are released the record wraps to the start
+        second = ring.write(np.arange(50, dtype=np.uint8), 60)
+        assert second == 100
+        assert ring.view(second, 50).tolist() == list(range(50))
+    finally:
+        ring.close()
+        ring.unlink()
+
+
+def test_frames_and_edges_through_the_ring():
+    device = RemoteDevice(SIM_PORT, ring_bytes=1 << 20)
+    assert device.connect()
+    try:
+        for _ in range(3):
+            frame = device.capture()
+            assert frame['sample_count'] == len(frame['samples']) > 0
+            local = frame_edges(bytes(frame['samples']))
+            assert all(np.array_equal(a, b) for a, b in zip(frame['edges'], local))
+    finally:
+        device.disconnect()
+    assert device.process is None
+
+
+def test_frame_of_an_earlier_request_is_dropped():
+    device = RemoteDevice(SIM_PORT, ring_bytes=1 << 20)
+    assert device.connect()
+    try:
+        assert device.request_capture()
+        # Wait until the worker has read the first burst on its own
+        deadline = time.time() + 10
+        while not device.conn.poll(0.01):
+            assert time.time() < deadline
+        requested = time.time()
+        assert device.request_capture()
+        frame = device.read_capture()
+        # The burst of the second request, not the unread first one
+        duration = frame['sample_count'] * frame['sample_period_ns'] / 1e9
+        assert frame['timestamp'] + duration >= requested
+        assert [kind for kind, _ in device.inbox if kind == 'frame'] == []
+        # No request left to read
+        assert device.read_capture() is None
+    finally:
+        device.disconnect()
+
+
+def test_ring_overrun_drops_the_frame_only():
+    counters.reset()
+    # Too small for one burst's samples and edges
+    device = RemoteDevice(SIM_PORT, ring_bytes=1024)
+    assert device.connect()
+    try:
+        for _ in range(2):
+            assert device.capture() is None
+            assert device.last_error == 'overrun'
+        # The worker's counts are merged here
+        assert counters.counters['ring_overruns'] == 2
+        # The worker still serves calls
+        assert device.set_sample_rate('B')
+        assert device.sample_rate_hz == 10000
+    finally:
+        device.disconnect()
@@ -0,0 +1,118 @@
+"""
+Anomaly detector: glitches and stuck channels, burst by burst
+"""
+
+import os
+
+import numpy as np
+from PyQt5.QtCore import Qt
+
+from anomaly import AnomalyDetector
+from capture import Capture
+
+PERIOD_NS = 1000
+
+
+def square(length, period=100):
+    """Channel 0 toggles every period samples, the others stay low"""
+    return ((np.arange(length) // period) & 1).astype(np.uint8)
+
+
+def test_short_pulse_is_a_glitch():
+    samples = square(1000)
+    samples[450] |= 0b100          # one sample pulse on CH2
+    samples[600:602] |= 0b1000     # two sample pulse on CH3
+    samples[700:710] |= 0b10000    # long enough on CH4
+    capture = Capture(samples.tobytes(), PERIOD_NS, timestamp=0.0)
+    detector = AnomalyDetector(glitch_samples=3)
+    found = detector.process(capture)
+
+    glitches = [(e['channel'], e['index']) for e in found if e['kind'] == 'glitch']
+    assert sorted(glitches) == [(2, 450), (3, 600)]
+    assert detector.total == len(found)
+    # Nothing new to scan
+    assert detector.process(capture) == []
+
+
+def test_pulse_split_by_a_gap_is_not_a_glitch():
+    first = square(1000)
+    first[-1] |= 0b100
+    capture = Capture(first.tobytes(), PERIOD_NS, timestamp=0.0)
+    detector = AnomalyDetector(glitch_samples=3)
+    detector.process(capture)
+
+    # CH2 falls one sample into the next burst, but a gap lies between
+    second = square(1000)
+    second[0] |= 0b100
+    capture.append_samples(second.tobytes(), PERIOD_NS, timestamp=1.0)
+    found = detector.process(capture)
+    assert [e for e in found if e['kind'] == 'glitch'] == []
+
+
+def test_glitch_spanning_two_continuous_bursts():
+    first = square(1000)
+    first[-1] |= 0b100
+    capture = Capture(first.tobytes(), PERIOD_NS, timestamp=0.0)
+    detector = AnomalyDetector(glitch_samples=3)
+    detector.process(capture)
+
+    # No timestamp: the burst continues the previous one sample for sample
+    second = square(1000)
+    second[0] |= 0b100
+    capture.append_samples(second.tobytes(), PERIOD_NS)
+    found = detector.process(capture)
+    assert [(e['kind'], e['channel'], e['index']) for e in found] == [('glitch', 2, 999)]
+
+
+def test_stuck_channel_reported_once_and_rearmed():
+    capture = Capture(square(1000).tobytes(), PERIOD_NS, timestamp=0.0)
+    detector = AnomalyDetector(stuck_s=0.5)
+    assert detector.process(capture) == []
+
+    # CH0 holds its level through bursts a second apart
+    level = np.full(1000, capture.get_samples(999, 1000)[0], dtype=np.uint8)
+    capture.append_samples(level.tobytes(), PERIOD_NS, timestamp=1.0)
+    stuck = [e for e in detector.process(capture) if e['kind'] == 'stuck']
+    assert [(e['channel'], e['index']) for e in stuck] == [(0, 1999)]
+    assert 'stuck high' in stuck[0]['detail']
+
+    capture.append_samples(level.tobytes(), PERIOD_NS, timestamp=2.0)
+    assert [e for e in detector.process(capture) if e['kind'] == 'stuck'] == []
+
+    # Toggling again re-arms the channel
+    capture.append_samples(square(1000).tobytes(), PERIOD_NS, timestamp=3.0)
+    detector.process(capture)
+    capture.append_samples(level.tobytes(), PERIOD_NS, timestamp=4.0)
+    stuck = [e for e in detector.process(capture) if e['kind'] == 'stuck']
+    assert [e['channel'] for e in stuck] == [0]
+    # Channels that never toggled are never stuck
+    assert detector.total == 2
+
+
+def test_events_panel_clear_and_large_indices():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    from gui.events_panel import EventsPanel
+    app = QApplication.instance() or QApplication([])
+
+    samples = square(1000)
+    samples[450] |= 0b100
+    capture = Capture(samples.tobytes(), PERIOD_NS, timestamp=0.0)
+    detector = AnomalyDetector()
+    detector.process(capture)
+    panel = EventsPanel(detector)
+    panel.refresh()
+    assert panel.table.rowCount() == 1
+
+    # Sample indices of a long capture do not fit a C int
+    picked = []
+    panel.jump_requested.connect(picked.append)
+    panel.table.item(0, 0).setData(Qt.UserRole, 2 ** 40)
+    panel.on_double_click(0, 0)
+    assert picked == [2 ** 40]
+
+    panel.clear()
+    assert detector.total == 0
+    assert panel.table.rowCount() == 0
+    assert panel.summary.text() == "0 listed, 0 found"
+    app.processEvents()
@@ -0,0 +1,69 @@
+"""
+Bus values and segments from packed samples and from the edge index
+"""
+
+import numpy as np
+
+from capture import Capture
+from gui.bus_item import bus_changes, bus_columns, group_values, parse_bus
+
+
+def test_group_values_bit_order():
+    levels = np.array([0b0000, 0b1000, 0b0010, 0b1010, 0b0101], dtype=np.uint8)
+    # channels[0] is the least significant bit
+    assert group_values(levels, [3, 1]).tolist() == [0, 1, 2, 3, 0]
+    assert group_values(levels, [0, 2]).tolist() == [0, 0, 0, 0, 3]
+    assert group_values(levels, []).tolist() == [0] * 5
+
+
+def test_parse_bus():
+    assert parse_bus("data:0-3", "BUS0") == ("data", [0, 1, 2, 3])
+    assert parse_bus("3-1", "BUS0") == ("BUS0", [3, 2, 1])
+    assert parse_bus("7,5", "BUS1") == ("BUS1", [7, 5])
+
+
+def two_bursts():
+    """Bus on CH1/CH2: 1 then 3 in the first burst, 3 then 2 after a gap"""
+    first = np.array([0b010] * 50 + [0b110] * 50, dtype=np.uint8)
+    second = np.array([0b110] * 30 + [0b100] * 70, dtype=np.uint8)
+    capture = Capture(first.tobytes(), 1000, timestamp=0.0)
+    capture.append_samples(second.tobytes(), 1000, timestamp=1.0)
+    return capture
+
+
+def test_bus_changes_split_at_bursts():
+    capture = two_bursts()
+    starts, ends, values = bus_changes(capture, [1, 2], 0, capture.sample_count)
+    # The second burst opens a segment even though the value carries over
+    assert values.tolist() == [1, 3, 3, 2]
+    assert np.all(ends > starts)
+    assert np.all(starts[1:] >= ends[:-1])
+    # The gap between the bursts stays empty
+    assert starts[2] > ends[1]
+    assert np.allclose(starts[[0, 1, 3]], capture.compact_x([0, 50, 130]))
+
+
+def test_bus_columns_match_samples_across_bursts():
+    rng = np.random.default_rng(3)
+    capture = Capture(np.repeat(rng.integers(0, 8, 40, dtype=np.uint8), 25).tobytes(),
+                      1000, timestamp=0.0)
+    for i in range(1, 6):
+        capture.append_samples(np.repeat(rng.integers(0, 8, 40, dtype=np.uint8), 25).tobytes(),
+                               1000, timestamp=float(i))
+    channels = [0, 2]
+    width = 300
+    x_min, x_max = capture.compact_range()
+    starts, ends, values = bus_columns(capture, channels, x_min, x_max, width)
+
+    # Value per column from the samples: one value, or -1 if it changes
+    samples = capture.get_samples()
+    bounds = capture.compact_indices(np.linspace(x_min, x_max, width + 1))
+    xs = np.linspace(x_min, x_max, width + 1)
+    for start, end, value in zip(starts, ends, values):
+        for k in np.flatnonzero((xs[:-1] >= start) & (xs[:-1] < end)):
+            if bounds[k + 1] == bounds[k]:
+                continue
+            column = group_values(samples[bounds[k]:bounds[k + 1]], channels)
+            expected = column[0] if np.all(column == column[0]) else -1
+            assert value == expected, k
+    assert len(set(values.tolist()) - {-1}) > 1
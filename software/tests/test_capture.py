@@ -0,0 +1,169 @@
+"""
+Capture storage and reads: channel mask, segments, retention
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from capture import COMPACT_GAP, Capture
+import storage
+from storage import BLOCK_SAMPLES, HOT_BLOCKS
+
+
+def test_disabled_channels_are_not_unpacked():
+    rng = np.random.default_rng(0)
+    samples = rng.integers(0, 256, 5000, dtype=np.uint8)
+    capture = Capture(samples.tobytes(), 1000, channel_mask=0b101)
+    channels = capture.get_channels()
+    assert [ch is None for ch in channels] == [False, True, False] + [True] * 5
+    assert np.array_equal(channels[0], samples & 1)
+    assert np.array_equal(channels[2], (samples >> 2) & 1)
+    # Disabled channels are stored as 0
+    assert not (capture.get_samples() & ~np.uint8(0b101)).any()
+
+
+def gapped_capture():
+    """1 us burst at t=0, a 2 us burst at t=1 s continued once, then a
+    forced segment straight after it"""
+    first = np.zeros(1000, dtype=np.uint8)
+    second = np.ones(500, dtype=np.uint8)
+    capture = Capture(first.tobytes(), 1000, timestamp=100.0)
+    capture.append_samples(second.tobytes(), 2000, timestamp=101.0)
+    capture.append_samples(np.zeros(200, dtype=np.uint8).tobytes(), 2000)
+    capture.start_new_segment()
+    capture.append_samples(np.ones(100, dtype=np.uint8).tobytes(), 2000)
+    return capture
+
+
+def test_segments_keep_real_gaps():
+    capture = gapped_capture()
+    assert capture.num_segments == 3
+    assert list(capture.iter_segments()) == [
+        (0, 1000, 0.0, pytest.approx(1e-6)),
+        (1000, 1700, 1.0, pytest.approx(2e-6)),
+        (1700, 1800, pytest.approx(1.0 + 700 * 2e-6), pytest.approx(2e-6)),
+    ]
+    assert capture.time_at(999) == pytest.approx(999e-6)
+    assert capture.time_at(1000) == pytest.approx(1.0)
+    assert capture.time_at(1600) == pytest.approx(1.0 + 600 * 2e-6)
+    assert capture.end_time() == pytest.approx(1.0 + 800 * 2e-6)
+    # Inside the gap: the last sample before it
+    assert capture.index_at(0.5) == 999
+    assert capture.index_at(1.0 + 601.5 * 2e-6) == 1601
+    # No edge across the gap, one where the continued burst changes level
+    # and none at the forced segment start
+    assert capture.edges.between(0, 0, 1800).tolist() == [1500]
+
+
+def test_compact_timeline_shrinks_gaps():
+    capture = gapped_capture()
+    # The 1 s gap is shrunk to COMPACT_GAP of the 500 sample burst after it
+    gap = COMPACT_GAP * 500 * 2e-6
+    assert capture.compact_x(1000) == pytest.approx(1000e-6 + gap)
+    assert capture.compact_range() == pytest.approx((0.0, 1000e-6 + gap + 800 * 2e-6))
+    # Only the real gap is marked; the forced segment follows without one
+    assert capture.gap_positions() == pytest.approx([1000e-6 + gap])
+    assert capture.compact_to_time(capture.compact_x(1234)) == pytest.approx(capture.time_at(1234))
+    # A position inside the shrunk gap maps to the end of the burst before
+    assert capture.compact_index(1000e-6 + gap / 2) == 1000
+    assert capture.compact_indices([0.0, 1000e-6 + gap]).tolist() == [0, 1000]
+
+
+def test_trim_keeps_times_and_positions():
+    capture = gapped_capture()
+    before = (capture.time_at(1300), float(capture.compact_x(1300)))
+    capture.trim_start(1200)
+    assert capture.sample_offset == 1200
+    assert capture.num_segments == 2
+    # The partly trimmed burst starts at its first retained sample
+    assert capture.segment_arrays()[0].tolist() == [0, 500]
+    assert capture.seg_time[0] == pytest.approx(1.0 + 200 * 2e-6)
+    assert (capture.time_at(100), float(capture.compact_x(100))) == pytest.approx(before)
+    assert capture.edges.between(0, 0, 2 ** 40).tolist() == [1500]
+
+
+def run_bursts(rng, count, length=1 << 16):
+    """Bursts of slowly changing levels: few edges, some compression"""
+    return [np.repeat(rng.integers(0, 256, length // 1024, dtype=np.uint8), 1024)
+            for _ in range(count)]
+
+
+def test_ram_budget_spills_older_samples():
+    rng = np.random.default_rng(11)
+    bursts = run_bursts(rng, 24)
+    budget = 4 * BLOCK_SAMPLES
+    capture = Capture(bursts[0].tobytes(), 1000, timestamp=0.0, ram_budget=budget)
+    for i, burst in enumerate(bursts[1:], 1):
+        capture.append_samples(burst.tobytes(), 1000, timestamp=float(i))
+    try:
+        store = capture.store
+        assert store.disk_bytes > 0
+        assert store.ram_bytes + store.index_bytes <= budget
+        assert capture.sample_offset == 0
+        # Spilled samples read back as written, across blocks and with a step
+        written = np.concatenate(bursts)
+        assert np.array_equal(capture.get_samples(), written)
+        assert np.array_equal(capture.get_samples(1000, 300000, 7), written[1000:300000:7])
+
+        # A lower budget spills more right away
+        spilled = store.disk_bytes
+        capture.set_ram_budget(2 * BLOCK_SAMPLES)
+        assert store.disk_bytes > spilled
+        assert store.ram_bytes + store.index_bytes <= 2 * BLOCK_SAMPLES
+        assert np.array_equal(capture.get_samples(), written)
+    finally:
+        capture.close()
+
+
+def test_disk_budget_trims_oldest_history():
+    rng = np.random.default_rng(12)
+    bursts = run_bursts(rng, 24)
+    capture = Capture(bursts[0].tobytes(), 1000, timestamp=0.0, ram_budget=2 * BLOCK_SAMPLES)
+    capture.store.disk_budget = 8 * 1024
+    for i, burst in enumerate(bursts[1:], 1):
+        capture.append_samples(burst.tobytes(), 1000, timestamp=float(i))
+    try:
+        assert capture.sample_offset > 0
+        assert capture.store.disk_bytes <= capture.store.disk_budget
+        written = np.concatenate(bursts)[capture.sample_offset:]
+        assert np.array_equal(capture.get_samples(), written)
+        # Whole blocks went, and times still follow their bursts
+        assert capture.sample_offset % BLOCK_SAMPLES == 0
+        assert capture.time_at(0) == pytest.approx(capture.sample_offset // BLOCK_SAMPLES)
+    finally:
+        capture.close()
+
+
+def test_older_blocks_compress_and_read_back(monkeypatch):
+    monkeypatch.setattr(storage, 'PAGE_CACHE_BLOCKS', 4)
+    rng = np.random.default_rng(13)
+    bursts = run_bursts(rng, 20)
+    capture = Capture(bursts[0].tobytes(), 1000, timestamp=0.0)
+    for i, burst in enumerate(bursts[1:], 1):
+        capture.append_samples(burst.tobytes(), 1000, timestamp=float(i))
+    try:
+        store = capture.store
+        # Compression runs in the background; rebalancing collects it
+        deadline = time.time() + 10
+        while store.compressing:
+            assert time.time() < deadline
+            time.sleep(0.01)
+            capture.set_ram_budget(store.ram_budget)
+        compressed = len(bursts) - HOT_BLOCKS
+        assert store.raw_bytes == compressed * BLOCK_SAMPLES
+        assert store.compression_ratio() > 10
+        assert store.ram_bytes < (HOT_BLOCKS + 1) * BLOCK_SAMPLES
+        assert store.disk_bytes == 0
+        # The newest blocks stay uncompressed
+        assert capture.resident_start() == compressed * BLOCK_SAMPLES
+
+        written = np.concatenate(bursts)
+        assert np.array_equal(capture.get_samples(), written)
+        assert np.array_equal(capture.get_samples(5, len(written), 1001), written[5::1001])
+        # Decompressed blocks are cached, at most PAGE_CACHE_BLOCKS of them
+        assert len(store.page_cache) == 4
+        assert np.array_equal(capture.snapshot().get_samples(0, 70000), written[:70000])
+    finally:
+        capture.close()
@@ -0,0 +1,57 @@
+"""
+Zoomed-out column levels from the edge index, across bursts
+"""
+
+import numpy as np
+
+from capture import Capture
+from gui.density_item import density_columns, minmax_columns
+
+
+def multi_burst_capture(seed=1):
+    rng = np.random.default_rng(seed)
+    capture = Capture(np.repeat(rng.integers(0, 4, 30, dtype=np.uint8), 37).tobytes(),
+                      1000, timestamp=0.0)
+    for i in range(1, 40):
+        runs = rng.integers(0, 4, rng.integers(1, 30), dtype=np.uint8)
+        timestamp = i * 0.01 if i % 3 else None
+        capture.append_samples(np.repeat(runs, rng.integers(1, 60)).tobytes(), 1000,
+                               timestamp=timestamp)
+        if i % 5 == 0:
+            capture.start_new_segment()
+    capture.trim_start(123)
+    return capture
+
+
+def test_level_change_between_bursts():
+    capture = Capture(bytes(1000), 1000, timestamp=0.0)
+    capture.start_new_segment()
+    capture.append_samples(b'\x01' * 1000)
+    low, high, valid = minmax_columns(capture, [0], *capture.compact_range(), 20)
+    assert valid.all()
+    assert list(high[0]) == [0] * 10 + [1] * 10
+    assert list(low[0]) == [0] * 10 + [1] * 10
+
+
+def test_columns_match_samples():
+    capture = multi_burst_capture()
+    start, end = capture.compact_range()
+    for width in (7, 50, 333, 5000):
+        for x_min, x_max in ((start, end), (0.7 * start + 0.3 * end, 0.9 * end)):
+            low, high, valid = minmax_columns(capture, [0, 1], x_min, x_max, width)
+            bounds = capture.compact_indices(np.linspace(x_min, x_max, width + 1))
+            for row, ch in enumerate([0, 1]):
+                bits = capture.get_channel(ch)
+                for col in np.flatnonzero(valid):
+                    column = bits[bounds[col]:bounds[col + 1]]
+                    assert low[row, col] == column.min()
+                    assert high[row, col] == column.max()
+
+
+def test_density_counts_edges_within_bursts():
+    capture = Capture(bytes(1000), 1000, timestamp=0.0)
+    capture.start_new_segment()
+    capture.append_samples(b'\x01\x00' * 500)
+    high, edges, valid = density_columns(capture, [0], *capture.compact_range(), 2)
+    assert list(edges[0]) == [0, 999]
+    assert high[0, 0] == 0 and high[0, 1] == 0.5
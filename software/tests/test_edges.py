@@ -0,0 +1,82 @@
+"""
+Edge index storage: int32 offsets, rebasing, int64 fallback and trimming
+"""
+
+import numpy as np
+
+from edges import MAX_SPAN, EdgeIndex, EdgeList, frame_edges
+
+
+def absolute(edges):
+    data, base = edges.run()
+    return (data.astype(np.int64) + base).tolist()
+
+
+def test_offsets_rebase_when_growing():
+    edges = EdgeList(capacity=4)
+    start = 10 ** 12
+    edges.append(np.arange(4), offset=start)
+    old_data, old_base = edges.run()
+    edges.drop_before(start + 2)
+    edges.append(np.arange(4), offset=start + 100)
+    data, base = edges.run()
+    # Grown into a new int32 array based at the oldest retained index
+    assert data.dtype == np.int32
+    assert base == start + 2
+    assert absolute(edges) == [start + 2, start + 3] + [start + 100 + i for i in range(4)]
+    # A run taken before is untouched
+    assert (old_data.astype(np.int64) + old_base).tolist() == [start + i for i in range(4)]
+
+
+def test_wide_span_falls_back_to_int64_and_back():
+    edges = EdgeList()
+    edges.append(np.array([0, 5]), offset=1000)
+    far = 1000 + MAX_SPAN + 10
+    edges.append(np.array([0]), offset=far)
+    data, _ = edges.run()
+    assert data.dtype == np.int64
+    assert absolute(edges) == [1000, 1005, far]
+
+    # Once the old edges are dropped the span fits int32 again
+    edges.drop_before(far)
+    edges.append(np.arange(2000), offset=far + 1)
+    data, base = edges.run()
+    assert data.dtype == np.int32
+    assert base == far
+    assert absolute(edges)[:3] == [far, far + 1, far + 2]
+
+
+def test_lookups_across_int64_fallback():
+    index = EdgeIndex(num_channels=1)
+    index.edges[0].append(np.array([3, 7]), offset=0)
+    index.edges[0].append(np.array([0]), offset=MAX_SPAN + 100)
+    assert index.channel_run(0)[0].dtype == np.int64
+    assert index.between(0, 0, 2 ** 40).tolist() == [3, 7, MAX_SPAN + 100]
+    assert index.nearest(0, MAX_SPAN) == MAX_SPAN + 100
+    assert index.nearest(0, 6) == 7
+    assert index.count_between(0, 4, MAX_SPAN + 101) == 2
+
+
+def test_excess_start_keeps_newest_edges_within_budget():
+    index = EdgeIndex(num_channels=2)
+    samples = np.zeros(1000, dtype=np.uint8)
+    samples[100::100] = 1      # CH0 high for one sample every 100
+    samples[::2] |= 2          # CH1 toggles on every sample
+    index.append(samples.tobytes(), 5000)
+    assert index.excess_start(10 ** 6) is None
+
+    budget = 400
+    trim = index.excess_start(budget)
+    kept = sum(4 * len(index.between(ch, trim, 6000)) for ch in range(2))
+    assert kept <= budget
+    # One sample earlier would be over budget: the trim is as late as needed, no later
+    earlier = sum(4 * len(index.between(ch, trim - 1, 6000)) for ch in range(2))
+    assert earlier > budget
+
+    index.drop_before(trim)
+    assert sum(edges.used_bytes for edges in index.edges) <= budget
+    assert index.excess_start(budget) is None
+
+
+def test_frame_edges_of_empty_frame():
+    assert [len(e) for e in frame_edges(b'', num_channels=3)] == [0, 0, 0]
@@ -0,0 +1,167 @@
+"""
+Link integrity: frame checksums, baud negotiation and session replay
+"""
+
+import time
+
+import numpy as np
+
+import device
+from device import LogicAnalyzerDevice
+from perf import counters
+from recording import load_capture
+from simulator import SIM_PORT, SimulatedSerial
+
+
+class NoEchoSerial(SimulatedSerial):
+    """Firmware that acknowledges K but never answers the Y echo"""
+
+    def _handle_line(self, cmd, arg):
+        if cmd != 'Y':
+            super()._handle_line(cmd, arg)
+
+
+class NoBaudSerial(SimulatedSerial):
+    """Older firmware that answers neither K nor Y"""
+
+    def _handle_line(self, cmd, arg):
+        pass
+
+
+class HangsAfterSwitchSerial(SimulatedSerial):
+    """Firmware that acknowledges K and then never answers again"""
+
+    hung = False
+
+    def _handle_line(self, cmd, arg):
+        super()._handle_line(cmd, arg)
+        self.hung = self.hung or cmd == 'K'
+
+    def write(self, data):
+        return len(data) if self.hung else super().write(data)
+
+
+def connected(**options):
+    la = LogicAnalyzerDevice(SIM_PORT, **options)
+    assert la.connect()
+    return la
+
+
+def test_corrupt_frame_is_rejected(monkeypatch):
+    la = connected()
+    try:
+        assert la.crc
+        sim = la.serial
+        send = sim._send
+
+        def corrupt(data, at=None):
+            if data.startswith((b'DATA:', b'RLE:')):
+                # Last payload byte, before the CRC and the END line
+                data = bytearray(data)
+                data[-11] ^= 0x01
+            send(bytes(data), at)
+
+        monkeypatch.setattr(sim, '_send', corrupt)
+        before = counters.counters.get('frames_corrupt', 0)
+        assert la.capture() is None
+        assert la.last_error == 'crc'
+        assert counters.counters.get('frames_corrupt', 0) == before + 1
+
+        # The link itself is fine: the next frame goes through
+        monkeypatch.setattr(sim, '_send', send)
+        assert la.capture() is not None
+        assert la.last_error is None
+    finally:
+        la.disconnect()
+
+
+def test_oversized_frame_count_is_rejected(monkeypatch):
+    la = connected()
+    try:
+        sim = la.serial
+        send = sim._send
+
+        def oversize(data, at=None):
+            if data.startswith(b'RLE:'):
+                # Sample count of 1 GiB in the header
+                data = data[:4] + (1 << 30).to_bytes(4, 'little') + data[8:]
+            send(data, at)
+
+        monkeypatch.setattr(sim, '_send', oversize)
+        assert la.capture() is None
+        assert la.last_error == 'crc'
+        assert len(la.frame_buffer) <= 2 * la.device_info['buffer_size']
+
+        monkeypatch.setattr(sim, '_send', send)
+        assert la.capture() is not None
+    finally:
+        la.disconnect()
+
+
+def test_baud_falls_back_below_garbled_speeds(monkeypatch):
+    monkeypatch.setattr(device, 'SimulatedSerial',
+                        lambda baud, timeout: SimulatedSerial(baud, timeout, link_limit=460800))
+    before = counters.counters.get('baud_fallbacks', 0)
+    la = connected(max_baudrate=2000000)
+    try:
+        assert la.baudrate == 460800
+        # 2000000, 1000000 and 921600 failed their echoes
+        assert counters.counters.get('baud_fallbacks', 0) == before + 3
+        assert la.capture() is not None
+    finally:
+        la.disconnect()
+
+
+def test_baud_kept_without_echo(monkeypatch):
+    monkeypatch.setattr(device, 'SimulatedSerial', NoEchoSerial)
+    la = connected(max_baudrate=460800)
+    try:
+        assert la.baudrate == 115200
+        assert la.serial.link_baud == 115200
+        assert la.capture() is not None
+    finally:
+        la.disconnect()
+
+
+def test_baud_kept_without_switch_support(monkeypatch):
+    monkeypatch.setattr(device, 'SimulatedSerial', NoBaudSerial)
+    la = connected(max_baudrate=2000000)
+    try:
+        assert la.baudrate == 115200
+        assert la.capture() is not None
+    finally:
+        la.disconnect()
+
+
+def test_dead_link_after_switch_fails_connect(monkeypatch):
+    monkeypatch.setattr(device, 'SimulatedSerial', HangsAfterSwitchSerial)
+    la = LogicAnalyzerDevice(SIM_PORT, max_baudrate=230400)
+    assert not la.connect()
+    assert la.serial is None
+
+
+def test_rate_reply_read_past_a_late_end_line():
+    la = connected()
+    assert la.capture() is not None
+    # The tail of the frame's END line arrives after the input buffer reset
+    la.serial._send(b'ND\r\n', at=time.perf_counter() + 0.01)
+    assert la.set_sample_rate('B')
+    assert la.sample_rate_hz == 10000
+    la.disconnect()
+
+
+def test_recorded_session_loads_back(tmp_path):
+    path = str(tmp_path / 'session.larec')
+    la = connected(record_path=path, max_baudrate=921600)
+    try:
+        assert la.baudrate == 921600
+        frames = [bytes(la.capture()['samples']) for _ in range(3)]
+    finally:
+        la.disconnect()
+
+    capture = load_capture(path)
+    assert capture is not None
+    assert capture.sample_count == 3 * 2048
+    assert capture.num_segments == 3
+    expected = np.frombuffer(b''.join(frames), dtype=np.uint8)
+    assert np.array_equal(capture.get_samples(), expected)
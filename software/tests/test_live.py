@@ -0,0 +1,56 @@
+"""
+Live mode in the main window against the simulated device
+"""
+
+import os
+
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from device import LogicAnalyzerDevice
+from simulator import SIM_PORT
+
+
+@pytest.fixture
+def window():
+    from PyQt5.QtWidgets import QApplication
+    from gui.main_window import MainWindow
+
+    app = QApplication.instance() or QApplication([])
+    window = MainWindow()
+    window.device = LogicAnalyzerDevice(SIM_PORT)
+    assert window.device.connect()
+    window.live_btn.setEnabled(True)
+    window.live_btn.setChecked(True)
+    window.toggle_live_mode()
+    # Ticks are driven by the test
+    window.live_timer.stop()
+    yield window
+    window.live_timer.stop()
+    window.device.disconnect()
+    window.close()
+    app.processEvents()
+
+
+def test_rate_change_drops_the_pending_burst(window):
+    window.do_capture()                 # request
+    window.do_capture()                 # read
+    assert window.full_capture.sample_count == 2048
+    window.do_capture()
+    assert window.capture_pending
+
+    window.rate_combo.setCurrentIndex(5)
+    assert not window.capture_pending
+    assert window.status_bar.currentMessage() == "Sample rate set to 2 MHz"
+    assert window.live_timer.isActive()
+    window.live_timer.stop()
+
+    window.do_capture()
+    window.do_capture()
+    capture = window.full_capture
+    assert window.live_mode
+    # The burst sampled at the old rate never made it into the capture
+    assert capture.sample_count == 2 * 2048
+    assert capture.num_segments == 2
+    assert capture.segment_arrays()[2][-1] == pytest.approx(0.5e-6)
@@ -0,0 +1,92 @@
+"""
+Port discovery and the per-port device info cache
+"""
+
+import json
+
+import pytest
+import serial
+
+import device
+from device import LogicAnalyzerDevice
+from perf import counters
+from simulator import SimulatedSerial
+
+LIVE = '/dev/ttyLA0'        # answers like the analyzer
+SILENT = '/dev/ttyLA1'      # opens, but nothing answers
+NO_RLE = '/dev/ttyLA2'      # answers I, ignores the link setup commands
+
+
+class FakeSerial(SimulatedSerial):
+    """serial.Serial stand-in: the simulator behind made-up port names"""
+
+    def __init__(self, port, baudrate, timeout=None):
+        if port not in (LIVE, SILENT, NO_RLE):
+            raise serial.SerialException(f"could not open port {port}")
+        super().__init__(baudrate, timeout=timeout)
+        self.port = port
+
+    def write(self, data):
+        if self.port == SILENT:
+            return len(data)
+        if self.port == NO_RLE:
+            data = data.replace(b'L', b'').replace(b'Q', b'')
+        return super().write(data)
+
+
+@pytest.fixture
+def cache_path(tmp_path, monkeypatch):
+    path = tmp_path / 'ports.json'
+    monkeypatch.setattr(device, 'PORT_CACHE_PATH', str(path))
+    monkeypatch.setattr(serial, 'Serial', FakeSerial)
+    monkeypatch.setattr(LogicAnalyzerDevice, 'list_ports', staticmethod(lambda: [SILENT, LIVE]))
+    return path
+
+
+def cached(path):
+    return json.loads(path.read_text()) if path.exists() else {}
+
+
+def stale_info():
+    info = LogicAnalyzerDevice.probe(LIVE)
+    info['rate_hz'] = 5
+    return info
+
+
+def test_discover_caches_the_answering_port(cache_path):
+    assert LogicAnalyzerDevice.discover(timeout=0.3) == LIVE
+    assert list(cached(cache_path)) == [LIVE]
+    assert LogicAnalyzerDevice.discover(timeout=0.3) == LIVE
+
+
+def test_discover_drops_a_stale_entry(cache_path):
+    cache_path.write_text(json.dumps({SILENT: stale_info()}))
+    before = counters.counters.get('port_cache_stale', 0)
+    assert LogicAnalyzerDevice.discover(timeout=0.3) == LIVE
+    assert list(cached(cache_path)) == [LIVE]
+    assert counters.counters.get('port_cache_stale', 0) == before + 1
+
+
+def test_connect_verifies_the_cached_port(cache_path):
+    cache_path.write_text(json.dumps({SILENT: stale_info()}))
+    la = LogicAnalyzerDevice(SILENT)
+    assert not la.connect()
+    assert cached(cache_path) == {}
+
+
+def test_connect_takes_the_rate_from_the_device(cache_path):
+    cache_path.write_text(json.dumps({LIVE: stale_info()}))
+    la = LogicAnalyzerDevice(LIVE)
+    assert la.connect()
+    try:
+        assert la.sample_rate_hz == 100000
+        assert cached(cache_path)[LIVE]['rate_hz'] == 100000
+    finally:
+        la.disconnect()
+
+
+def test_failed_link_setup_is_not_a_connection(cache_path):
+    la = LogicAnalyzerDevice(NO_RLE)
+    assert not la.connect()
+    assert la.serial is None
+    assert NO_RLE not in cached(cache_path)
@@ -0,0 +1,96 @@
+"""
+Headless rendering of capture windows, in process and from a recording
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import render
+from capture import Capture
+from device import LogicAnalyzerDevice
+from gui.styles import CHANNEL_COLORS
+from simulator import SIM_PORT
+
+
+def lane_rows(image, lane, lanes):
+    """Pixel rows of a lane's high and low trace level"""
+    pitch = (image.height() - render.RULER_HEIGHT - render.MARGIN) / lanes
+    y_high = render.MARGIN + lane * pitch + pitch * (1 - render.LANE_HEIGHT) / 2
+    return int(y_high), int(y_high + pitch * render.LANE_HEIGHT)
+
+
+def color_at(image, x, y):
+    """Channel color name drawn at or right next to (x, y), if any"""
+    from PyQt5.QtGui import QColor
+
+    channel_colors = [color.lower() for color in CHANNEL_COLORS]
+    for dy in (0, -1, 1):
+        name = QColor(image.pixel(x, y + dy)).name()
+        if name in channel_colors:
+            return name
+    return None
+
+
+def test_render_windows_draws_each_window(tmp_path):
+    from PyQt5.QtGui import QImage
+
+    # CH0 high, CH1 low for a burst, then the other way round after a gap
+    capture = Capture(np.full(1000, 0b01, dtype=np.uint8).tobytes(), 1000, timestamp=0.0)
+    capture.append_samples(np.full(1000, 0b10, dtype=np.uint8).tobytes(), 1000, timestamp=1.0)
+    x_min, x_max = capture.compact_range()
+    middle = (x_min + x_max) / 2
+    windows = [(str(tmp_path / 'first.png'), x_min, middle),
+               (str(tmp_path / 'second.png'), middle, x_max)]
+    paths = render.render_windows(capture, windows, width=200, channels=[0, 1])
+    assert paths == [path for path, _, _ in windows]
+
+    x = render.LABEL_WIDTH + 70
+    for path, high_channel in zip(paths, (0, 1)):
+        image = QImage(path)
+        height = 2 * render.LANE_PIXELS + render.RULER_HEIGHT + render.MARGIN
+        assert (image.width(), image.height()) == (200, height)
+        for lane in (0, 1):
+            y_high, y_low = lane_rows(image, lane, 2)
+            drawn = y_high if lane == high_channel else y_low
+            empty = y_low if lane == high_channel else y_high
+            assert color_at(image, x, drawn) == CHANNEL_COLORS[lane].lower()
+            assert color_at(image, x, empty) is None
+
+
+def test_render_windows_from_recording(tmp_path):
+    from PyQt5.QtGui import QImage
+
+    recording = str(tmp_path / 'session.larec')
+    device = LogicAnalyzerDevice(SIM_PORT, record_path=recording)
+    assert device.connect()
+    for _ in range(3):
+        assert device.capture() is not None
+    device.disconnect()
+
+    from recording import load_capture
+
+    capture = load_capture(recording)
+    x_min, x_max = capture.compact_range()
+    bounds = np.linspace(x_min, x_max, 4)
+    windows = [(str(tmp_path / f'w{i}.png'), bounds[i], bounds[i + 1]) for i in range(3)]
+    here = [(str(tmp_path / f'here{i}.png'), lo, hi) for i, (_, lo, hi) in enumerate(windows)]
+
+    # Worker processes load the recording themselves and draw the same images
+    assert render.render_windows(recording, windows, jobs=2, width=300) == [w[0] for w in windows]
+    render.render_windows(capture, here, width=300)
+    for (path, _, _), (local, _, _) in zip(windows, here):
+        assert QImage(path) == QImage(local)
+
+
+def test_render_windows_of_empty_recording(tmp_path):
+    recording = str(tmp_path / 'empty.larec')
+    device = LogicAnalyzerDevice(SIM_PORT, record_path=recording)
+    assert device.connect()
+    device.disconnect()
+
+    with pytest.raises(ValueError, match="contains no frames"):
+        render.render_windows(recording, [(str(tmp_path / 'w.png'), 0.0, 1.0)], jobs=1)
@@ -0,0 +1,48 @@
+"""
+Run-length encoded transfers: firmware encoder against the host decoder
+"""
+
+import numpy as np
+
+from device import LogicAnalyzerDevice, decode_rle
+from perf import counters
+from simulator import SIM_PORT, encode_rle, generate_samples
+
+
+def test_round_trip_random():
+    rng = np.random.default_rng(0)
+    samples = rng.integers(0, 4, 5000).astype(np.uint8)
+    assert np.array_equal(decode_rle(encode_rle(samples)), samples)
+
+
+def test_long_runs_are_split():
+    samples = np.concatenate([np.full(1000, 0x81, np.uint8), np.zeros(3, np.uint8),
+                              np.full(256, 7, np.uint8), np.full(257, 9, np.uint8)])
+    pairs = encode_rle(samples)
+    # 1000 = 3 * 256 + 232, then 3, then 256, then 256 + 1
+    assert len(pairs) // 2 == 4 + 1 + 1 + 2
+    assert np.array_equal(decode_rle(pairs), samples)
+
+
+def test_trailing_odd_byte_is_ignored():
+    pairs = encode_rle(generate_samples(2048, 100000, 0.0))
+    assert np.array_equal(decode_rle(pairs + b'\x05'), decode_rle(pairs))
+
+
+def test_empty():
+    assert encode_rle(np.zeros(0, np.uint8)) == b''
+    assert len(decode_rle(b'')) == 0
+
+
+def test_simulated_capture_uses_rle():
+    device = LogicAnalyzerDevice(SIM_PORT)
+    assert device.connect()
+    try:
+        assert device.encoding == 'RLE'
+        before = counters.counters.get('frames_rle', 0)
+        frame = device.capture()
+        assert frame is not None
+        assert counters.counters.get('frames_rle', 0) == before + 1
+        assert len(frame['samples']) == frame['sample_count'] == 2048
+    finally:
+        device.disconnect()
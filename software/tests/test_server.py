@@ -0,0 +1,130 @@
+"""
+Capture server and client over a local socket
+"""
+
+import time
+
+import numpy as np
+
+from perf import counters
+from server import CaptureClient, CaptureServer
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def burst(value, count, timestamp):
+    return {
+        'type': 'capture',
+        'samples': np.full(count, value, dtype=np.uint8),
+        'sample_period_ns': 1000,
+        'sample_rate_hz': 1000000,
+        'timestamp': timestamp,
+    }
+
+
+def chunk(value, count, sequence, dropped=0):
+    return {
+        'type': 'chunk',
+        'samples': np.full(count, value, dtype=np.uint8),
+        'sample_period_ns': 1000,
+        'timestamp': 10.0 + sequence,
+        'sequence': sequence,
+        'dropped': dropped,
+    }
+
+
+def test_round_trip(tmp_path):
+    address = f"unix:{tmp_path / 'la.sock'}"
+    server = CaptureServer(address)
+    server.start()
+    server.publish_info({'buffer_size': 2048})
+    client = CaptureClient(address, timeout=5.0)
+    try:
+        wait_for(lambda: len(server.subscribers) == 1)
+        server.publish(burst(0x0F, 100, 1.0))
+        server.publish(chunk(0xF0, 50, 0))
+        server.publish(chunk(0xFF, 50, 2, dropped=1))
+
+        frames = client.frames()
+        first = next(frames)
+        # Info sent before connecting arrives first
+        assert client.device_info == {'buffer_size': 2048}
+        assert first['type'] == 'capture'
+        assert first['timestamp'] == 1.0
+        assert first['sample_rate_hz'] == 1000000
+        assert np.array_equal(first['samples'], np.full(100, 0x0F, dtype=np.uint8))
+        second, third = next(frames), next(frames)
+        assert (second['type'], second['sequence'], second['dropped']) == ('chunk', 0, 0)
+        assert (third['sequence'], third['dropped'], third['sample_count']) == (2, 1, 50)
+        assert np.array_equal(third['samples'], np.full(50, 0xFF, dtype=np.uint8))
+
+        # Stopping the server ends the stream
+        server.stop()
+        assert client.read() is None
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_captures_rebuild_segments(tmp_path):
+    address = f"unix:{tmp_path / 'la.sock'}"
+    server = CaptureServer(address)
+    server.start()
+    client = CaptureClient(address, timeout=5.0)
+    try:
+        wait_for(lambda: len(server.subscribers) == 1)
+        server.publish(burst(1, 100, 1.0))
+        server.publish(burst(2, 100, 2.0))
+        captures = client.captures()
+        next(captures)
+        capture = next(captures)
+        assert capture.sample_count == 200
+        assert capture.num_segments == 2
+        assert capture.get_samples(99, 101).tolist() == [1, 2]
+    finally:
+        client.close()
+        server.stop()
+
+
+def test_slow_client_is_dropped(tmp_path):
+    address = f"unix:{tmp_path / 'la.sock'}"
+    server = CaptureServer(address, max_queue=2)
+    server.start()
+    slow = CaptureClient(address, timeout=5.0)
+    fast = CaptureClient(address, timeout=5.0)
+    counters.reset()
+    try:
+        wait_for(lambda: len(server.subscribers) == 2)
+        fast_sub = server.subscribers[1]
+        frames = fast.frames()
+        received = 0
+        # The slow client never reads: its socket buffer, then its queue fill
+        for n in range(200):
+            started = time.perf_counter()
+            server.publish(burst(n % 256, 256 * 1024, float(n)))
+            # Publishing only queues; it never waits on a subscriber
+            assert time.perf_counter() - started < 1.0
+            frame = next(frames)
+            assert frame['timestamp'] == float(n)
+            received += 1
+            if len(server.subscribers) == 1:
+                break
+        assert server.subscribers == [fast_sub]
+        assert counters.counters['server_clients_dropped'] == 1
+
+        # The fast client keeps receiving
+        server.publish(burst(7, 10, 1000.0))
+        assert next(frames)['timestamp'] == 1000.0
+
+        # The slow one gets what was already sent, then the end of the stream
+        while slow.read() is not None:
+            pass
+    finally:
+        slow.close()
+        fast.close()
+        server.stop()
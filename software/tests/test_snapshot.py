@@ -0,0 +1,140 @@
+"""
+Capture snapshots read from another thread while the capture changes
+"""
+
+import gc
+import threading
+import time
+
+import numpy as np
+
+from anomaly import AnomalyDetector
+from capture import Capture
+
+BURST = 4096
+
+
+def burst(rng):
+    """Slow random levels, so every channel has some edges"""
+    return np.repeat(rng.integers(0, 256, BURST // 64, dtype=np.uint8), 64)
+
+
+def channel_edges(samples, ch):
+    """Level changes of one channel, relative to the first sample"""
+    bits = (samples >> ch) & 1
+    return np.flatnonzero(np.diff(bits)) + 1
+
+
+def test_snapshot_is_fixed_while_writer_appends_and_trims():
+    rng = np.random.default_rng(7)
+    bursts = [burst(rng)]
+    capture = Capture(bursts[0].tobytes(), 1000, timestamp=0.0, ram_budget=64 * 1024)
+    done = threading.Event()
+    errors = []
+
+    def writer():
+        try:
+            for i in range(1, 400):
+                bursts.append(burst(rng))
+                capture.append_samples(bursts[-1].tobytes(), 1000, timestamp=float(i))
+                if i % 10 == 0:
+                    capture.trim_start(capture.sample_count // 3)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            done.set()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    snapshots = 0
+    try:
+        while not done.is_set() or snapshots == 0:
+            snap = capture.snapshot()
+            offset, count = snap.sample_offset, snap.sample_count
+            samples = snap.get_samples().copy()
+            edges = [snap.edges.between(ch, offset, offset + count).copy()
+                     for ch in range(snap.num_channels)]
+
+            # The samples are exactly those the writer had appended then
+            written = np.concatenate(bursts[:offset // BURST + count // BURST + 2])
+            assert np.array_equal(samples, written[offset:offset + count])
+
+            # Edges are found within bursts only, so check each burst
+            for ch in range(snap.num_channels):
+                first = offset - offset % BURST
+                expected = [start + channel_edges(written[start:start + BURST], ch)
+                            for start in range(first, offset + count, BURST)]
+                expected = np.concatenate(expected)
+                expected = expected[(expected > offset) & (expected < offset + count)]
+                assert np.array_equal(edges[ch][edges[ch] > offset], expected)
+
+            # Reading the snapshot again after more appends gives the same
+            assert snap.sample_offset == offset and snap.sample_count == count
+            assert np.array_equal(snap.get_samples(), samples)
+            for ch in range(snap.num_channels):
+                assert np.array_equal(snap.edges.between(ch, offset, offset + count), edges[ch])
+            snapshots += 1
+    finally:
+        thread.join()
+        capture.close()
+    assert not errors
+    assert snapshots > 1
+
+
+def test_detector_reads_one_snapshot():
+    rng = np.random.default_rng(3)
+    capture = Capture(burst(rng).tobytes(), 1000, timestamp=0.0)
+    snap = capture.snapshot()
+    capture.append_samples(burst(rng).tobytes(), 1000, timestamp=1.0)
+
+    detector = AnomalyDetector()
+    detector.process(snap)
+    # Only the samples the snapshot held were scanned
+    assert detector.next_index == snap.sample_offset + snap.sample_count
+    detector.process(capture)
+    assert detector.next_index == capture.sample_offset + capture.sample_count
+    capture.close()
+
+
+def test_capture_ids_are_not_reused():
+    ids = set()
+    for _ in range(50):
+        capture = Capture(bytes(16), 1000)
+        assert capture.snapshot().capture_id == capture.capture_id
+        ids.add(capture.capture_id)
+        capture.close()
+        del capture
+        gc.collect()
+    assert len(ids) == 50
+
+
+def test_append_that_trims_publishes_once():
+    capture = Capture(bytes(64), 1000, timestamp=0.0)
+    # Every edge index byte is over budget, so each append trims history
+    capture.store.ram_budget = 0
+    rng = np.random.default_rng(5)
+    version = capture.version
+    capture.append_samples(rng.integers(0, 256, 4096, dtype=np.uint8).tobytes(), 1000,
+                           timestamp=1.0)
+    assert capture.sample_offset > 0
+    assert capture.version == version + 1
+    capture.close()
+
+
+def test_snapshot_reads_spilled_samples_after_close():
+    rng = np.random.default_rng(9)
+    written = [rng.integers(0, 256, 1 << 16, dtype=np.uint8) for _ in range(16)]
+    capture = Capture(written[0].tobytes(), 1000, timestamp=0.0)
+    for i, samples in enumerate(written[1:], 1):
+        capture.append_samples(samples.tobytes(), 1000, timestamp=float(i))
+    # Let background compression finish, then force old blocks to disk
+    deadline = time.time() + 10
+    while capture.store.compressing and time.time() < deadline:
+        capture.store.read(0, 1)
+        time.sleep(0.01)
+    capture.set_ram_budget(1 << 16)
+    assert capture.store.disk_bytes > 0
+    snap = capture.snapshot()
+    capture.close()
+    expected = np.concatenate(written)[snap.sample_offset:]
+    assert np.array_equal(snap.get_samples(), expected)
@@ -0,0 +1,110 @@
+"""
+Streaming chunks: sequence gaps, corrupt chunks and reads split mid-chunk
+"""
+
+import time
+
+import numpy as np
+
+from device import LogicAnalyzerDevice
+from simulator import SIM_PORT, encode_chunk, generate_samples
+
+
+class FakePort:
+    """Serial port that hands out prepared bytes, at most limit per read"""
+
+    def __init__(self, data=b'', limit=None):
+        self.data = bytearray(data)
+        self.limit = limit
+
+    @property
+    def in_waiting(self):
+        return len(self.data) if self.limit is None else min(self.limit, len(self.data))
+
+    def readinto(self, buffer):
+        n = min(len(buffer), len(self.data))
+        buffer[:n] = self.data[:n]
+        del self.data[:n]
+        return n
+
+
+def streaming_device(data, crc=True, limit=None):
+    """Device in the state start_stream() leaves it in, reading data"""
+    device = LogicAnalyzerDevice()
+    device.serial = FakePort(data, limit)
+    device.crc = crc
+    device.streaming = True
+    device.stream_rate_hz = 10000
+    device.stream_period_ns = 100000
+    device.stream_start_time = 0.0
+    device.stream_buffer = b''
+    device.next_sequence = 0
+    return device
+
+
+def chunk_samples(seq):
+    return generate_samples(1024, 10000, seq * 0.1024)
+
+
+def test_sequence_gaps_count_as_dropped():
+    data = b''.join(encode_chunk(seq, chunk_samples(seq), rle=seq % 2, crc=True)
+                    for seq in (0, 1, 4, 5, 9))
+    chunks = streaming_device(data).read_stream()
+    assert [c['sequence'] for c in chunks] == [0, 1, 4, 5, 9]
+    assert [c['dropped'] for c in chunks] == [0, 0, 2, 0, 3]
+    for chunk in chunks:
+        assert np.array_equal(chunk['samples'], chunk_samples(chunk['sequence']))
+    # Each chunk is timed from its sequence number, gaps included
+    assert chunks[2]['timestamp'] == 4 * 1024 / 10000
+
+
+def test_corrupt_chunk_is_dropped():
+    good = [encode_chunk(seq, chunk_samples(seq), rle=False, crc=True) for seq in range(3)]
+    bad = bytearray(good[1])
+    bad[20] ^= 0xFF
+    chunks = streaming_device(good[0] + bytes(bad) + good[2]).read_stream()
+    assert [c['sequence'] for c in chunks] == [0, 2]
+    assert [c['dropped'] for c in chunks] == [0, 1]
+
+
+def test_corrupt_chunk_header_does_not_stall():
+    good = [encode_chunk(seq, chunk_samples(seq), rle=seq == 1, crc=True) for seq in range(3)]
+    bad = bytearray(good[1])
+    # A sample count far beyond the device's buffer
+    bad[8:12] = (1 << 30).to_bytes(4, 'little')
+    chunks = streaming_device(good[0] + bytes(bad) + good[2]).read_stream()
+    assert [c['sequence'] for c in chunks] == [0, 2]
+    assert [c['dropped'] for c in chunks] == [0, 1]
+
+
+def test_chunks_split_across_reads():
+    data = b''.join(encode_chunk(seq, chunk_samples(seq), rle=True, crc=True)
+                    for seq in range(6))
+    device = streaming_device(data, limit=97)
+    chunks = []
+    while device.serial.data:
+        chunks += device.read_stream()
+    assert [c['sequence'] for c in chunks] == list(range(6))
+    assert all(c['dropped'] == 0 for c in chunks)
+    assert device.stream_buffer == b''
+
+
+def test_simulated_stream():
+    device = LogicAnalyzerDevice(SIM_PORT, max_baudrate=2000000)
+    assert device.connect()
+    try:
+        assert device.set_sample_rate('B')
+        assert device.start_stream()
+        chunks = []
+        deadline = time.time() + 5
+        while len(chunks) < 3 and time.time() < deadline:
+            chunks += device.read_stream()
+            time.sleep(device.poll_interval)
+        assert len(chunks) >= 3
+        sequences = [c['sequence'] for c in chunks]
+        assert sequences == list(range(sequences[0], sequences[0] + len(chunks)))
+        assert sum(c['dropped'] for c in chunks[1:]) == 0
+        device.stop_stream()
+        assert not device.streaming
+    finally:
+        device.disconnect()